@@ -1,35 +1,176 @@
-from flask import Flask, render_template, request, redirect, session, flash, url_for, jsonify
+from flask import Flask, Response, render_template, request, redirect, session, flash, url_for, jsonify, g
 import sqlite3
 from datetime import datetime, timedelta
-from models.user_model import init_db, add_user, check_user
-from models.slot_model import init_slot_db, add_slot, get_all_slots, delete_slot, get_lot_slot_counts, get_lot_slot_summary
-from models.booking_model import init_booking_db, add_booking, get_user_bookings, release_booking
+from models.db import get_connection, pool_stats
+from models.profiler import begin_profile, current_profile, finish_profile, profile_stats, reset_profiles
+from models.metrics import render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, REQUEST_LATENCY, REQUESTS, CHAT_CONNECTIONS
+from models.migrate import upgrade, start_backfills
+from models.counters import get_stats
+from models.cache import cached, invalidate_stats, cache_stats
+from models.events import publish, subscribe
+from models.user_model import add_user, check_user, set_password, get_user_id, get_principal, invalidate_principal
+from models.credentials import hash_password, LoginBusy
+from models.slot_index import free_slots
+from models.slot_model import add_slot, get_all_lots, get_all_slots, delete_slot, get_lot_slot_counts, get_lot_slot_summary
+from models.slot_model import provision_lot, resize_lot, import_site_layout, parse_site_layout
+from models.timestamps import day_start, day_end
+from models.billing import get_lot_tariff, set_lot_tariff, recompute_costs
+from models.analytics import get_analytics
+from models.booking_model import add_booking, allocate_slot, get_user_bookings, release_booking, get_allocation_stats, search_bookings
+from models.booking_model import export_bookings, EXPORT_COLUMNS
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from models.chat_model import init_chat_db, add_message, get_recent_messages, get_online_users
+from models.presence import presence
+from models.chat_writer import queue_message, ChatQueueFull, ChatMessage
+from models.socketio_queue import make_client_manager, on_remote_emit
+from models.chat_history import recent_messages
+from models.chat_model import get_messages_before, get_messages_since
+import csv
+import hmac
+import io
 import json
+import os
+import time
+import config
 
 app = Flask(__name__)
 app.secret_key = 'secret123'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# A message queue relays room broadcasts between worker processes
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=config.ASYNC_MODE,
+                    client_manager=make_client_manager(config.SOCKETIO_MESSAGE_QUEUE))
 
 #  Seed admin user
 def seed_admin():
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
     if cur.fetchone():
         cur.execute("SELECT * FROM users WHERE username = ?", ('admin',))
         if not cur.fetchone():
-            cur.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)", ('admin', 'admin123', 1))
+            # Workers starting together may both get here
+            cur.execute("INSERT OR IGNORE INTO users (username, password, is_admin) VALUES (?, ?, ?)", ('admin', hash_password('admin123'), 1))
             conn.commit()
     conn.close()
 
-#  Initialize databases and seed admin
-init_db()
-init_slot_db()
-init_booking_db()
-init_chat_db()
+#  Migrate the schema and seed admin; data backfills run in the background
+upgrade(backfills=False)
+start_backfills(socketio.start_background_task)
 seed_admin()
+free_slots.rebuild()
+recent_messages.warm()
+
+# ---------------- SQL PROFILING ----------------
+
+def profile_route():
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    return f"{request.method} {rule}"
+
+@app.before_request
+def start_sql_profile():
+    g.request_started = time.perf_counter()
+    g.sql_profile = begin_profile()
+
+@app.after_request
+def add_server_timing(response):
+    profile = current_profile()
+    if profile is not None:
+        response.headers['Server-Timing'] = f'db;dur={profile.db_time * 1000:.2f};desc="{profile.queries} queries"'
+    return response
+
+@app.teardown_request
+def finish_sql_profile(exc=None):
+    finish_profile(g.pop('sql_profile', None), profile_route())
+
+# ---------------- METRICS ----------------
+
+def observe_request(status):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.observe(endpoint, request.method, value=time.perf_counter() - started)
+    REQUESTS.inc(endpoint, request.method, status)
+
+@app.after_request
+def record_request_metrics(response):
+    observe_request(response.status_code)
+    return response
+
+@app.teardown_request
+def record_failed_request(exc=None):
+    # after_request is skipped when a view raises
+    if exc is not None:
+        observe_request(500)
+
+CHAT_CONNECTIONS.set('general_chat', value=0)
+
+@app.route('/metrics')
+def metrics():
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not session.get('is_admin') and not (config.METRICS_TOKEN and hmac.compare_digest(token.encode(), config.METRICS_TOKEN.encode())):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return render_metrics(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+# ---------------- CACHED STATISTICS ----------------
+
+# Stats views are cached per view (and per user) and dropped by
+# invalidate_stats() whenever a booking, slot, lot or user is written.
+def home_stats():
+    def compute():
+        counters = get_stats()
+        return {
+            'total_lots': counters['total_lots'],
+            'total_slots': counters['total_slots'],
+            'total_users': counters['total_users'],
+            'total_bookings': counters['total_bookings']
+        }
+    return cached('stats:home', compute)
+
+def admin_stats():
+    def compute():
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT SUM(cost) FROM bookings WHERE start_ts >= ? AND start_ts < ?", (day_start(), day_end()))
+        today_revenue = cur.fetchone()[0] or 0
+        conn.close()
+        counters = get_stats()
+        return {
+            'available_slots': counters['available_slots'],
+            'occupied_slots': counters['occupied_slots'],
+            'active_bookings': counters['active_bookings'],
+            'today_revenue': today_revenue,
+            'total_users': counters['total_users']
+        }
+    return cached('stats:admin', compute)
+
+def available_slots():
+    return cached('stats:available_slots', lambda: get_stats()['available_slots'])
+
+# Per-user counts come from the cached principal (see get_principal)
+def user_stats(user_id):
+    principal = get_principal(user_id)
+    return {
+        'active_bookings': principal['active_bookings'],
+        'total_bookings': principal['total_bookings'],
+        'available_slots': available_slots()
+    }
+
+def current_principal():
+    """The logged-in user's cached principal, or None (also for a deleted account)."""
+    if 'username' not in session:
+        return None
+    # Sessions from before user ids were stored only carry the username
+    if session.get('user_id') is None:
+        session['user_id'] = get_user_id(session['username'])
+    principal = get_principal(session['user_id']) if session['user_id'] is not None else None
+    if principal is None or principal['username'] != session['username']:
+        return None
+    return principal
+
+def end_stale_session():
+    # The session's user no longer exists (account removed, database reset)
+    session.clear()
+    flash("Please login first!")
+    return redirect('/login')
 
 # ---------------- PUBLIC ROUTES ----------------
 
@@ -37,33 +178,7 @@ seed_admin()
 @app.route('/')
 def home():
     # Get statistics for the home page
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    
-    # Get total lots
-    cur.execute("SELECT COUNT(*) FROM parking_lots")
-    total_lots = cur.fetchone()[0]
-    
-    # Get total slots
-    cur.execute("SELECT COUNT(*) FROM slots")
-    total_slots = cur.fetchone()[0]
-    
-    # Get total users (excluding admin)
-    cur.execute("SELECT COUNT(*) FROM users WHERE is_admin = 0")
-    total_users = cur.fetchone()[0]
-    
-    # Get total bookings
-    cur.execute("SELECT COUNT(*) FROM bookings")
-    total_bookings = cur.fetchone()[0]
-    
-    conn.close()
-    
-    stats = {
-        'total_lots': total_lots,
-        'total_slots': total_slots,
-        'total_users': total_users,
-        'total_bookings': total_bookings
-    }
+    stats = home_stats()
     
     return render_template('home.html', stats=stats)
 
@@ -72,7 +187,12 @@ def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        if add_user(username, password):
+        try:
+            created = add_user(username, password)
+        except LoginBusy:
+            flash('Too many sign-ups right now, please try again in a moment.')
+            return render_template('register.html'), 503
+        if created:
             flash('Registration successful! Please log in.')
             return redirect('/login')
         else:
@@ -84,10 +204,18 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user = check_user(username, password)
+        try:
+            user = check_user(username, password)
+        except LoginBusy:
+            flash('Too many logins right now, please try again in a moment.')
+            return render_template('login.html'), 503
         if user:
+            session['user_id'] = user[0]
             session['username'] = username
             session['is_admin'] = user[3] if len(user) > 3 else 0
+            # Fresh counts for the first page; later views read the cache
+            invalidate_principal(user[0])
+            get_principal(user[0])
             if session['is_admin']:
                 return redirect('/admin/dashboard')
             else:
@@ -102,8 +230,12 @@ def dashboard():
         return redirect('/login')
     if session.get('is_admin'):
         return redirect('/admin/dashboard')
+    principal = current_principal()
+    if principal is None:
+        return end_stale_session()
+    user_id = principal['id']
     
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     
     # Get user's active bookings
@@ -112,17 +244,12 @@ def dashboard():
         FROM bookings b
         JOIN slots s ON b.slot_id = s.id
         JOIN parking_lots l ON s.lot_id = l.id
-        WHERE b.user_email = ? AND b.end_time IS NULL
-    ''', (session['username'],))
+        WHERE b.user_id = ? AND b.end_time IS NULL
+    ''', (user_id,))
     active_bookings = cur.fetchall()
     
-    # Get available slots count
-    cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'A'")
-    available_slots = cur.fetchone()[0]
-    
-    # Get user's total bookings
-    cur.execute("SELECT COUNT(*) FROM bookings WHERE user_email = ?", (session['username'],))
-    total_bookings = cur.fetchone()[0]
+    # Get available slots count and user's total bookings
+    stats = user_stats(user_id)
     
     # Get recent parking lots
     cur.execute("SELECT id, name, price FROM parking_lots LIMIT 5")
@@ -134,8 +261,8 @@ def dashboard():
     return render_template('dashboard.html', 
                          username=session['username'],
                          active_bookings=active_bookings,
-                         available_slots=available_slots,
-                         total_bookings=total_bookings,
+                         available_slots=stats['available_slots'],
+                         total_bookings=stats['total_bookings'],
                          recent_lots=recent_lots)
 
 @app.route('/logout')
@@ -153,7 +280,7 @@ def admin_dashboard():
         flash("Access denied.")
         return redirect('/login')
     
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     
     # Get all slots with detailed information
@@ -163,36 +290,15 @@ def admin_dashboard():
         FROM slots s
         JOIN parking_lots l ON s.lot_id = l.id
         LEFT JOIN bookings b ON s.id = b.slot_id AND b.end_time IS NULL
-        LEFT JOIN users u ON b.user_email = u.username
+        LEFT JOIN users u ON b.user_id = u.id
         ORDER BY l.name, s.location
     ''')
     slots = cur.fetchall()
     
-    # Get dashboard statistics
-    cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'A'")
-    available_slots = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'O'")
-    occupied_slots = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM bookings WHERE end_time IS NULL")
-    active_bookings = cur.fetchone()[0]
-    
-    cur.execute("SELECT SUM(cost) FROM bookings WHERE DATE(start_time) = DATE('now')")
-    today_revenue = cur.fetchone()[0] or 0
-    
-    cur.execute("SELECT COUNT(*) FROM users WHERE is_admin = 0")
-    total_users = cur.fetchone()[0]
-    
     conn.close()
     
-    stats = {
-        'available_slots': available_slots,
-        'occupied_slots': occupied_slots,
-        'active_bookings': active_bookings,
-        'today_revenue': today_revenue,
-        'total_users': total_users
-    }
+    # Get dashboard statistics
+    stats = admin_stats()
     
     # Change this line to use your existing template
     return render_template('admin_dashboard.html', slots=slots, stats=stats)
@@ -203,15 +309,18 @@ def admin_add_slot():
         flash("Access denied.")
         return redirect('/login')
 
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     if request.method == 'POST':
         lot_id = request.form['lot_id']
         location = request.form['location']
         time = request.form['time']
-        cur.execute("INSERT INTO slots (lot_id, location, time) VALUES (?, ?, ?)", (lot_id, location, time))
+        cur.execute("INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, ?, 'A')", (lot_id, location, time))
         conn.commit()
         conn.close()
+        free_slots.push(int(lot_id), cur.lastrowid)
+        invalidate_stats()
+        publish('slots_changed', lot_id=int(lot_id))
         flash('Slot added!')
         return redirect('/admin/dashboard')
 
@@ -229,29 +338,52 @@ def admin_delete_slot(slot_id):
     flash('Slot deleted.')
     return redirect('/admin/dashboard')
 
+BOOKINGS_PAGE_SIZE = 50
+BOOKINGS_MAX_PAGE_SIZE = 200
+# Filters carried over from the bookings page to its export links
+EXPORT_ARGS = ('lot_id', 'from', 'to')
+
+def booking_filters(args):
+    """Parse /admin/all_bookings query args into search_bookings() keywords."""
+    filters = {
+        'username': args.get('user', '').strip() or None,
+        'vehicle_number': args.get('vehicle', '').strip() or None,
+        'active_only': args.get('active') == '1',
+        'limit': min(int(args.get('limit') or BOOKINGS_PAGE_SIZE), BOOKINGS_MAX_PAGE_SIZE),
+    }
+    if args.get('lot_id'):
+        filters['lot_id'] = int(args['lot_id'])
+    if args.get('before'):
+        filters['before_id'] = int(args['before'])
+    for arg, key in (('from', 'date_from'), ('to', 'date_to')):
+        if args.get(arg):
+            filters[key] = datetime.strptime(args[arg], '%Y-%m-%d').strftime('%Y-%m-%d')
+    if filters['limit'] < 1:
+        raise ValueError('limit must be positive')
+    return filters
+
 @app.route('/admin/all_bookings')
 def all_bookings():
     if not session.get('is_admin'):
         flash("Access denied.")
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT b.id, u.username, b.slot_id, b.vehicle_number, b.start_time, b.end_time, b.cost
-        FROM bookings b
-        JOIN users u ON b.user_email = u.username
-        ORDER BY b.id DESC
-    ''')
-    all_bookings = cur.fetchall()
-    conn.close()
-    return render_template('all_bookings.html', bookings=all_bookings)
+    try:
+        filters = booking_filters(request.args)
+    except ValueError as e:
+        flash(f'Invalid filter: {e}')
+        return redirect('/admin/all_bookings')
+    bookings, next_before = search_bookings(**filters)
+    lots = get_all_lots()
+    export_args = {arg: request.args[arg] for arg in EXPORT_ARGS if request.args.get(arg)}
+    return render_template('all_bookings.html', bookings=bookings, next_before=next_before,
+                           filters=request.args.to_dict(), lots=lots, export_args=export_args)
 
 @app.route('/admin/users')
 def view_users():
     if not session.get('is_admin'):
         flash("Access denied.")
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('SELECT id, username, is_admin FROM users')
     users = cur.fetchall()
@@ -263,31 +395,50 @@ def manage_lots():
     if not session.get('is_admin'):
         flash("Access denied.")
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-
     if request.method == 'POST':
         lot_name = request.form['lot_name']
         price = request.form['price']
         num_spots = int(request.form['num_spots'])
-        cur.execute("INSERT INTO parking_lots (name, price) VALUES (?, ?)", (lot_name, price))
-        lot_id = cur.lastrowid
-        for i in range(num_spots):
-            cur.execute("INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, ?, 'A')", (lot_id, f"Spot {i+1}", "",))
-        conn.commit()
-
-    conn.close()
+        try:
+            report = provision_lot(lot_name, price, num_spots)
+            flash(f"Lot created with {num_spots} spots in {report['seconds'] * 1000:.0f} ms "
+                  f"({report['rows_per_second']} rows/s).")
+        except sqlite3.IntegrityError:
+            flash('A lot with that name already exists.')
 
     lot_data = get_lot_slot_counts()
     return render_template('manage_lots.html', lot_data=lot_data)
 
+@app.route('/admin/lots/import', methods=['POST'])
+def import_lots():
+    if not session.get('is_admin'):
+        flash("Access denied.")
+        return redirect('/login')
+    upload = request.files.get('layout')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSON layout file to import.')
+        return redirect('/admin/lots')
+    fmt = upload.filename.rsplit('.', 1)[-1].lower()
+    try:
+        lots = parse_site_layout(upload.read().decode('utf-8-sig'), fmt)
+        report = import_site_layout(lots)
+    except (ValueError, KeyError, TypeError) as e:
+        flash(f'Could not import layout: {e}')
+        return redirect('/admin/lots')
+    except sqlite3.IntegrityError:
+        flash('Import cancelled: a lot in the layout already exists.')
+        return redirect('/admin/lots')
+    flash(f"Imported {report['lots']} lots / {report['slots']} spots in "
+          f"{report['seconds'] * 1000:.0f} ms ({report['rows_per_second']} rows/s).")
+    return redirect('/admin/lots')
+
 @app.route('/admin/delete_lot/<int:lot_id>')
 def delete_lot(lot_id):
     if not session.get('is_admin'):
         flash("Access denied.")
         return redirect('/login')
 
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM slots WHERE lot_id = ? AND status = 'O'", (lot_id,))
     occupied_count = cur.fetchone()[0]
@@ -300,6 +451,9 @@ def delete_lot(lot_id):
     cur.execute("DELETE FROM parking_lots WHERE id = ?", (lot_id,))
     conn.commit()
     conn.close()
+    free_slots.discard_lot(lot_id)
+    invalidate_stats()
+    publish('slots_changed', lot_id=lot_id)
 
     flash('Parking lot and its slots deleted.')
     return redirect('/admin/lots')
@@ -312,12 +466,41 @@ def lot_summary():
     summary = get_lot_slot_summary()
     return render_template('lot_summary.html', summary=summary)
 
+ANALYTICS_DEFAULT_DAYS = {'day': 30, 'hour': 2}
+
+def analytics_filters(args):
+    """Parse analytics query args into get_analytics() arguments."""
+    granularity = args.get('granularity') or 'day'
+    if granularity not in ANALYTICS_DEFAULT_DAYS:
+        raise ValueError(f'unknown granularity {granularity}')
+    date_to = datetime.strptime(args.get('to') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+    if args.get('from'):
+        date_from = datetime.strptime(args['from'], '%Y-%m-%d')
+    else:
+        date_from = date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS[granularity] - 1)
+    lot_id = int(args['lot_id']) if args.get('lot_id') else None
+    return granularity, date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'), lot_id
+
+# Revenue and occupancy per lot, read from the rollup tables only
+@app.route('/admin/analytics')
+def analytics():
+    if not session.get('is_admin'):
+        flash("Access denied.")
+        return redirect('/login')
+    try:
+        report = get_analytics(*analytics_filters(request.args))
+    except ValueError as e:
+        flash(f'Invalid filter: {e}')
+        return redirect('/admin/analytics')
+    return render_template('analytics.html', report=report, lots=get_all_lots(),
+                           filters=request.args.to_dict())
+
 @app.route('/admin/edit_lot/<int:lot_id>', methods=['GET', 'POST'])
 def edit_lot(lot_id):
     if not session.get('is_admin'):
         flash("Access denied.")
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     if request.method == 'POST':
         lot_name = request.form['lot_name']
@@ -340,23 +523,9 @@ def edit_lot_spots(lot_id):
         flash("Access denied.")
         return redirect('/login')
     new_spots = int(request.form['new_spots'])
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM slots WHERE lot_id = ?", (lot_id,))
-    current_spots = cur.fetchone()[0]
-    if new_spots > current_spots:
-        # Add new slots
-        for i in range(current_spots + 1, new_spots + 1):
-            cur.execute("INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, ?, 'A')", (lot_id, f"Spot {i}", "",))
-    elif new_spots < current_spots:
-        # Remove slots (only those that are available)
-        cur.execute("SELECT id FROM slots WHERE lot_id = ? AND status = 'A' ORDER BY id DESC LIMIT ?", (lot_id, current_spots - new_spots))
-        slots_to_delete = cur.fetchall()
-        for slot in slots_to_delete:
-            cur.execute("DELETE FROM slots WHERE id = ?", (slot[0],))
-    conn.commit()
-    conn.close()
-    flash('Number of spots updated!')
+    report = resize_lot(lot_id, new_spots)
+    flash(f"Number of spots updated! (+{report['added']} / -{report['removed']} "
+          f"in {report['seconds'] * 1000:.0f} ms)")
     return redirect(f'/admin/edit_lot/{lot_id}')
 
 # ---------------- USER ROUTES ----------------
@@ -366,25 +535,19 @@ def book_slot():
     if 'username' not in session:
         flash("Please login first!")
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, price FROM parking_lots")
-    lots = cur.fetchall()
     if request.method == 'POST':
         lot_id = request.form['lot_id']
         vehicle_number = request.form['vehicle_number']
-        # Find first available slot in the selected lot
-        cur.execute("SELECT id FROM slots WHERE lot_id = ? AND status = 'A' ORDER BY id ASC LIMIT 1", (lot_id,))
-        slot = cur.fetchone()
-        if not slot:
-            conn.close()
+        # Claim the first available slot and record the booking in one transaction
+        if not allocate_slot(session['username'], lot_id, vehicle_number):
             flash('No available slots in this lot!')
             return redirect('/user/book')
-        slot_id = slot[0]
-        conn.close()
-        add_booking(session['username'], slot_id, vehicle_number)
         flash('Slot booked successfully!')
         return redirect('/user/bookings')
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id, name, price FROM parking_lots")
+    lots = cur.fetchall()
     conn.close()
     return render_template('book_slot.html', lots=lots)
 
@@ -393,7 +556,10 @@ def my_bookings():
     if 'username' not in session:
         flash("Please login first!")
         return redirect('/login')
-    bookings = get_user_bookings(session['username'])
+    principal = current_principal()
+    if principal is None:
+        return end_stale_session()
+    bookings = get_user_bookings(principal['id'])
     return render_template('my_bookings.html', bookings=bookings)
 
 @app.route('/user/release/<int:booking_id>')
@@ -415,39 +581,29 @@ def profile():
     if 'username' not in session:
         flash("Please login first!")
         return redirect('/login')
+    user = current_principal()
+    if user is None:
+        return end_stale_session()
     
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    
+    status = 200
     if request.method == 'POST':
         # Update user profile
         new_password = request.form.get('new_password')
         if new_password:
-            cur.execute("UPDATE users SET password = ? WHERE username = ?", 
-                       (new_password, session['username']))
-            conn.commit()
-            flash('Profile updated successfully!')
-    
-    # Get user info
-    cur.execute("SELECT * FROM users WHERE username = ?", (session['username'],))
-    user = cur.fetchone()
-    
-    # Get user statistics
-    cur.execute("SELECT COUNT(*) FROM bookings WHERE user_email = ?", (session['username'],))
-    total_bookings = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM bookings WHERE user_email = ? AND end_time IS NULL", 
-               (session['username'],))
-    active_bookings = cur.fetchone()[0]
-    
-    conn.close()
+            try:
+                set_password(session['username'], new_password)
+                flash('Profile updated successfully!')
+            except LoginBusy:
+                flash('Too many password changes right now, please try again in a moment.')
+                status = 503
     
-    user_stats = {
-        'total_bookings': total_bookings,
-        'active_bookings': active_bookings
+    # Get user info and statistics
+    stats = {
+        'total_bookings': user['total_bookings'],
+        'active_bookings': user['active_bookings']
     }
     
-    return render_template('profile.html', user=user, stats=user_stats)
+    return render_template('profile.html', user=user, stats=stats), status
 
 # Add API endpoint for real-time updates
 @app.route('/api/dashboard-stats')
@@ -455,44 +611,27 @@ def dashboard_stats():
     if 'username' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    
     if session.get('is_admin'):
         # Admin stats
-        cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'A'")
-        available_slots = cur.fetchone()[0]
-        
-        cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'O'")
-        occupied_slots = cur.fetchone()[0]
-        
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE end_time IS NULL")
-        active_bookings = cur.fetchone()[0]
-        
-        cur.execute("SELECT SUM(cost) FROM bookings WHERE DATE(start_time) = DATE('now')")
-        today_revenue = cur.fetchone()[0] or 0
-        
+        admin = admin_stats()
         stats = {
-            'available_slots': available_slots,
-            'occupied_slots': occupied_slots,
-            'active_bookings': active_bookings,
-            'today_revenue': today_revenue
+            'available_slots': admin['available_slots'],
+            'occupied_slots': admin['occupied_slots'],
+            'active_bookings': admin['active_bookings'],
+            'today_revenue': admin['today_revenue']
         }
     else:
         # User stats
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE user_email = ? AND end_time IS NULL", 
-                   (session['username'],))
-        active_bookings = cur.fetchone()[0]
-        
-        cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'A'")
-        available_slots = cur.fetchone()[0]
-        
+        principal = current_principal()
+        if principal is None:
+            session.clear()
+            return jsonify({'error': 'Unauthorized'}), 401
+        user = user_stats(principal['id'])
         stats = {
-            'active_bookings': active_bookings,
-            'available_slots': available_slots
+            'active_bookings': user['active_bookings'],
+            'available_slots': user['available_slots']
         }
     
-    conn.close()
     return jsonify(stats)
 
 # Add notification system
@@ -505,15 +644,15 @@ def get_notifications():
     
     if session.get('is_admin'):
         # Admin notifications
-        conn = sqlite3.connect('database.db')
+        conn = get_connection()
         cur = conn.cursor()
         
         # Check for overdue bookings (example: more than 24 hours)
         cur.execute('''
             SELECT COUNT(*) FROM bookings 
-            WHERE end_time IS NULL AND 
-            datetime('now') > datetime(start_time, '+24 hours')
-        ''')
+            WHERE end_ts IS NULL AND 
+            start_ts < ?
+        ''', (int(time.time()) - 24 * 3600,))
         overdue_count = cur.fetchone()[0]
         
         if overdue_count > 0:
@@ -527,6 +666,167 @@ def get_notifications():
     
     return jsonify(notifications)
 
+# Paginated bookings search for admins (same filters as /admin/all_bookings)
+@app.route('/api/admin/bookings')
+def api_all_bookings():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        filters = booking_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    bookings, next_before = search_bookings(**filters)
+    return jsonify({
+        'bookings': [{
+            'id': b[0],
+            'username': b[1],
+            'slot_id': b[2],
+            'vehicle_number': b[3],
+            'start_time': b[4],
+            'end_time': b[5],
+            'cost': b[6]
+        } for b in bookings],
+        'next_before': next_before
+    })
+
+# Streamed exports: rows are written as they are read, a batch at a time,
+# so a full year of history needs neither a big response buffer nor a long query
+EXPORT_FLUSH_ROWS = 500
+
+def export_filters(args):
+    """Parse export query args into export_bookings() keywords."""
+    filters = {}
+    if args.get('lot_id'):
+        filters['lot_id'] = int(args['lot_id'])
+    for arg, key in (('from', 'date_from'), ('to', 'date_to')):
+        if args.get(arg):
+            filters[key] = datetime.strptime(args[arg], '%Y-%m-%d').strftime('%Y-%m-%d')
+    return filters
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+        if len(lines) == EXPORT_FLUSH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
+
+@app.route('/api/admin/bookings/export')
+def api_export_bookings():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown format: {export_format}'}), 400
+    try:
+        filters = export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+    stream, mimetype = EXPORT_FORMATS[export_format]
+    name = 'bookings'
+    if 'lot_id' in filters:
+        name += f"-lot{filters['lot_id']}"
+    name += ''.join(f"-{filters[key]}" for key in ('date_from', 'date_to') if key in filters)
+    return Response(stream(export_bookings(**filters)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{name}.{export_format}"',
+        # Let proxies pass chunks through instead of buffering the whole file
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/admin/analytics')
+def api_analytics():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        return jsonify(get_analytics(*analytics_filters(request.args)))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {e}'}), 400
+
+# Connection pool metrics
+@app.route('/api/admin/db-pool')
+def db_pool_stats():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(pool_stats())
+
+# Slot allocation latency and contention counters
+@app.route('/api/admin/allocation-stats')
+def allocation_stats():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(get_allocation_stats())
+
+# Stats cache hit rate
+@app.route('/api/admin/cache-stats')
+def stats_cache_stats():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(cache_stats())
+
+# Per-route SQL profile and recent slow queries; DELETE clears them
+@app.route('/api/admin/sql-profile', methods=['GET', 'DELETE'])
+def sql_profile():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'DELETE':
+        reset_profiles()
+        return jsonify({'status': 'reset'})
+    return jsonify(profile_stats())
+
+# Lot pricing rule; PUT {"tariff": {...}} or {"tariff": null} for hourly at the lot price
+@app.route('/api/admin/lots/<int:lot_id>/tariff', methods=['GET', 'PUT'])
+def lot_tariff(lot_id):
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'PUT':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or 'tariff' not in body:
+            return jsonify({'error': 'Expected a JSON body with a tariff field'}), 400
+        try:
+            found = set_lot_tariff(lot_id, body['tariff'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not found:
+            return jsonify({'error': 'Lot not found'}), 404
+    tariff = get_lot_tariff(lot_id)
+    if tariff is None:
+        return jsonify({'error': 'Lot not found'}), 404
+    return jsonify({'tariff': tariff[0], 'effective': tariff[1]})
+
+# Re-price closed bookings, e.g. after a tariff change (retariff applies current rules)
+@app.route('/api/admin/billing/recompute', methods=['POST'])
+def billing_recompute():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    body = request.get_json(silent=True) or {}
+    try:
+        lot_id = int(body['lot_id']) if body.get('lot_id') is not None else None
+        since = body.get('since') or None
+        if since:
+            datetime.strptime(since, '%Y-%m-%d')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    return jsonify(recompute_costs(lot_id, since, bool(body.get('retariff'))))
+
 # ---------------- CHAT ROUTES ----------------
 
 @app.route('/chat')
@@ -535,8 +835,9 @@ def chat():
         flash("Please login to access chat!")
         return redirect('/login')
     
-    messages = get_recent_messages()
-    online_users = get_online_users()
+    _, messages = recent_messages.snapshot()
+    ensure_presence_sweeper()
+    online_users = presence.snapshot()
     
     return render_template('chat.html', 
                          messages=messages, 
@@ -544,24 +845,164 @@ def chat():
                          current_user=session['username'],
                          is_admin=session.get('is_admin', 0))
 
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 200
+CHAT_FIELDS = ['id', 'username', 'message', 'timestamp', 'is_admin']
+
+def chat_page_args(args):
+    """Parse /api/chat/messages paging args into (mode, cursor id, limit)."""
+    limit = min(int(args.get('limit') or CHAT_PAGE_SIZE), CHAT_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    mode = 'before' if 'before' in args else 'since'
+    return mode, int(args[mode]), limit
+
 @app.route('/api/chat/messages')
 def get_chat_messages():
     if 'username' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
+
+    # Older history (?before=<id>) or reconnect catch-up (?since=<id>)
+    if 'before' in request.args or 'since' in request.args:
+        try:
+            mode, cursor, limit = chat_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+        # Fetch one extra row to know whether another page exists
+        if mode == 'before':
+            rows = get_messages_before(cursor, limit + 1)
+            more = len(rows) > limit
+            rows = rows[1:] if more else rows
+        else:
+            rows = get_messages_since(cursor, limit + 1)
+            more = len(rows) > limit
+            rows = rows[:limit]
+        return jsonify({
+            'fields': CHAT_FIELDS,
+            'rows': [[msg[4], msg[0], msg[1], msg[2], msg[3]] for msg in rows],
+            'has_more': more
+        })
     
-    messages = get_recent_messages()
-    return jsonify([{
+    # Served from the in-memory ring; unchanged history answers 304
+    etag, messages = recent_messages.snapshot()
+    if request.if_none_match.contains_weak(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+    response = jsonify([{
+        'id': msg[4],
         'username': msg[0],
         'message': msg[1],
         'timestamp': msg[2],
         'is_admin': msg[3]
     } for msg in messages])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ---------------- DASHBOARD PUSH ----------------
+
+# Dashboard pages connect with auth={'channel': 'dashboard'} and get compact
+# deltas whenever a write happens, instead of polling the whole page.
+@subscribe
+def push_dashboard_update(event, payload):
+    username = payload.get('username')
+    if event == 'booking_started':
+        socketio.emit('dashboard:slot', {
+            'slot_id': payload['slot_id'],
+            'lot_id': payload['lot_id'],
+            'status': 'O',
+            'vehicle_number': payload['vehicle_number'],
+            'username': username,
+            'start_time': payload['start_time']
+        }, room='admin_dashboard')
+    elif event == 'booking_ended':
+        socketio.emit('dashboard:slot', {
+            'slot_id': payload['slot_id'],
+            'lot_id': payload['lot_id'],
+            'status': 'A'
+        }, room='admin_dashboard')
+    elif event == 'slots_changed':
+        socketio.emit('dashboard:layout', payload, room='admin_dashboard')
+
+    if event in ('booking_started', 'booking_ended'):
+        socketio.emit('dashboard:booking', dict(payload, type=event), room=f'user:{username}')
+    else:
+        username = None
+    user_id = payload.get('user_id') if username else None
+    push_dashboard_stats(user_id, username)
+    # Dashboards open on other workers get their stats from those workers
+    if config.SOCKETIO_MESSAGE_QUEUE:
+        socketio.emit('dashboard:refresh', {'user_id': user_id, 'username': username},
+                      room='dashboard:refresh')
+
+def has_listeners(room):
+    return next(socketio.server.manager.get_participants('/', room), None) is not None
+
+# Stats are only computed for dashboards connected to this worker, and only
+# sent to them: every worker does the same for its own sockets
+def push_dashboard_stats(user_id=None, username=None):
+    if user_id is not None and has_listeners(f'user:{username}'):
+        socketio.emit('dashboard:stats', user_stats(user_id), room=f'user:{username}',
+                      ignore_queue=True)
+    if has_listeners('admin_dashboard'):
+        socketio.emit('dashboard:stats', admin_stats(), room='admin_dashboard', ignore_queue=True)
+
+# ---------------- CHAT PRESENCE ----------------
+
+# Online users come from live chat sockets, refcounted per tab; a sweeper
+# drops sockets whose heartbeats stopped without a disconnect event.
+_presence_sweeper = {'pid': None}
+
+# Events name the worker holding the sockets: a user is online while any
+# worker has them, which pages track per badge
+def broadcast_presence(username, online, is_admin=0, worker=None):
+    if config.PRESENCE_BROADCAST:
+        socketio.emit('presence', {
+            'username': username,
+            'online': online,
+            'is_admin': is_admin,
+            'worker': worker or presence.worker
+        }, room='general_chat')
+
+# Full online list for the other workers' registries; no socket is in this room
+def sync_presence():
+    if config.SOCKETIO_MESSAGE_QUEUE:
+        socketio.emit('presence:sync', {'worker': presence.worker, 'users': presence.local_users()},
+                      room='presence:sync')
+
+def sweep_presence():
+    # Announce this worker; the others answer with their lists
+    sync_presence()
+    while True:
+        socketio.sleep(config.PRESENCE_SWEEP_INTERVAL)
+        offline, dropped = presence.expire()
+        for username in offline:
+            broadcast_presence(username, False)
+        for worker, username in dropped:
+            broadcast_presence(username, False, worker=worker)
+        sync_presence()
+
+def ensure_presence_sweeper():
+    if _presence_sweeper['pid'] != os.getpid():
+        _presence_sweeper['pid'] = os.getpid()
+        socketio.start_background_task(sweep_presence)
 
 # SocketIO Events
 @socketio.on('connect')
-def on_connect():
+def on_connect(auth=None):
+    if auth and auth.get('channel') == 'dashboard':
+        # Per-socket session: marks this connection as a dashboard listener only
+        session['channel'] = 'dashboard'
+        if session.get('is_admin'):
+            join_room('admin_dashboard')
+        elif 'username' in session:
+            join_room(f"user:{session['username']}")
+        return
     if 'username' in session:
         join_room('general_chat')
+        CHAT_CONNECTIONS.inc('general_chat')
+        ensure_presence_sweeper()
+        if presence.connect(request.sid, session['username'], session.get('is_admin', 0)):
+            broadcast_presence(session['username'], True, session.get('is_admin', 0))
         emit('status', {
             'msg': f"{session['username']} has entered the chat.",
             'username': session['username'],
@@ -570,32 +1011,88 @@ def on_connect():
 
 @socketio.on('disconnect')
 def on_disconnect():
+    if session.get('channel') == 'dashboard':
+        return
     if 'username' in session:
         leave_room('general_chat')
+        CHAT_CONNECTIONS.dec('general_chat')
+        if presence.disconnect(request.sid):
+            broadcast_presence(session['username'], False)
         emit('status', {
             'msg': f"{session['username']} has left the chat.",
             'username': session['username']
         }, room='general_chat')
 
+def touch_presence():
+    # A socket that outlived its expired session is registered again
+    if not presence.heartbeat(request.sid):
+        if presence.connect(request.sid, session['username'], session.get('is_admin', 0)):
+            broadcast_presence(session['username'], True, session.get('is_admin', 0))
+
+@socketio.on('presence:heartbeat')
+def handle_heartbeat():
+    if session.get('channel') == 'dashboard' or 'username' not in session:
+        return
+    touch_presence()
+
 @socketio.on('message')
 def handle_message(data):
     if 'username' not in session:
         return
+    touch_presence()
     
     username = session['username']
     message = data['message']
     is_admin = session.get('is_admin', 0)
     
-    # Save to database
-    add_message(username, message, is_admin)
-    
-    # Broadcast to all users
-    emit('message', {
-        'username': username,
-        'message': message,
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'is_admin': is_admin
-    }, room='general_chat')
+    sid = request.sid
+
+    # Broadcast once the row has committed, so every client and worker sees its id
+    def deliver(chat_message):
+        if chat_message.error is not None:
+            socketio.emit('chat_error', {'msg': 'Your message could not be saved, please send it again.',
+                                         'message': message}, to=sid)
+            return
+        recent_messages.append(chat_message)
+        socketio.emit('message', {
+            'id': chat_message.id,
+            'username': username,
+            'message': message,
+            'timestamp': chat_message.timestamp,
+            'is_admin': is_admin
+        }, room='general_chat')
+
+    # Queue for batched persistence; refuse the message if the writer is backed up
+    try:
+        queue_message(username, message, is_admin, on_done=deliver)
+    except ChatQueueFull:
+        emit('chat_error', {'msg': 'Chat is busy, please send your message again.', 'message': message})
+    except sqlite3.Error:
+        # 'group' and 'sync' re-raise a failed write; deliver() has told the sender
+        pass
+
+# Chat handled by another worker: keep this worker's history ring in step.
+# Workers broadcast after the commit, so the relayed message has its id.
+@on_remote_emit
+def relay_chat_history(event, data, room):
+    if event == 'message' and room == 'general_chat' and data.get('id') is not None:
+        chat_message = ChatMessage(data['username'], data['message'], data['is_admin'], False, data['timestamp'])
+        chat_message.id = data['id']
+        recent_messages.append(chat_message)
+
+# Presence on other workers, for this worker's online list
+@on_remote_emit
+def relay_presence(event, data, room):
+    if event == 'presence' and data.get('worker'):
+        presence.remote_change(data['worker'], data['username'], data['online'], data.get('is_admin', 0))
+    elif event == 'presence:sync':
+        if presence.sync(data['worker'], data['users']):
+            sync_presence()
+
+@on_remote_emit
+def relay_dashboard_refresh(event, data, room):
+    if event == 'dashboard:refresh':
+        push_dashboard_stats(data.get('user_id'), data.get('username'))
 
 # ---------------- RUN ----------------
 
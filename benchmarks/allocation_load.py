@@ -0,0 +1,116 @@
+"""Concurrent load check for the slot allocation engine.
+
+Hammers allocate_slot() from many threads (or processes) against a scratch
+database and fails if any slot ends up with more than one active booking.
+
+    python -m benchmarks.allocation_load --slots 500 --bookings 2000 --workers 32
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def _setup(path, lots, slots_per_lot):
+    os.environ['DATABASE_PATH'] = path
+    from models.db import get_connection
+    from models.migrate import upgrade
+    upgrade()
+    conn = get_connection()
+    cur = conn.cursor()
+    for lot in range(lots):
+        cur.execute("INSERT INTO parking_lots (name, price) VALUES (?, ?)", (f"Lot {lot + 1}", 20))
+        lot_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, '', 'A')",
+            [(lot_id, f"Spot {i + 1}") for i in range(slots_per_lot)],
+        )
+    conn.commit()
+    conn.close()
+
+
+_index_ready = False
+
+
+def _book(args):
+    path, lot_id, n, worker = args
+    os.environ['DATABASE_PATH'] = path
+    from models.booking_model import allocate_slot, get_allocation_stats
+    from models.slot_index import free_slots
+    global _index_ready
+    if not _index_ready:
+        _index_ready = True
+        free_slots.rebuild()
+    ok = 0
+    for i in range(n):
+        if allocate_slot(f"user{worker}_{i}", lot_id, f"KA{worker:02d}{i:04d}"):
+            ok += 1
+    return ok, get_allocation_stats()
+
+
+def _verify(path):
+    import sqlite3
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    doubles = cur.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT slot_id FROM bookings WHERE end_time IS NULL
+            GROUP BY slot_id HAVING COUNT(*) > 1
+        )
+    ''').fetchone()[0]
+    active = cur.execute("SELECT COUNT(*) FROM bookings WHERE end_time IS NULL").fetchone()[0]
+    occupied = cur.execute("SELECT COUNT(*) FROM slots WHERE status = 'O'").fetchone()[0]
+    conn.close()
+    return doubles, active, occupied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=1)
+    parser.add_argument('--slots', type=int, default=500, help='slots per lot')
+    parser.add_argument('--bookings', type=int, default=2000, help='total booking attempts')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--processes', action='store_true', help='use processes instead of threads')
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'allocation.db')
+    _setup(path, args.lots, args.slots)
+
+    per_worker = max(1, args.bookings // args.workers)
+    jobs = [(path, 1 + w % args.lots, per_worker, w) for w in range(args.workers)]
+    executor = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    kwargs = {'mp_context': multiprocessing.get_context('spawn')} if args.processes else {}
+
+    started = time.perf_counter()
+    with executor(max_workers=args.workers, **kwargs) as pool:
+        results = list(pool.map(_book, jobs))
+    elapsed = time.perf_counter() - started
+
+    booked = sum(ok for ok, _ in results)
+    attempts = per_worker * args.workers
+    if args.processes:
+        retries = sum(stats['retries'] for _, stats in results)
+    else:
+        from models.booking_model import get_allocation_stats
+        retries = get_allocation_stats()['retries']
+    doubles, active, occupied = _verify(path)
+
+    print(f"attempts={attempts} booked={booked} elapsed={elapsed:.3f}s "
+          f"rate={attempts / elapsed:.0f}/s retries={retries}")
+    print(f"double_allocations={doubles} active_bookings={active} occupied_slots={occupied}")
+
+    per_lot = {}
+    for _, lot_id, n, _ in jobs:
+        per_lot[lot_id] = per_lot.get(lot_id, 0) + n
+    expected = sum(min(n, args.slots) for n in per_lot.values())
+    if doubles or active != occupied or booked != active or booked != expected:
+        print("FAILED: allocation invariants violated")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Analytics from the rollup tables against aggregating bookings directly.
+
+For each size, generates a database, rebuilds the rollups, then times the
+analytics reads (90 days daily and 7 days hourly, all lots) against the
+same figures computed from bookings with GROUP BY. Also times a
+book-and-release cycle with and without the rollup triggers, which is
+what keeping the rollups current costs each write.
+
+    python -m benchmarks.analytics --sizes 100000,1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.datagen import generate
+
+DIRECT = {
+    'day': "CAST(strftime('%s', date(ts, 'unixepoch', 'localtime'), 'utc') AS INTEGER)",
+    'hour': 'ts - ts % 3600',
+}
+
+
+def _direct_sql(granularity):
+    bucket = DIRECT[granularity]
+    return f'''
+        WITH events AS (
+            SELECT lot_id, start_ts AS ts, 1 AS started, 0 AS ended, 0 AS revenue, 0 AS dwell
+            FROM bookings WHERE start_ts >= :start AND start_ts < :end
+            UNION ALL
+            SELECT lot_id, end_ts, 0, 1, cost, end_ts - start_ts
+            FROM bookings WHERE end_ts >= :start AND end_ts < :end
+        )
+        SELECT lot_id, {bucket} AS bucket, SUM(started), SUM(ended), SUM(revenue), SUM(dwell)
+        FROM events GROUP BY lot_id, bucket
+    '''
+
+
+def _median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def _cycle_ms(cycles, lot_id):
+    from models.booking_model import allocate_slot, release_booking
+    timings = []
+    for i in range(cycles):
+        started = time.perf_counter()
+        booking_id, _ = allocate_slot('user0', lot_id, f"BM{i:05d}")
+        release_booking(booking_id)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--cycles', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    today = datetime.now()
+    ranges = {
+        'day': ((today - timedelta(days=89)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')),
+        'hour': ((today - timedelta(days=6)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')),
+    }
+    for size in map(int, args.sizes.split(',')):
+        path = os.path.join(workdir, f"analytics-{size}.db")
+        generate(path, lots=50, slots=200, bookings=size, users=1000, occupancy=0.2)
+        from models.analytics import get_analytics, rebuild_rollups
+        from models.db import get_connection
+        from models.slot_index import free_slots
+        from models.timestamps import day_start, day_end
+        free_slots.rebuild()
+        report = rebuild_rollups()
+        print(f"\n{size} bookings: rebuilt {report['rows']} rollup rows for {report['lots']} lots "
+              f"in {report['seconds']}s")
+
+        print(f"  {'view':<22}{'rollups ms':>12}{'bookings ms':>13}")
+        conn = get_connection()
+        for granularity, (date_from, date_to) in ranges.items():
+            bounds = {'start': day_start(date_from), 'end': day_end(date_to)}
+            sql = _direct_sql(granularity)
+            rollup_ms = _median_ms(lambda: get_analytics(granularity, date_from, date_to), args.repeat)
+            direct_ms = _median_ms(lambda: conn.execute(sql, bounds).fetchall(), args.repeat)
+            name = f"{granularity}, {date_from}.."
+            print(f"  {name:<22}{rollup_ms:>12.2f}{direct_ms:>13.2f}")
+        conn.close()
+
+        with_triggers = _cycle_ms(args.cycles, 1)
+        conn = get_connection()
+        triggers = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_rollups_%'"
+        ).fetchall()
+        for (name,) in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.commit()
+        conn.close()
+        without_triggers = _cycle_ms(args.cycles, 1)
+        print(f"  book+release cycle: {with_triggers:.3f}ms with rollup triggers, "
+              f"{without_triggers:.3f}ms without")
+        os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Booking release and bulk re-pricing cost.
+
+On a generated database: times release_booking() for active bookings, then
+re-prices every closed booking, first with the stored snapshots (which must
+reproduce the generated costs exactly), then with rules that need the
+compiled evaluators. For comparison it also times the old approach of
+fetching rows and pricing them with strptime in a Python loop.
+
+    python -m benchmarks.billing --bookings 50000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.datagen import generate
+from benchmarks.hot_paths import summarize
+
+RULES = {
+    'ceil + daily cap': {'rounding': 'ceil', 'daily_cap': 100},
+    'per-minute': {'unit': 'minute', 'rate': 0.5, 'rounding': 'ceil'},
+    'night rate + cap': {'rounding': 'ceil', 'daily_cap': 150,
+                         'periods': [{'from': '22:00', 'to': '06:00', 'rate': 5}]},
+}
+
+
+def python_loop(path):
+    """The old per-row pricing: look up the lot price, strptime both ends."""
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    rows = conn.execute('''
+        SELECT b.id, b.start_time, b.end_time, p.price
+        FROM bookings b JOIN slots s ON s.id = b.slot_id JOIN parking_lots p ON p.id = s.lot_id
+        WHERE b.end_time IS NOT NULL
+    ''').fetchall()
+    updates = []
+    for booking_id, start_time, end_time, price in rows:
+        start_dt = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
+        end_dt = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
+        updates.append((price * max(1, int((end_dt - start_dt).total_seconds() // 3600)), booking_id))
+    conn.executemany("UPDATE bookings SET cost = ? WHERE id = ?", updates)
+    conn.commit()
+    conn.close()
+    return len(updates), time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--releases', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'billing.db')
+    generate(path, lots=20, slots=100, bookings=args.bookings, users=200, occupancy=0.2)
+    from models.billing import recompute_costs, set_lot_tariff
+    from models.booking_model import release_booking
+
+    conn = sqlite3.connect(path)
+    expected = dict(conn.execute("SELECT id, cost FROM bookings WHERE end_time IS NOT NULL"))
+    lots = [row[0] for row in conn.execute("SELECT id FROM parking_lots")]
+    active = [row[0] for row in conn.execute("SELECT id FROM bookings WHERE end_time IS NULL LIMIT ?",
+                                             (args.releases,))]
+    conn.close()
+
+    latencies = []
+    for booking_id in active:
+        started = time.perf_counter()
+        release_booking(booking_id)
+        latencies.append(time.perf_counter() - started)
+    report = summarize(latencies, 0, sum(latencies))
+    print(f"release_booking: {report['requests']} releases, p50={report.get('p50_ms')}ms "
+          f"p99={report.get('p99_ms')}ms")
+
+    count, seconds = python_loop(path)
+    print(f"{'python loop (old)':<22}{count:>8} bookings {seconds:>8.3f}s {count / seconds:>10.0f}/s")
+
+    report = recompute_costs()
+    conn = sqlite3.connect(path)
+    actual = dict(conn.execute("SELECT id, cost FROM bookings WHERE id IN (%s)" % ','.join(map(str, expected))))
+    conn.close()
+    mismatched = [i for i, cost in expected.items() if actual.get(i) != cost]
+    print(f"{'snapshots':<22}{report['bookings']:>8} bookings {report['seconds']:>8.3f}s "
+          f"{report['bookings'] / report['seconds']:>10.0f}/s")
+    if mismatched:
+        print(f"FAILED: {len(mismatched)} bookings priced differently from the generated costs")
+        return 1
+
+    for name, rule in RULES.items():
+        for lot_id in lots:
+            set_lot_tariff(lot_id, rule)
+        report = recompute_costs(retariff=True)
+        print(f"{name:<22}{report['bookings']:>8} bookings {report['seconds']:>8.3f}s "
+              f"{report['bookings'] / report['seconds']:>10.0f}/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Chat persistence throughput for each CHAT_DURABILITY mode.
+
+Sends bursts of messages from concurrent senders through queue_message()
+against a scratch database and reports the per-message latency a Socket.IO
+handler sees before it returns, the latency until the message is committed
+and broadcast (its on_done runs), plus end-to-end throughput until every
+message is committed. --idle sends one message at a time with pauses, the
+quiet-chat case.
+
+    python -m benchmarks.chat_write --senders 16 --messages 200
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.hot_paths import summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--senders', type=int, default=16)
+    parser.add_argument('--messages', type=int, default=200, help='messages per sender')
+    parser.add_argument('--modes', default='sync,group,async')
+    parser.add_argument('--idle', action='store_true', help='one sender, 20 ms between messages')
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'chat.db')
+    os.environ['DATABASE_PATH'] = path
+    import config
+    from models.migrate import upgrade
+    from models.chat_writer import queue_message, chat_writer
+    upgrade()
+
+    if args.idle:
+        args.senders = 1
+    print(f"{'mode':<8}{'messages':>9}{'msg/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'bcast p50':>11}{'bcast p95':>11}  (ms)")
+    for mode in args.modes.split(','):
+        config.CHAT_DURABILITY = mode
+        latencies = [[] for _ in range(args.senders)]
+        visible = []
+        barrier = threading.Barrier(args.senders + 1)
+
+        def sender(n):
+            barrier.wait()
+            for i in range(args.messages):
+                started = time.perf_counter()
+                queue_message(f"user{n}", f"{mode} message {i}",
+                              on_done=lambda message, started=started: visible.append(time.perf_counter() - started))
+                latencies[n].append(time.perf_counter() - started)
+                if args.idle:
+                    time.sleep(0.02)
+
+        threads = [threading.Thread(target=sender, args=(n,)) for n in range(args.senders)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        chat_writer.flush()
+        elapsed = time.perf_counter() - started
+
+        report = summarize([s for per in latencies for s in per], 0, elapsed)
+        conn = sqlite3.connect(path)
+        stored = conn.execute("SELECT COUNT(*) FROM chat_messages WHERE message LIKE ?", (f"{mode} %",)).fetchone()[0]
+        conn.close()
+        if stored != report['requests']:
+            print(f"FAILED: {mode} stored {stored} of {report['requests']} messages")
+            return 1
+        broadcast = summarize(visible, 0, elapsed)
+        print(f"{mode:<8}{report['requests']:>9}{report['throughput_rps']:>10}"
+              f"{report['p50_ms']:>9}{report['p95_ms']:>9}{report['p99_ms']:>9}"
+              f"{broadcast['p50_ms']:>11}{broadcast['p95_ms']:>11}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
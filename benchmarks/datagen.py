@@ -0,0 +1,139 @@
+"""Synthetic dataset generator for benchmarks.
+
+Builds a database with N lots of M slots, U users and K closed historical
+bookings, plus a share of slots currently occupied. The same seed always
+produces the same data.
+
+    python -m benchmarks.datagen bench.db --lots 20 --slots 100 --bookings 50000 --users 1000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+USER_PASSWORD = 'pw'
+ADMIN = ('admin', 'admin123')
+
+
+def _vehicle(rng):
+    return f"KA{rng.randint(1, 99):02d}{rng.choice('ABCDEFGHJK')}{rng.randint(1000, 9999)}"
+
+
+def generate(path, lots=20, slots=100, bookings=50000, users=1000, occupancy=0.2, seed=42):
+    """Create a fresh database at path and return a summary of its contents."""
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_PATH'] = path
+    import config
+    from models.db import get_connection, close_pool
+    from models.migrate import upgrade
+    from models.billing import EFFECTIVE_TARIFF
+    from models.credentials import hash_password
+    # A second call in the same process must not reuse the first database
+    config.DATABASE = path
+    close_pool()
+    upgrade()
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    fmt = '%Y-%m-%d %H:%M:%S'
+
+    conn = get_connection()
+    cur = conn.cursor()
+    # One scrypt hash shared by every generated user; hashing each would take minutes
+    user_hash = hash_password(USER_PASSWORD)
+    cur.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, 1)",
+                (ADMIN[0], hash_password(ADMIN[1])))
+    cur.executemany(
+        "INSERT INTO users (username, password, is_admin) VALUES (?, ?, 0)",
+        [(f"user{u}", user_hash) for u in range(users)],
+    )
+    cur.execute("SELECT username, id FROM users")
+    user_ids = dict(cur.fetchall())
+
+    prices = {}
+    for lot in range(lots):
+        price = rng.choice((10, 15, 20, 30, 40))
+        cur.execute("INSERT INTO parking_lots (name, price) VALUES (?, ?)", (f"Lot {lot + 1}", price))
+        lot_id = cur.lastrowid
+        prices[lot_id] = price
+        cur.executemany(
+            "INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, '', 'A')",
+            [(lot_id, f"Spot {i + 1}") for i in range(slots)],
+        )
+    cur.execute("SELECT id, lot_id FROM slots ORDER BY id")
+    slot_ids = cur.fetchall()
+    # Same snapshot the app takes at booking time, so no insert trigger has to
+    cur.execute(f"SELECT p.id, {EFFECTIVE_TARIFF} FROM parking_lots p")
+    tariffs = dict(cur.fetchall())
+
+    # Closed bookings spread over the last 90 days
+    history = []
+    for _ in range(bookings):
+        slot_id, lot_id = rng.choice(slot_ids)
+        start = now - timedelta(minutes=rng.randint(60, 90 * 24 * 60))
+        hours = rng.randint(1, 12)
+        end = start + timedelta(hours=hours, minutes=rng.randint(0, 59))
+        username = f"user{rng.randrange(users)}"
+        history.append((username, user_ids[username], slot_id, _vehicle(rng),
+                        start.strftime(fmt), end.strftime(fmt), prices[lot_id] * hours,
+                        int(start.timestamp()), int(end.timestamp()), lot_id, tariffs[lot_id]))
+    history.sort(key=lambda row: row[4])
+    cur.executemany('''
+        INSERT INTO bookings (user_email, user_id, slot_id, vehicle_number, start_time, end_time, cost,
+                              start_ts, end_ts, lot_id, tariff)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', history)
+
+    # Currently parked vehicles
+    occupied = rng.sample(slot_ids, int(len(slot_ids) * occupancy))
+    cur.executemany(
+        "UPDATE slots SET status = 'O' WHERE id = ?",
+        [(slot_id,) for slot_id, _ in occupied],
+    )
+    parked = []
+    for slot_id, lot_id in occupied:
+        start = now - timedelta(minutes=rng.randint(1, 600))
+        username = f"user{rng.randrange(users)}"
+        parked.append((username, user_ids[username], slot_id, _vehicle(rng), start.strftime(fmt),
+                       int(start.timestamp()), lot_id, tariffs[lot_id]))
+    cur.executemany('''
+        INSERT INTO bookings (user_email, user_id, slot_id, vehicle_number, start_time, start_ts, lot_id, tariff)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', parked)
+    conn.commit()
+    conn.close()
+    close_pool()
+
+    return {
+        'lots': lots,
+        'slots_per_lot': slots,
+        'historical_bookings': bookings,
+        'active_bookings': len(occupied),
+        'users': users,
+        'seed': seed,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--slots', type=int, default=100, help='slots per lot')
+    parser.add_argument('--bookings', type=int, default=50000, help='closed historical bookings')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--occupancy', type=float, default=0.2, help='share of slots currently occupied')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    summary = generate(args.path, args.lots, args.slots, args.bookings, args.users, args.occupancy, args.seed)
+    print(' '.join(f"{key}={value}" for key, value in summary.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
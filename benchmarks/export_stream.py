@@ -0,0 +1,90 @@
+"""Memory and time for a full bookings export, streamed vs materialized.
+
+Generates a database, then writes every booking as CSV two ways: the
+streamed export the /api/admin/bookings/export route serves, and the
+old all-rows approach (one fetchall(), one response string). Reports
+time to first chunk, total time and the Python heap peak for each; the
+streamed peak should stay flat as the table grows.
+
+    python -m benchmarks.export_stream --sizes 100000,1000000
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.datagen import generate
+
+MATERIALIZED = '''
+    SELECT b.id, b.lot_id, l.name, b.slot_id, s.location, b.user_id, b.user_email,
+           b.vehicle_number, b.start_time, b.end_time, b.cost
+    FROM bookings b
+    LEFT JOIN parking_lots l ON l.id = b.lot_id
+    LEFT JOIN slots s ON s.id = b.slot_id
+    ORDER BY b.start_ts, b.id
+'''
+
+
+def materialized():
+    from models.booking_model import EXPORT_COLUMNS
+    from models.db import get_connection
+    conn = get_connection()
+    rows = conn.execute(MATERIALIZED).fetchall()
+    conn.close()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    yield buffer.getvalue()
+
+
+def streamed():
+    from app import stream_csv
+    from models.booking_model import export_bookings
+    return stream_csv(export_bookings())
+
+
+def _import_app():
+    # After generate() has pointed DATABASE_PATH at the scratch database,
+    # and outside the measurement: app runs migrations on import
+    import app  # noqa: F401
+
+
+def measure(chunks):
+    tracemalloc.start()
+    started = time.perf_counter()
+    first, size = None, 0
+    for chunk in chunks():
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first * 1000, elapsed, peak / 2 ** 20, size / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'bookings':>10}  {'mode':<13}{'first ms':>10}{'total s':>9}{'peak MiB':>10}{'out MiB':>9}")
+    for size in map(int, args.sizes.split(',')):
+        path = os.path.join(workdir, f"export-{size}.db")
+        generate(path, lots=50, slots=200, bookings=size, users=1000, occupancy=0.2)
+        _import_app()
+        for name, chunks in (('materialized', materialized), ('streamed', streamed)):
+            first_ms, elapsed, peak, out = measure(chunks)
+            print(f"{size:>10}  {name:<13}{first_ms:>10.1f}{elapsed:>9.2f}{peak:>10.1f}{out:>9.1f}")
+        os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""Latency and throughput benchmark for the booking and dashboard hot paths.
+
+Generates a synthetic dataset (see benchmarks.datagen), then drives
+/user/book, /user/release/<id>, /admin/dashboard and /api/dashboard-stats
+from concurrent virtual users, either in-process through the Flask test
+client or over HTTP against a local gunicorn with several workers. Results
+are written as JSON so runs from different commits can be compared.
+
+    python -m benchmarks.hot_paths --mode client --concurrency 8 --iterations 200
+    python -m benchmarks.hot_paths --mode http --workers 4 --concurrency 16
+    python -m benchmarks.hot_paths --compare benchmarks/results/old.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from benchmarks import datagen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+PERCENTILES = (50, 90, 95, 99)
+
+
+# ---------------- SESSIONS ----------------
+
+class ClientSession:
+    """One logged-in browser, backed by the Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Location', '')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """One logged-in browser talking to a real server over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                response.read()
+                return response.status, response.headers.get('Location', '')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('Location', '')
+
+
+# ---------------- SCENARIOS ----------------
+
+def _active_booking(path, username):
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute(
+            "SELECT MAX(b.id) FROM bookings b JOIN users u ON b.user_id = u.id "
+            "WHERE u.username = ? AND b.end_time IS NULL", (username,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0]
+
+
+def _timed(session, record, name, method, path, data=None, expect=''):
+    started = time.perf_counter()
+    try:
+        status, location = session.request(method, path, data)
+        ok = status < 400 and expect in location
+    except OSError:
+        ok = False
+    record(name, time.perf_counter() - started, ok)
+    return ok
+
+
+def book_release(session, ctx, worker, iteration, record):
+    lot_id = 1 + (worker + iteration) % ctx['lots']
+    booked = _timed(session, record, 'book', 'POST', '/user/book',
+                    {'lot_id': str(lot_id), 'vehicle_number': f"BN{worker:03d}{iteration:05d}"},
+                    expect='/user/bookings')
+    booking_id = booked and _active_booking(ctx['path'], f"user{worker}")
+    if booking_id:
+        _timed(session, record, 'release', 'GET', f"/user/release/{booking_id}", expect='/user/bookings')
+
+
+def admin_dashboard(session, ctx, worker, iteration, record):
+    _timed(session, record, 'admin_dashboard', 'GET', '/admin/dashboard')
+
+
+def dashboard_stats_admin(session, ctx, worker, iteration, record):
+    _timed(session, record, 'dashboard_stats_admin', 'GET', '/api/dashboard-stats')
+
+
+def dashboard_stats_user(session, ctx, worker, iteration, record):
+    _timed(session, record, 'dashboard_stats_user', 'GET', '/api/dashboard-stats')
+
+
+# phase name -> (log in as admin?, step)
+PHASES = {
+    'book_release': (False, book_release),
+    'admin_dashboard': (True, admin_dashboard),
+    'dashboard_stats_admin': (True, dashboard_stats_admin),
+    'dashboard_stats_user': (False, dashboard_stats_user),
+}
+
+
+# ---------------- DRIVER ----------------
+
+def _login(session, worker, as_admin):
+    username, password = datagen.ADMIN if as_admin else (f"user{worker}", datagen.USER_PASSWORD)
+    status, _ = session.request('POST', '/login', {'username': username, 'password': password})
+    if status >= 400:
+        raise RuntimeError(f"login failed for {username}: HTTP {status}")
+
+
+def run_phase(make_session, ctx, phase, concurrency, iterations, warmup):
+    as_admin, step = PHASES[phase]
+    sessions = []
+    for worker in range(concurrency):
+        session = make_session()
+        _login(session, worker, as_admin)
+        sessions.append(session)
+    for worker, session in enumerate(sessions[:1]):
+        for iteration in range(warmup):
+            step(session, ctx, worker, -1 - iteration, lambda *args: None)
+
+    samples = [{} for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker_loop(worker):
+        mine = samples[worker]
+
+        def record(name, seconds, ok):
+            latencies, errors = mine.setdefault(name, ([], [0]))
+            latencies.append(seconds)
+            if not ok:
+                errors[0] += 1
+
+        barrier.wait()
+        for iteration in range(iterations):
+            step(sessions[worker], ctx, worker, iteration, record)
+
+    threads = [threading.Thread(target=worker_loop, args=(w,)) for w in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = {}
+    for mine in samples:
+        for name, (latencies, errors) in mine.items():
+            entry = merged.setdefault(name, ([], [0]))
+            entry[0].extend(latencies)
+            entry[1][0] += errors[0]
+    return {name: summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in merged.items()}
+
+
+def _percentile(ordered, pct):
+    # Nearest-rank percentile
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    report = {
+        'requests': len(ordered),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+    }
+    if ordered:
+        report['mean_ms'] = round(sum(ordered) / len(ordered) * 1000, 3)
+        for pct in PERCENTILES:
+            report[f"p{pct}_ms"] = round(_percentile(ordered, pct) * 1000, 3)
+        report['max_ms'] = round(ordered[-1] * 1000, 3)
+    return report
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(path, workers, threads, worker_class=None, app='app:app'):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_PATH=path)
+    worker_args = ['--worker-class', worker_class] if worker_class else []
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+         *worker_args, '--bind', f"127.0.0.1:{port}", '--log-level', 'warning', app],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {proc.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start listening within 30s")
+
+
+def _git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def compare(baseline, current):
+    print(f"{'scenario':<24}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, report in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            if metric not in before or metric not in report:
+                continue
+            change = (report[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            print(f"{name:<24}{metric:<16}{before[metric]:>12}{report[metric]:>12}{change:>+9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (http mode)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker (http mode)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=100, help='iterations per virtual user per phase')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--phases', default=','.join(PHASES), help='comma-separated subset of phases')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<time>-<commit>-<mode>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='print the change against an earlier result file')
+    datagen.add_arguments(parser)
+    parser.set_defaults(bookings=20000, users=200)
+    args = parser.parse_args(argv)
+
+    phases = [name for name in args.phases.split(',') if name]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+    if args.concurrency > args.users:
+        parser.error("--concurrency cannot exceed --users")
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    dataset = datagen.generate(path, args.lots, args.slots, args.bookings, args.users, args.occupancy, args.seed)
+    ctx = {'path': path, 'lots': args.lots}
+
+    server = None
+    if args.mode == 'http':
+        server, base_url = start_gunicorn(path, args.workers, args.threads)
+        make_session = lambda: HTTPSession(base_url)
+    else:
+        import app as webapp
+        make_session = lambda: ClientSession(webapp.app)
+
+    scenarios = {}
+    try:
+        for phase in phases:
+            scenarios.update(run_phase(make_session, ctx, phase, args.concurrency, args.iterations, args.warmup))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    commit, dirty = _git_revision()
+    result = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'mode': args.mode,
+            'workers': args.workers if args.mode == 'http' else 1,
+            'threads': args.threads if args.mode == 'http' else None,
+            'concurrency': args.concurrency,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'dataset': dataset,
+        'scenarios': scenarios,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit}-{args.mode}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{'scenario':<24}{'requests':>9}{'errors':>8}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for name, report in scenarios.items():
+        print(f"{name:<24}{report['requests']:>9}{report['errors']:>8}{report['throughput_rps']:>10}"
+              f"{report.get('p50_ms', 0):>9}{report.get('p95_ms', 0):>9}{report.get('p99_ms', 0):>9}")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+    return 1 if any(report['errors'] for report in scenarios.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
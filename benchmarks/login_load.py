@@ -0,0 +1,100 @@
+"""Login throughput per scrypt cost under concurrent load.
+
+For each PASSWORD_SCRYPT_N value, stores every user's password at that
+cost and runs concurrent logins through check_user() with the login cache
+off, so every attempt pays for a hash. Alongside, a probe thread wakes
+every 10 ms the way a Socket.IO handler would and records how late it
+runs, to show whether hashing starves other work.
+
+Pick the largest cost whose logins/s covers the expected login peak per
+process, with headroom; raising PASSWORD_HASH_THREADS only helps up to
+the number of cores.
+
+    python -m benchmarks.login_load --costs 13,14,15 --concurrency 16 --logins 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate, USER_PASSWORD
+from benchmarks.hot_paths import summarize
+
+
+def probe(stop, delays):
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(0.01)
+        delays.append(time.perf_counter() - started - 0.01)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--costs', default='13,14,15', help='log2 of PASSWORD_SCRYPT_N values')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=10, help='logins per client')
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'login.db')
+    generate(path, lots=1, slots=1, bookings=0, users=args.concurrency, occupancy=0)
+    import config
+    from models.credentials import LoginBusy, hash_password
+    from models.db import get_connection
+    from models.user_model import check_user
+    config.PASSWORD_CACHE_TTL = 0
+
+    print(f"hash threads={config.PASSWORD_HASH_THREADS} cores={os.cpu_count()} "
+          f"concurrency={args.concurrency}")
+    print(f"{'N':>8}{'hash ms':>9}{'logins/s':>10}{'p50':>9}{'p99':>9}{'busy':>6}{'probe p99':>11}  (ms)")
+    for exponent in map(int, args.costs.split(',')):
+        config.PASSWORD_SCRYPT_N = 2 ** exponent
+        started = time.perf_counter()
+        password_hash = hash_password(USER_PASSWORD)
+        hash_ms = (time.perf_counter() - started) * 1000
+        conn = get_connection()
+        conn.execute("UPDATE users SET password = ?", (password_hash,))
+        conn.commit()
+        conn.close()
+
+        latencies = [[] for _ in range(args.concurrency)]
+        busy = [0] * args.concurrency
+        barrier = threading.Barrier(args.concurrency + 1)
+
+        def client(n):
+            barrier.wait()
+            for _ in range(args.logins):
+                t0 = time.perf_counter()
+                try:
+                    if not check_user(f"user{n}", USER_PASSWORD):
+                        raise RuntimeError(f"login failed for user{n}")
+                except LoginBusy:
+                    busy[n] += 1
+                    continue
+                latencies[n].append(time.perf_counter() - t0)
+
+        stop, delays = threading.Event(), []
+        prober = threading.Thread(target=probe, args=(stop, delays))
+        prober.start()
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        prober.join()
+
+        report = summarize([s for per in latencies for s in per], sum(busy), elapsed)
+        probe_report = summarize(delays, 0, elapsed)
+        print(f"{config.PASSWORD_SCRYPT_N:>8}{hash_ms:>9.1f}{report['throughput_rps']:>10}"
+              f"{report.get('p50_ms', '-'):>9}{report.get('p99_ms', '-'):>9}{report['errors']:>6}"
+              f"{probe_report.get('p99_ms', '-'):>11}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""EXPLAIN QUERY PLAN regression check for route queries.
+
+Drives every page and API route through the Flask test client against a
+scratch database, captures the SQL each one executes, and fails if any
+statement falls back to a full table scan that is not explicitly allowed.
+
+    python -m benchmarks.query_plans
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+# Bare "SCAN t" with no index; "SCAN t USING [COVERING] INDEX ..." is fine
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# Listing pages and tiny dimension tables where a scan is the point
+ALLOWED_SCANS = {
+    ('/admin/dashboard', 's'),
+    ('/admin/all_bookings', 'b'),
+    ('/admin/users', 'users'),
+    ('*', 'parking_lots'),
+    ('*', 'stats_counters'),
+    ('*', 'l'),
+}
+
+
+def _seed():
+    from models.db import get_connection
+    from models.user_model import add_user
+    from models.booking_model import allocate_slot, release_booking
+    from models.chat_model import add_message
+    from models.slot_index import free_slots
+    conn = get_connection()
+    cur = conn.cursor()
+    for lot in range(3):
+        cur.execute("INSERT INTO parking_lots (name, price) VALUES (?, ?)", (f"Lot {lot + 1}", 20))
+        lot_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, '', 'A')",
+            [(lot_id, f"Spot {i + 1}") for i in range(50)],
+        )
+    conn.commit()
+    conn.close()
+    free_slots.rebuild()
+    for u in range(20):
+        add_user(f"user{u}", "pw")
+        booking = allocate_slot(f"user{u}", 1 + u % 3, f"KA{u:04d}")
+        if u % 2:
+            release_booking(booking[0])
+        add_message(f"user{u}", "hello")
+
+
+def _explain(path, sql):
+    from models.billing import register_functions
+    conn = sqlite3.connect(path)
+    try:
+        register_functions(conn)
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+    finally:
+        conn.close()
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'plans.db')
+    os.environ['DATABASE_PATH'] = path
+
+    from models.db import on_connect, close_pool
+    import app as webapp
+
+    _seed()
+    captured = []
+    current = {'route': None}
+    on_connect(lambda conn: conn.set_trace_callback(
+        lambda sql: captured.append((current['route'], sql))))
+    close_pool()
+
+    client = webapp.app.test_client()
+
+    def hit(route, method='get', **kwargs):
+        current['route'] = route.split('?')[0]
+        getattr(client, method)(route, **kwargs)
+
+    hit('/')
+    hit('/login', 'post', data={'username': 'admin', 'password': 'admin123'})
+    for route in ('/admin/dashboard', '/admin/add_slot', '/admin/all_bookings',
+                  '/admin/users', '/admin/lots', '/admin/lot_summary',
+                  '/admin/edit_lot/1', '/api/dashboard-stats', '/api/notifications',
+                  '/chat', '/api/chat/messages'):
+        hit(route)
+    for query in ('user=user1&active=1', 'lot_id=1', 'vehicle=KA00', 'from=2020-01-01&to=2099-01-01',
+                  'before=5', 'user=user2&lot_id=2&before=10'):
+        hit('/api/admin/bookings?' + query)
+    for query in ('', 'format=ndjson&lot_id=1', 'from=2020-01-01&to=2099-01-01'):
+        # Streamed: the queries only run while the body is read
+        current['route'] = '/api/admin/bookings/export'
+        client.get('/api/admin/bookings/export?' + query).get_data()
+    for query in ('', 'granularity=hour&lot_id=1', 'from=2020-01-01&to=2020-03-31'):
+        hit('/admin/analytics?' + query)
+        hit('/api/admin/analytics?' + query)
+    hit('/admin/delete_lot/3')
+    hit('/logout')
+    hit('/login', 'post', data={'username': 'user0', 'password': 'pw'})
+    for route in ('/dashboard', '/user/book', '/user/bookings',
+                  '/api/dashboard-stats', '/chat', '/api/chat/messages',
+                  '/api/chat/messages?before=10', '/api/chat/messages?since=5&limit=3'):
+        hit(route)
+    hit('/user/book', 'post', data={'lot_id': '2', 'vehicle_number': 'KA9999'})
+    hit('/user/release/1')
+
+    failures = []
+    seen = set()
+    for route, sql in captured:
+        statement = sql.strip()
+        verb = statement.split(None, 1)[0].upper() if statement else ''
+        if verb not in ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH') or 'sqlite_master' in statement:
+            continue
+        if (route, statement) in seen:
+            continue
+        seen.add((route, statement))
+        for detail in _explain(path, statement):
+            match = FULL_SCAN.match(detail)
+            if match and (route, match.group(1)) not in ALLOWED_SCANS and ('*', match.group(1)) not in ALLOWED_SCANS:
+                failures.append((route, detail, ' '.join(statement.split())))
+
+    print(f"Checked {len(seen)} statements across routes")
+    for route, detail, statement in failures:
+        print(f"FULL SCAN [{route}] {detail}: {statement}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
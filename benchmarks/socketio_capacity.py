@@ -0,0 +1,114 @@
+"""Concurrent Socket.IO connection capacity: threaded vs gevent workers.
+
+For each server mode and each connection count, starts one gunicorn worker
+on a scratch database, opens that many long-polling chat connections,
+then measures how many connected, the latency of ordinary page requests
+while they are held open, and how many receive one chat broadcast.
+
+    threading   gunicorn --threads N app:app (the current deployment)
+    gevent      gunicorn -k GeventWebSocketWorker wsgi:app
+
+    python -m benchmarks.socketio_capacity --connections 50,200,500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.hot_paths import HTTPSession, start_gunicorn, summarize
+from benchmarks.socketio_fanout import PollingClient
+
+GEVENT_WORKER = 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker'
+
+
+def start_server(mode, path, threads):
+    if mode == 'gevent':
+        return start_gunicorn(path, 1, 1, worker_class=GEVENT_WORKER, app='wsgi:app')
+    return start_gunicorn(path, 1, threads)
+
+
+def measure(mode, path, connections, threads, connect_timeout, probes):
+    proc, base_url = start_server(mode, path, threads)
+    from benchmarks.datagen import USER_PASSWORD
+    session = HTTPSession(base_url)
+    session.request('POST', '/login', {'username': 'user0', 'password': USER_PASSWORD})
+    clients = []
+
+    def connect():
+        try:
+            client = PollingClient(session, timeout=connect_timeout + 30)
+        except OSError:
+            return
+        clients.append(client)
+        client.receive_forever()
+
+    try:
+        for _ in range(connections):
+            threading.Thread(target=connect, daemon=True).start()
+        deadline = time.monotonic() + connect_timeout
+        while len(clients) < connections and time.monotonic() < deadline:
+            time.sleep(0.05)
+        connected = len(clients)
+
+        # Ordinary page traffic while every connection sits in a long poll
+        latencies, errors = [], 0
+        probe = HTTPSession(base_url)
+        started = time.perf_counter()
+        for _ in range(probes):
+            t0 = time.perf_counter()
+            try:
+                status, _ = probe.request('GET', '/login')
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+        report = summarize(latencies, errors, time.perf_counter() - started)
+
+        delivered = 0
+        if clients:
+            listeners = list(clients)
+            clients[0].emit('message', {'message': f"capacity {mode} {connections}"})
+            deadline = time.monotonic() + connect_timeout
+            while time.monotonic() < deadline:
+                delivered = sum(1 for c in listeners if any(e[1][0] == 'message' for e in c.events))
+                if delivered == len(listeners):
+                    break
+                time.sleep(0.05)
+        return connected, delivered, report
+    finally:
+        for client in list(clients):
+            client.closed = True
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', default='50,200,500')
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--threads', type=int, default=16, help='gthread threads for threading mode')
+    parser.add_argument('--connect-timeout', type=float, default=10)
+    parser.add_argument('--probes', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), 'capacity.db')
+    from benchmarks.datagen import generate
+    generate(path, lots=5, slots=50, bookings=2000, users=10)
+
+    print(f"{'mode':<11}{'conns':>7}{'connected':>11}{'delivered':>11}{'p50':>10}{'p99':>10}{'errors':>8}"
+          "  (ms, page requests under load)")
+    for mode in args.modes.split(','):
+        for connections in map(int, args.connections.split(',')):
+            connected, delivered, report = measure(mode, path, connections, args.threads,
+                                                   args.connect_timeout, args.probes)
+            print(f"{mode:<11}{connections:>7}{connected:>11}{delivered:>11}"
+                  f"{report.get('p50_ms', '-'):>10}{report.get('p99_ms', '-'):>10}{report['errors']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Multi-process Socket.IO delivery check through the message queue.
+
+Starts several single-worker gunicorn servers sharing one database and one
+SOCKETIO_MESSAGE_QUEUE, as they would run behind a sticky load balancer.
+One chat user per server connects over Engine.IO long-polling and sends
+messages; every client must receive every message sent through every
+server, every server's chat history must hold all of them, and every
+server's /chat page must list every user as online.
+
+    python -m benchmarks.socketio_fanout --processes 4 --messages 50
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from benchmarks.hot_paths import HTTPSession, start_gunicorn, summarize
+
+
+class PollingClient:
+    """Just enough of a Socket.IO v5 / Engine.IO v4 long-polling client."""
+
+    def __init__(self, session, timeout=60):
+        self.session = session
+        self.timeout = timeout
+        self.opener = session.opener
+        body = self._get('')
+        self.sid = json.loads(body[1:])['sid']
+        self._post('40')
+        self.events = []
+        self.closed = False
+
+    def _url(self, sid):
+        query = {'EIO': '4', 'transport': 'polling', 't': str(time.time())}
+        if sid:
+            query['sid'] = sid
+        return f"{self.session.base_url}/socket.io/?{urllib.parse.urlencode(query)}"
+
+    def _get(self, sid):
+        with self.opener.open(self._url(sid), timeout=self.timeout) as response:
+            return response.read().decode()
+
+    def _post(self, payload):
+        request = urllib.request.Request(self._url(self.sid), data=payload.encode(), method='POST',
+                                         headers={'Content-Type': 'text/plain;charset=UTF-8'})
+        with self.opener.open(request, timeout=self.timeout) as response:
+            response.read()
+
+    def emit(self, event, data):
+        self._post('42' + json.dumps([event, data]))
+
+    def receive_forever(self):
+        try:
+            while not self.closed:
+                for packet in self._get(self.sid).split('\x1e'):
+                    if packet == '2':
+                        self._post('3')
+                    elif packet.startswith('42'):
+                        self.events.append((time.time(), json.loads(packet[2:])))
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            self._post('1')
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=50, help='messages sent through each server')
+    parser.add_argument('--queue', help="queue URL (default: a scratch 'sqlite:///' file)")
+    parser.add_argument('--timeout', type=float, default=20)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'fanout.db')
+    expected = args.processes * args.messages
+    os.environ['SOCKETIO_MESSAGE_QUEUE'] = args.queue or f"sqlite:///{os.path.join(workdir, 'queue.db')}"
+    os.environ['CHAT_HISTORY_SIZE'] = str(expected)
+    # Workers exchange full presence lists on every sweep; a worker whose
+    # listener started late catches up on the next one
+    os.environ['PRESENCE_SWEEP_INTERVAL'] = '0.5'
+
+    from benchmarks.datagen import generate, USER_PASSWORD
+    generate(path, lots=1, slots=1, bookings=0, users=args.processes, occupancy=0)
+
+    servers, clients, sessions = [], [], []
+    try:
+        for i in range(args.processes):
+            servers.append(start_gunicorn(path, 1, 16))
+        for i, (_, base_url) in enumerate(servers):
+            session = HTTPSession(base_url)
+            session.request('POST', '/login', {'username': f"user{i}", 'password': USER_PASSWORD})
+            sessions.append(session)
+            client = PollingClient(session)
+            threading.Thread(target=client.receive_forever, daemon=True).start()
+            clients.append(client)
+        time.sleep(0.5)
+
+        started = time.perf_counter()
+        for n in range(args.messages):
+            for i, client in enumerate(clients):
+                client.emit('message', {'message': f"{i}:{n}:{time.time()}"})
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            if all(len([e for e in c.events if e[1][0] == 'message']) >= expected for c in clients):
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        def online_on(session):
+            with session.opener.open(f"{session.base_url}/chat") as response:
+                page = response.read().decode()
+            return sum(f'data-user="user{n}"' in page for n in range(args.processes))
+
+        while time.monotonic() < deadline + 5:
+            if all(online_on(session) == args.processes for session in sessions):
+                break
+            time.sleep(0.2)
+
+        failed = False
+        latencies = []
+        for i, (client, session) in enumerate(zip(clients, sessions)):
+            seen = set()
+            for received_at, (event, data) in client.events:
+                if event != 'message':
+                    continue
+                sender, n, sent = data['message'].split(':')
+                seen.add((sender, n))
+                if int(sender) != i:
+                    latencies.append(received_at - float(sent))
+            with session.opener.open(f"{session.base_url}/api/chat/messages") as response:
+                history = len(json.loads(response.read()))
+            online = online_on(session)
+            ok = len(seen) == expected and history == expected and online == args.processes
+            failed = failed or not ok
+            print(f"server {i}: received {len(seen)}/{expected} history {history}/{expected} "
+                  f"online {online}/{args.processes} {'ok' if ok else 'MISSING'}")
+        report = summarize(latencies, 0, elapsed)
+        print(f"cross-process delivery: p50={report.get('p50_ms')}ms p99={report.get('p99_ms')}ms "
+              f"max={report.get('max_ms')}ms")
+    finally:
+        for client in clients:
+            client.close()
+        for proc, _ in servers:
+            proc.terminate()
+        for proc, _ in servers:
+            proc.wait(timeout=30)
+
+    if failed:
+        print("FAILED: messages were not delivered to every process")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
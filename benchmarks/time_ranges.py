@@ -0,0 +1,68 @@
+"""Today's revenue and overdue-booking queries as the bookings table grows.
+
+For each size, generates a database and times the old predicates, which
+wrap the text timestamp columns in date functions, against the integer
+epoch range predicates the routes use now. The new ones should stay flat.
+
+    python -m benchmarks.time_ranges --sizes 100000,1000000,3000000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+
+QUERIES = {
+    'today revenue': (
+        "SELECT SUM(cost) FROM bookings WHERE DATE(start_time) = DATE('now')",
+        "SELECT SUM(cost) FROM bookings WHERE start_ts >= ? AND start_ts < ?",
+    ),
+    'overdue bookings': (
+        "SELECT COUNT(*) FROM bookings WHERE end_time IS NULL AND datetime('now') > datetime(start_time, '+24 hours')",
+        "SELECT COUNT(*) FROM bookings WHERE end_ts IS NULL AND start_ts < ?",
+    ),
+}
+
+
+def _time(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    from models.timestamps import day_start, day_end
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'bookings':>10}  {'query':<18}{'old ms':>10}{'new ms':>10}  plan")
+    for size in map(int, args.sizes.split(',')):
+        path = os.path.join(workdir, f"ranges-{size}.db")
+        generate(path, lots=50, slots=200, bookings=size, users=1000, occupancy=0.2)
+        conn = sqlite3.connect(path)
+        params = {
+            'today revenue': (day_start(), day_end()),
+            'overdue bookings': (int(time.time()) - 24 * 3600,),
+        }
+        for name, (old, new) in QUERIES.items():
+            old_ms = _time(conn, old, (), args.repeat)
+            new_ms = _time(conn, new, params[name], args.repeat)
+            plan = conn.execute("EXPLAIN QUERY PLAN " + new, params[name]).fetchone()[3]
+            print(f"{size:>10}  {name:<18}{old_ms:>10.3f}{new_ms:>10.3f}  {plan}")
+        conn.close()
+        os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Booking-to-user joins on user_email text against bookings.user_id.
+
+Generates a database per size, then times each query both ways: the old
+form joins and filters on bookings.user_email = users.username (with the
+old (user_email, end_time) index put back for it), the new one on the
+integer user_id. Finally clears user_id and re-runs the v0007 backfill
+while another connection keeps writing, to show the batches never hold
+the write lock for long.
+
+    python -m benchmarks.user_joins --sizes 100000,1000000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate
+
+QUERIES = {
+    'all bookings page': (
+        '''SELECT b.id, u.username, b.slot_id, b.vehicle_number, b.start_time, b.end_time, b.cost
+           FROM bookings b JOIN users u ON b.user_email = u.username ORDER BY b.id DESC LIMIT 51''',
+        '''SELECT b.id, u.username, b.slot_id, b.vehicle_number, b.start_time, b.end_time, b.cost
+           FROM bookings b JOIN users u ON b.user_id = u.id ORDER BY b.id DESC LIMIT 51''',
+    ),
+    'admin dashboard': (
+        '''SELECT s.id, b.vehicle_number, u.username FROM slots s
+           LEFT JOIN bookings b ON s.id = b.slot_id AND b.end_time IS NULL
+           LEFT JOIN users u ON b.user_email = u.username''',
+        '''SELECT s.id, b.vehicle_number, u.username FROM slots s
+           LEFT JOIN bookings b ON s.id = b.slot_id AND b.end_time IS NULL
+           LEFT JOIN users u ON b.user_id = u.id''',
+    ),
+    'user bookings': (
+        "SELECT id, cost FROM bookings WHERE user_email = (SELECT username FROM users WHERE id = ?) ORDER BY id DESC",
+        "SELECT id, cost FROM bookings WHERE user_id = ? ORDER BY id DESC",
+    ),
+    'principal counts': (
+        '''SELECT (SELECT COUNT(*) FROM bookings WHERE user_email = u.username AND end_time IS NULL),
+                  (SELECT COUNT(*) FROM bookings WHERE user_email = u.username)
+           FROM users u WHERE u.id = ?''',
+        '''SELECT (SELECT COUNT(*) FROM bookings WHERE user_id = u.id AND end_time IS NULL),
+                  (SELECT COUNT(*) FROM bookings WHERE user_id = u.id)
+           FROM users u WHERE u.id = ?''',
+    ),
+    'revenue per user': (
+        "SELECT u.id, SUM(b.cost) FROM bookings b JOIN users u ON b.user_email = u.username GROUP BY u.id",
+        "SELECT u.id, SUM(b.cost) FROM bookings b JOIN users u ON b.user_id = u.id GROUP BY u.id",
+    ),
+}
+PARAMS = {'user bookings': (2,), 'principal counts': (2,)}
+
+
+def _time(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def _writer(path, stop, latencies):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS bench_writes (id INTEGER PRIMARY KEY, at REAL)")
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("INSERT INTO bench_writes (at) VALUES (?)", (started,))
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.005)
+    conn.close()
+
+
+def time_backfill(path, batch_size):
+    """Clear user_id, then backfill it while a writer measures its own latency."""
+    from models.migrations import v0007_booking_user_ids as migration
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE bookings SET user_id = NULL")
+    conn.commit()
+    conn.close()
+
+    stop, latencies = threading.Event(), []
+    writer = threading.Thread(target=_writer, args=(path, stop, latencies))
+    writer.start()
+    started = time.perf_counter()
+    filled = migration.backfill(batch_size)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    latencies.sort()
+    return filled, elapsed, latencies[int(len(latencies) * 0.99)] * 1000, latencies[-1] * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    for size in map(int, args.sizes.split(',')):
+        path = os.path.join(workdir, f"joins-{size}.db")
+        generate(path, lots=50, slots=200, bookings=size, users=1000, occupancy=0.2)
+        conn = sqlite3.connect(path)
+        # What the old queries had to work with
+        conn.execute("CREATE INDEX idx_bookings_user_end ON bookings(user_email, end_time)")
+        print(f"\n{size} bookings")
+        print(f"  {'query':<20}{'email ms':>10}{'user_id ms':>12}")
+        for name, (old, new) in QUERIES.items():
+            params = PARAMS.get(name, ())
+            old_ms = _time(conn, old, params, args.repeat)
+            new_ms = _time(conn, new, params, args.repeat)
+            print(f"  {name:<20}{old_ms:>10.3f}{new_ms:>12.3f}")
+        conn.execute("DROP INDEX idx_bookings_user_end")
+        conn.commit()
+        conn.close()
+
+        filled, elapsed, p99, worst = time_backfill(path, args.batch_size)
+        print(f"  backfill: {filled} rows in {elapsed:.2f}s (batch {args.batch_size}); "
+              f"concurrent write p99 {p99:.1f}ms, max {worst:.1f}ms")
+        os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import os
+
+# Database
+DATABASE = os.environ.get('DATABASE_PATH', 'database.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+DB_WRITE_RETRIES = int(os.environ.get('DB_WRITE_RETRIES', 5))
+DB_RETRY_BACKOFF = float(os.environ.get('DB_RETRY_BACKOFF', 0.01))
+# Threads that run sqlite calls when serving under an event loop (wsgi.py)
+DB_THREADS = int(os.environ.get('DB_THREADS', DB_POOL_SIZE))
+
+# Server concurrency: 'threading' (app.py, gthread) or 'gevent' (wsgi.py)
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading')
+
+# Password hashing: scrypt cost, verification pool and login cache
+PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 5))
+PASSWORD_CACHE_TTL = float(os.environ.get('PASSWORD_CACHE_TTL', 300))
+
+# Cache
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')  # 'local' or 'sqlite'
+CACHE_PATH = os.environ.get('CACHE_PATH', 'cache.db')
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 30))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+
+# SQL profiling
+SQL_PROFILING = os.environ.get('SQL_PROFILING', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Metrics
+METRICS_DB_TTL = float(os.environ.get('METRICS_DB_TTL', 10))
+# Bearer token for scrapers; admins' sessions can read /metrics without it
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Chat persistence
+CHAT_DURABILITY = os.environ.get('CHAT_DURABILITY', 'async')  # 'async', 'group' or 'sync'
+CHAT_BATCH_SIZE = int(os.environ.get('CHAT_BATCH_SIZE', 100))
+CHAT_FLUSH_INTERVAL = float(os.environ.get('CHAT_FLUSH_INTERVAL', 0.05))
+CHAT_QUEUE_MAX = int(os.environ.get('CHAT_QUEUE_MAX', 10000))
+CHAT_ENQUEUE_TIMEOUT = float(os.environ.get('CHAT_ENQUEUE_TIMEOUT', 0.5))
+CHAT_HISTORY_SIZE = int(os.environ.get('CHAT_HISTORY_SIZE', 50))
+
+# Chat presence
+PRESENCE_TIMEOUT = float(os.environ.get('PRESENCE_TIMEOUT', 90))
+PRESENCE_SWEEP_INTERVAL = float(os.environ.get('PRESENCE_SWEEP_INTERVAL', 15))
+PRESENCE_BROADCAST = os.environ.get('PRESENCE_BROADCAST', '1') == '1'
+
+# Socket.IO message queue shared by worker processes, e.g. 'sqlite:///socketio-queue.db'
+# or 'redis://localhost:6379/0'; empty for a single process
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
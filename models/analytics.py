@@ -0,0 +1,224 @@
+"""Per-lot booking analytics from the hourly and daily rollup tables.
+
+The rollups (migration v0008) are kept current by triggers on bookings, so
+the analytics views never touch the bookings table. Each bucket holds
+bookings started and ended, revenue and dwell of the bookings that ended in
+it, and the peak and closing number of slots held. Buckets without events
+are absent; their occupancy carries over from the previous bucket.
+
+A rebuild recomputes a lot's buckets from its bookings, one lot per write
+transaction. Use it after importing history or editing bookings by hand:
+
+    python -m models.analytics rebuild [--lot ID] [--since YYYY-MM-DD]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from models.db import get_connection, write_transaction
+from models.timestamps import day_start, day_end
+
+BUCKETS = {
+    'hour': ('lot_rollups_hourly', '({0}) - ({0}) % 3600'),
+    'day': ('lot_rollups_daily', "CAST(strftime('%s', date({0}, 'unixepoch', 'localtime'), 'utc') AS INTEGER)"),
+}
+MAX_HOURLY_DAYS = 31
+
+
+def _rebuild_table(cur, table, bucket, lot_id, since, held):
+    cur.execute(f"DELETE FROM {table} WHERE lot_id = ? AND bucket >= ?", (lot_id, since))
+    # Events in time order, starts before releases within a second (the
+    # order inside it is not recorded); the running sum is the number of
+    # slots held after each one
+    cur.execute(f'''
+        INSERT INTO {table} (lot_id, bucket, started, ended, revenue, dwell_seconds, peak_occupied, occupied)
+        WITH events AS (
+            SELECT id, start_ts AS ts, 1 AS delta, 1 AS started, 0 AS ended, 0 AS revenue, 0 AS dwell
+            FROM bookings WHERE lot_id = :lot AND start_ts >= :since
+            UNION ALL
+            SELECT id, end_ts, -1, 0, 1, COALESCE(cost, 0), end_ts - start_ts
+            FROM bookings WHERE lot_id = :lot AND end_ts >= :since
+        ), levels AS (
+            SELECT {bucket.format('ts')} AS bucket, delta, started, ended, revenue, dwell,
+                   :held + SUM(delta) OVER (ORDER BY ts, delta DESC, id ROWS UNBOUNDED PRECEDING) AS held,
+                   ROW_NUMBER() OVER (PARTITION BY {bucket.format('ts')} ORDER BY ts DESC, delta, id DESC) AS from_end
+            FROM events
+        )
+        SELECT :lot, bucket, SUM(started), SUM(ended), SUM(revenue), SUM(dwell),
+               MAX(MAX(held), MAX(held - delta)), MAX(CASE WHEN from_end = 1 THEN held END)
+        FROM levels GROUP BY bucket
+    ''', {'lot': lot_id, 'since': since, 'held': held})
+    return cur.rowcount
+
+
+def rebuild_lot(cur, lot_id, since=0):
+    """Recompute one lot's buckets from since (epoch, a local midnight) on. Returns rows written."""
+    rows = 0
+    for granularity, (table, bucket) in BUCKETS.items():
+        # A local midnight need not be a whole epoch hour
+        start = since - since % 3600 if granularity == 'hour' else since
+        cur.execute('''
+            SELECT COUNT(*) FROM bookings
+            WHERE lot_id = ? AND start_ts < ? AND (end_ts IS NULL OR end_ts >= ?)
+        ''', (lot_id, start, start))
+        rows += _rebuild_table(cur, table, bucket, lot_id, start, cur.fetchone()[0])
+    return rows
+
+
+def rebuild_rollups(lot_id=None, since=None):
+    """Rebuild every lot's rollups (or one lot's), optionally from a 'YYYY-MM-DD' date.
+
+    Each lot is rebuilt in its own short write transaction, so bookings keep
+    flowing meanwhile. Returns {'lots': rebuilt, 'rows': written, 'seconds': elapsed}.
+    """
+    if lot_id is None:
+        conn = get_connection()
+        lots = [row[0] for row in conn.execute('''
+            SELECT id FROM parking_lots
+            UNION SELECT DISTINCT lot_id FROM bookings WHERE lot_id IS NOT NULL
+        ''')]
+        conn.close()
+    else:
+        lots = [lot_id]
+    since_ts = day_start(since) if since else 0
+
+    started = time.perf_counter()
+    rows = 0
+    for lot in lots:
+        rows += write_transaction(lambda cur, lot=lot: rebuild_lot(cur, lot, since_ts))
+    return {'lots': len(lots), 'rows': rows, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def rebuild_pending():
+    """Rebuild lots queued by migration v0008; an interrupted run resumes. Returns rows written."""
+    conn = get_connection()
+    lots = [row[0] for row in conn.execute("SELECT lot_id FROM rollup_backfill")]
+    conn.close()
+    rows = 0
+    for lot in lots:
+        def rebuild(cur, lot=lot):
+            written = rebuild_lot(cur, lot)
+            cur.execute("DELETE FROM rollup_backfill WHERE lot_id = ?", (lot,))
+            return written
+        rows += write_transaction(rebuild)
+    return rows
+
+
+def _buckets(granularity, date_from, date_to):
+    """Bucket start epochs covering date_from..date_to, both inclusive."""
+    if granularity == 'hour':
+        # Hourly rollups are keyed on whole epoch hours, like the triggers'
+        # ts - ts % 3600; where the zone is a part hour off UTC the first
+        # one starts before local midnight
+        first = day_start(date_from)
+        return list(range(first - first % 3600, day_end(date_to), 3600))
+    first = datetime.strptime(date_from, '%Y-%m-%d')
+    days = (datetime.strptime(date_to, '%Y-%m-%d') - first).days
+    return [day_start((first + timedelta(days=n)).strftime('%Y-%m-%d')) for n in range(days + 1)]
+
+
+def _label(granularity, bucket):
+    return time.strftime('%Y-%m-%d %H:%M' if granularity == 'hour' else '%Y-%m-%d', time.localtime(bucket))
+
+
+def _summary(started, ended, revenue, dwell, peak=None):
+    summary = {
+        'started': started,
+        'ended': ended,
+        'revenue': round(revenue, 2),
+        'avg_dwell_minutes': round(dwell / ended / 60, 1) if ended else None,
+    }
+    # Lot peaks happen at different times, so they are not summed across lots
+    if peak is not None:
+        summary['peak_occupied'] = peak
+    return summary
+
+
+def get_analytics(granularity, date_from, date_to, lot_id=None):
+    """Per-lot series and totals for date_from..date_to ('YYYY-MM-DD', inclusive).
+
+    Reads only the rollup tables. Every bucket in the range is present;
+    those without events show the occupancy carried from the one before.
+    Raises ValueError for an unknown granularity or a bad range.
+    """
+    if granularity not in BUCKETS:
+        raise ValueError(f"granularity must be one of {', '.join(BUCKETS)}")
+    if date_to < date_from:
+        raise ValueError('to is before from')
+    days = (datetime.strptime(date_to, '%Y-%m-%d') - datetime.strptime(date_from, '%Y-%m-%d')).days + 1
+    if granularity == 'hour' and days > MAX_HOURLY_DAYS:
+        raise ValueError(f'hourly ranges are limited to {MAX_HOURLY_DAYS} days')
+    buckets = _buckets(granularity, date_from, date_to)
+    table = BUCKETS[granularity][0]
+    if lot_id is None:
+        lot_where, row_lots, lot_params = "", "lot_id IN (SELECT id FROM parking_lots)", []
+    else:
+        lot_where, row_lots, lot_params = "WHERE l.id = ?", "lot_id = ?", [lot_id]
+
+    conn = get_connection()
+    cur = conn.cursor()
+    # Slots held going into the range: the last bucket before it
+    cur.execute(f'''
+        SELECT l.id, l.name,
+               (SELECT r.occupied FROM {table} r WHERE r.lot_id = l.id AND r.bucket < ?
+                ORDER BY r.bucket DESC LIMIT 1)
+        FROM parking_lots l {lot_where}
+        ORDER BY l.name
+    ''', [buckets[0]] + lot_params)
+    lots = cur.fetchall()
+    cur.execute(f'''
+        SELECT lot_id, bucket, started, ended, revenue, dwell_seconds, peak_occupied, occupied
+        FROM {table}
+        WHERE {row_lots} AND bucket >= ? AND bucket < ?
+    ''', lot_params + [buckets[0], day_end(date_to)])
+    rows = {(row[0], row[1]): row for row in cur.fetchall()}
+    conn.close()
+
+    # [started, ended, revenue, dwell] per bucket across lots, and overall
+    site = [[0, 0, 0.0, 0] for _ in buckets]
+    labels = [_label(granularity, bucket) for bucket in buckets]
+    totals = [0, 0, 0.0, 0]
+    result = []
+    for lot, name, held in lots:
+        held = held or 0
+        series, lot_totals, lot_peak = [], [0, 0, 0.0, 0], 0
+        for n, bucket in enumerate(buckets):
+            row = rows.get((lot, bucket))
+            if row is None:
+                counts, peak = (0, 0, 0.0, 0), held
+            else:
+                counts, peak, held = row[2:6], row[6], row[7]
+            for i, value in enumerate(counts):
+                lot_totals[i] += value
+                site[n][i] += value
+            lot_peak = max(lot_peak, peak)
+            series.append(dict(_summary(*counts, peak), bucket=bucket, label=labels[n]))
+        for i in range(4):
+            totals[i] += lot_totals[i]
+        result.append({'lot_id': lot, 'name': name, 'totals': _summary(*lot_totals, lot_peak), 'series': series})
+
+    return {
+        'granularity': granularity,
+        'from': date_from,
+        'to': date_to,
+        'lots': result,
+        'series': [dict(_summary(*counts), bucket=bucket, label=label)
+                   for bucket, label, counts in zip(buckets, labels, site)],
+        'totals': _summary(*totals),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the per-lot analytics rollups.")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--lot', type=int)
+    parser.add_argument('--since')
+    args = parser.parse_args(argv)
+    report = rebuild_rollups(args.lot, args.since)
+    print(f"Rebuilt {report['rows']} rollup rows for {report['lots']} lots in {report['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Booking prices from tariff rules.
+
+A lot's rule is a JSON object in parking_lots.tariff, layered over the
+default of hourly at the lot's price. Every booking keeps a snapshot of its
+lot's effective rule from the moment it started (migration v0005), so a
+price change only affects new bookings unless costs are recomputed.
+
+    {"unit": "hour",          # 'minute', 'hour' or 'day'
+     "rate": 20,              # per unit; defaults to the lot's price
+     "rounding": "floor",     # 'floor' (legacy: whole hours) or 'ceil'
+     "min_units": 1,
+     "daily_cap": 150,        # most charged per 24h from the start
+     "periods": [{"from": "22:00", "to": "06:00", "rate": 10}]}
+
+Each unit is charged at the rate of the period its start falls in. Rules are
+compiled once per distinct snapshot and evaluated by the booking_cost() SQL
+function, so release and bulk recompute are plain UPDATE statements.
+
+    python -m models.billing recompute [--lot ID] [--since YYYY-MM-DD] [--retariff]
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from bisect import bisect_right
+from functools import lru_cache
+
+from models.cache import invalidate_stats
+from models.db import get_connection, write_transaction
+from models.timestamps import day_start
+
+UNIT_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+DAY = 86400
+
+# The rule a booking starts with, for a parking_lots row aliased p
+EFFECTIVE_TARIFF = "json_patch(json_object('unit', 'hour', 'rate', p.price), COALESCE(p.tariff, '{}'))"
+
+
+def _clock(value):
+    hours, minutes = value.split(':')
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    if not 0 <= seconds <= DAY:
+        raise ValueError(f"time of day out of range: {value}")
+    return seconds
+
+
+def _amount(field, value):
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError(f"{field} must be a finite number")
+    if amount < 0:
+        raise ValueError(f"{field} must not be negative")
+    return amount
+
+
+def parse_tariff(rule):
+    """Validate a rule (dict or JSON text) and return it normalized; raises ValueError."""
+    if isinstance(rule, str):
+        try:
+            rule = json.loads(rule)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"tariff is not valid JSON: {e}")
+    if not isinstance(rule, dict):
+        raise ValueError("tariff must be a JSON object")
+    unknown = set(rule) - {'unit', 'rate', 'rounding', 'min_units', 'daily_cap', 'periods'}
+    if unknown:
+        raise ValueError(f"unknown tariff fields: {', '.join(sorted(unknown))}")
+
+    normalized = {}
+    if 'unit' in rule:
+        if not isinstance(rule['unit'], str) or rule['unit'] not in UNIT_SECONDS:
+            raise ValueError("unit must be 'minute', 'hour' or 'day'")
+        normalized['unit'] = rule['unit']
+    if 'rounding' in rule:
+        if not isinstance(rule['rounding'], str) or rule['rounding'] not in ('floor', 'ceil'):
+            raise ValueError("rounding must be 'floor' or 'ceil'")
+        normalized['rounding'] = rule['rounding']
+    try:
+        for field in ('rate', 'daily_cap'):
+            if rule.get(field) is not None:
+                normalized[field] = _amount(field, rule[field])
+        if 'min_units' in rule:
+            normalized['min_units'] = int(rule['min_units'])
+            if normalized['min_units'] < 0:
+                raise ValueError("min_units must not be negative")
+        periods = []
+        for period in rule.get('periods') or []:
+            start, end = _clock(period['from']), _clock(period['to'])
+            if start == end:
+                raise ValueError("a period must not be empty")
+            periods.append({'from': period['from'], 'to': period['to'], 'rate': _amount('rate', period['rate'])})
+    except (KeyError, TypeError, AttributeError, OverflowError) as e:
+        raise ValueError(f"malformed tariff: {e!r}")
+    if periods:
+        normalized['periods'] = periods
+    return normalized
+
+
+def _rate_edges(rate, periods):
+    """Split the day into ([start_second], [rate]); later periods win overlaps."""
+    by_minute = [rate] * (DAY // 60)
+    for period in periods:
+        start, end = _clock(period['from']) // 60, _clock(period['to']) // 60
+        minutes = range(start, end) if start < end else list(range(start, DAY // 60)) + list(range(0, end))
+        for minute in minutes:
+            by_minute[minute] = period['rate']
+    edges = []
+    for minute, minute_rate in enumerate(by_minute):
+        if not edges or edges[-1][1] != minute_rate:
+            edges.append((minute * 60, minute_rate))
+    return [start for start, _ in edges], [r for _, r in edges]
+
+
+@lru_cache(maxsize=256)
+def compile_tariff(text):
+    """Turn a snapshot's JSON into cost(start_ts, end_ts), in Unix seconds."""
+    rule = parse_tariff(text)
+    unit = UNIT_SECONDS[rule.get('unit', 'hour')]
+    rate = rule.get('rate', 0.0)
+    ceil = rule.get('rounding', 'floor') == 'ceil'
+    min_units = rule.get('min_units', 1)
+    cap = rule.get('daily_cap')
+    periods = rule.get('periods')
+
+    def units(seconds):
+        count = -(-seconds // unit) if ceil else seconds // unit
+        return max(min_units, count)
+
+    if not periods and cap is None:
+        return lambda start, end: round(units(end - start) * rate, 2)
+
+    starts, rates = _rate_edges(rate, periods or [])
+    per_day = DAY // unit
+
+    def charge(start, first, last):
+        # Units first..last-1, each at the rate in force when it begins
+        total = 0.0
+        k = first
+        while k < last:
+            t = start + k * unit
+            midnight = t - t % DAY
+            i = bisect_right(starts, t % DAY) - 1
+            until = midnight + (starts[i + 1] if i + 1 < len(starts) else DAY)
+            following = min(last, -(-(until - start) // unit))
+            total += (following - k) * rates[i]
+            k = following
+        return total
+
+    def cost(start, end):
+        count = units(end - start)
+        # Periods and days follow the local wall clock at the start
+        start += time.localtime(start).tm_gmtoff
+        if cap is None:
+            return round(charge(start, 0, count), 2)
+        total = 0.0
+        for first in range(0, count, per_day):
+            total += min(cap, charge(start, first, min(count, first + per_day)))
+        return round(total, 2)
+
+    return cost
+
+
+def booking_cost(tariff, start, end):
+    if tariff is None or start is None or end is None:
+        return None
+    return compile_tariff(tariff)(start, end)
+
+
+# Run by models.db on every pooled connection
+def register_functions(conn):
+    conn.create_function('booking_cost', 3, booking_cost, deterministic=True)
+
+
+def get_lot_tariff(lot_id):
+    """Return (stored rule or None, effective rule) for a lot, or None if it does not exist."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f"SELECT p.tariff, {EFFECTIVE_TARIFF} FROM parking_lots p WHERE p.id = ?", (lot_id,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return (json.loads(row[0]) if row[0] else None), json.loads(row[1])
+
+
+def set_lot_tariff(lot_id, rule):
+    """Store a lot's rule (None resets to hourly at its price). Applies to new bookings."""
+    text = json.dumps(parse_tariff(rule), sort_keys=True, allow_nan=False) if rule is not None else None
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE parking_lots SET tariff = ? WHERE id = ?", (text, lot_id))
+    updated = cur.rowcount
+    conn.commit()
+    conn.close()
+    return bool(updated)
+
+
+def recompute_costs(lot_id=None, since=None, retariff=False, batch_size=5000):
+    """Re-price closed bookings, batch by batch in id order.
+
+    With retariff=True each booking first takes its lot's current rule,
+    so a pricing change applies retroactively. since is a 'YYYY-MM-DD'
+    start date. Returns {'bookings': updated, 'seconds': elapsed}.
+    """
+    clauses, params = ["end_time IS NOT NULL"], []
+    if lot_id is not None:
+        clauses.append("lot_id = ?")
+        params.append(lot_id)
+    if since:
+        clauses.append("start_ts >= ?")
+        params.append(day_start(since))
+    tariff = f"(SELECT {EFFECTIVE_TARIFF} FROM parking_lots p WHERE p.id = bookings.lot_id)" if retariff else "tariff"
+    assignments = f"tariff = {tariff}, " if retariff else ""
+    sql = f'''
+        UPDATE bookings SET {assignments}cost = booking_cost({tariff}, start_ts, end_ts)
+        WHERE id > ? AND id <= ? AND {" AND ".join(clauses)}
+    '''
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM bookings")
+    low, high = cur.fetchone()
+    conn.close()
+
+    started = time.perf_counter()
+    updated = 0
+    # Short transactions so bookings and releases keep flowing meanwhile
+    while low < high:
+        upper = low + batch_size
+
+        def reprice(cur, low=low, upper=upper):
+            cur.execute(sql, [low, upper] + params)
+            return cur.rowcount
+
+        updated += write_transaction(reprice)
+        low = upper
+    invalidate_stats()
+    return {'bookings': updated, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute booking costs from their tariffs.")
+    parser.add_argument('command', choices=['recompute'])
+    parser.add_argument('--lot', type=int)
+    parser.add_argument('--since')
+    parser.add_argument('--retariff', action='store_true', help="apply each lot's current rule first")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+    report = recompute_costs(args.lot, args.since, args.retariff, args.batch_size)
+    print(f"Re-priced {report['bookings']} bookings in {report['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
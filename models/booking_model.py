@@ -1,93 +1,292 @@
-import sqlite3
-from datetime import datetime
+import threading
+import time
+from models.db import get_connection, write_transaction
+from models.billing import EFFECTIVE_TARIFF
+from models.timestamps import now, day_start, day_end
+from models.slot_index import free_slots
+from models.cache import invalidate_stats
+from models.user_model import invalidate_principal
+from models.events import publish
+from models.metrics import track_calls, BOOKING_CALLS, BOOKING_FAILURES
 
-def init_booking_db():
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_email TEXT NOT NULL,
-            slot_id INTEGER NOT NULL,
-            vehicle_number TEXT NOT NULL,
-            start_time TEXT,
-            end_time TEXT,
-            cost REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+# Allocation latency / contention counters, read via get_allocation_stats()
+_alloc_lock = threading.Lock()
+_alloc_stats = {
+    'allocations': 0,
+    'lot_full': 0,
+    'slot_taken': 0,
+    'retries': 0,
+    'errors': 0,
+    'total_ms': 0.0,
+    'max_ms': 0.0,
+}
+
+def _record_allocation(outcome, started):
+    elapsed = (time.perf_counter() - started) * 1000
+    with _alloc_lock:
+        _alloc_stats[outcome] += 1
+        _alloc_stats['total_ms'] += elapsed
+        _alloc_stats['max_ms'] = max(_alloc_stats['max_ms'], elapsed)
+
+def _count_retry(attempt):
+    with _alloc_lock:
+        _alloc_stats['retries'] += 1
 
+def get_allocation_stats():
+    with _alloc_lock:
+        stats = dict(_alloc_stats)
+    attempts = stats['allocations'] + stats['lot_full'] + stats['slot_taken'] + stats['errors']
+    stats['avg_ms'] = round(stats['total_ms'] / attempts, 3) if attempts else 0.0
+    stats['total_ms'] = round(stats['total_ms'], 3)
+    stats['max_ms'] = round(stats['max_ms'], 3)
+    return stats
+
+def _insert_booking(cur, user_email, slot_id, lot_id, vehicle_number):
+    start_ts, start_time = now()
+    # Snapshot the lot's tariff so later price changes leave this booking alone
+    cur.execute(f'''
+        INSERT INTO bookings (user_id, user_email, slot_id, vehicle_number, start_time, start_ts, lot_id, tariff)
+        VALUES ((SELECT id FROM users WHERE username = ?), ?, ?, ?, ?, ?, ?,
+                (SELECT {EFFECTIVE_TARIFF} FROM parking_lots p WHERE p.id = ?))
+        RETURNING id, user_id
+    ''', (user_email, user_email, slot_id, vehicle_number, start_time, start_ts, lot_id, lot_id))
+    booking_id, user_id = cur.fetchone()
+    return {
+        'booking_id': booking_id,
+        'slot_id': slot_id,
+        'lot_id': lot_id,
+        'user_id': user_id,
+        'username': user_email,
+        'vehicle_number': vehicle_number,
+        'start_time': start_time,
+    }
+
+def _allocate(claim, outcome_if_none):
+    started = time.perf_counter()
+    try:
+        result = write_transaction(claim, on_retry=_count_retry)
+    except Exception:
+        _record_allocation('errors', started)
+        raise
+    _record_allocation('allocations' if result else outcome_if_none, started)
+    return result
+
+def _booking_started(booking):
+    free_slots.discard(booking['slot_id'])
+    invalidate_stats()
+    invalidate_principal(booking['user_id'])
+    publish('booking_started', **booking)
+
+@track_calls(BOOKING_CALLS, BOOKING_FAILURES)
 def add_booking(user_email, slot_id, vehicle_number):
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cur.execute('''
-        INSERT INTO bookings (user_email, slot_id, vehicle_number, start_time)
-        VALUES (?, ?, ?, ?)
-    ''', (user_email, slot_id, vehicle_number, start_time))
-    cur.execute("UPDATE slots SET status = 'O' WHERE id = ?", (slot_id,))
-    conn.commit()
-    conn.close()
+    """Book a specific slot. Returns the booking id, or None if it is not free."""
+    slot_id = int(slot_id)
 
-def release_booking(booking_id):
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
+    def claim(cur):
+        cur.execute("UPDATE slots SET status = 'O' WHERE id = ? AND status = 'A' RETURNING lot_id", (slot_id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return _insert_booking(cur, user_email, slot_id, row[0], vehicle_number)
 
-    # Step 1: Get slot_id and start_time from bookings
-    cur.execute("SELECT slot_id, start_time FROM bookings WHERE id = ?", (booking_id,))
-    result = cur.fetchone()
-    if not result:
-        print(f"⚠️ Booking ID {booking_id} not found.")
-        conn.close()
-        return
+    booking = _allocate(claim, 'slot_taken')
+    if not booking:
+        return None
+    _booking_started(booking)
+    return booking['booking_id']
 
-    slot_id, start_time = result
+@track_calls(BOOKING_CALLS, BOOKING_FAILURES)
+def allocate_slot(user_email, lot_id, vehicle_number):
+    """Claim the lowest free slot in a lot and record the booking atomically.
 
-    # Step 2: Mark slot as available
-    cur.execute("UPDATE slots SET status = 'A' WHERE id = ?", (slot_id,))
+    Candidates come from the in-memory free-slot index, so the database is
+    only touched for the claiming UPDATE and the INSERT. Returns
+    (booking_id, slot_id), or None if the lot is full.
+    """
+    lot_id = int(lot_id)
+    claimed = []
 
-    # Step 3: Get lot_id from slots
-    cur.execute("SELECT lot_id FROM slots WHERE id = ?", (slot_id,))
-    lot_result = cur.fetchone()
-    if not lot_result:
-        print(f"⚠️ Slot ID {slot_id} not found.")
-        conn.close()
-        return
-    lot_id = lot_result[0]
-
-    # Step 4: Get price from parking_lots
-    cur.execute("SELECT price FROM parking_lots WHERE id = ?", (lot_id,))
-    price_result = cur.fetchone()
-    if not price_result:
-        print(f"⚠️ Lot ID {lot_id} not found.")
-        conn.close()
-        return
-    price = price_result[0]
+    def claim(cur):
+        # A retried transaction rolled back our earlier claim; hand it back
+        for slot_id in claimed:
+            free_slots.push(lot_id, slot_id)
+        claimed.clear()
+        while True:
+            slot_id = free_slots.pop(lot_id)
+            if slot_id is None:
+                break
+            claimed.append(slot_id)
+            cur.execute("UPDATE slots SET status = 'O' WHERE id = ? AND status = 'A'", (slot_id,))
+            if cur.rowcount:
+                return _insert_booking(cur, user_email, slot_id, lot_id, vehicle_number)
+            # Taken by another worker process since the index was built
+            claimed.pop()
 
-    # Step 5: Compute cost
-    end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    start_dt = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
-    end_dt = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
-    hours = max(1, int((end_dt - start_dt).total_seconds() // 3600))
-    cost = price * hours
+        # Index is empty; slots freed by other workers are only visible in the table
+        cur.execute('''
+            UPDATE slots SET status = 'O'
+            WHERE id = (
+                SELECT id FROM slots
+                WHERE lot_id = ? AND status = 'A'
+                ORDER BY id ASC LIMIT 1
+            )
+            RETURNING id
+        ''', (lot_id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return _insert_booking(cur, user_email, row[0], lot_id, vehicle_number)
 
-    # Step 6: Update booking record
-    cur.execute("UPDATE bookings SET end_time = ?, cost = ? WHERE id = ?", (end_time, cost, booking_id))
+    try:
+        booking = _allocate(claim, 'lot_full')
+    except Exception:
+        for slot_id in claimed:
+            free_slots.push(lot_id, slot_id)
+        raise
+    if not booking:
+        return None
+    _booking_started(booking)
+    return booking['booking_id'], booking['slot_id']
 
-    conn.commit()
-    conn.close()
+@track_calls(BOOKING_CALLS, BOOKING_FAILURES)
+def release_booking(booking_id):
+    """End an active booking and price it from its tariff snapshot.
+
+    One statement: cost comes from booking_cost() and the slot is freed by
+    the trg_bookings_release trigger. Returns False if the booking does not
+    exist or was already released.
+    """
+    end_ts, end_time = now()
+
+    def release(cur):
+        cur.execute('''
+            UPDATE bookings
+            SET end_time = ?, end_ts = ?, cost = booking_cost(tariff, start_ts, ?)
+            WHERE id = ? AND end_time IS NULL
+            RETURNING slot_id, lot_id, user_id, user_email, cost
+        ''', (end_time, end_ts, end_ts, booking_id))
+        return cur.fetchone()
+
+    result = write_transaction(release)
+    if not result:
+        print(f"⚠️ Booking ID {booking_id} not found or already released.")
+        return False
 
-def get_user_bookings(user_email):
-    conn = sqlite3.connect('database.db')
+    slot_id, lot_id, user_id, user_email, cost = result
+    if lot_id is not None:
+        free_slots.push(lot_id, slot_id)
+    invalidate_stats()
+    invalidate_principal(user_id)
+    publish('booking_ended', booking_id=booking_id, slot_id=slot_id, lot_id=lot_id,
+            user_id=user_id, username=user_email, end_time=end_time, cost=cost)
+    return True
+
+def get_user_bookings(user_id):
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
         SELECT id, slot_id, vehicle_number, start_time, end_time, cost
         FROM bookings
-        WHERE user_email = ?
+        WHERE user_id = ?
         ORDER BY id DESC
-    ''', (user_email,))
+    ''', (user_id,))
     bookings = cur.fetchall()
     conn.close()
     return bookings
 
+
+def search_bookings(username=None, lot_id=None, vehicle_number=None, date_from=None,
+                    date_to=None, active_only=False, before_id=None, limit=50):
+    """Keyset-paginated booking search, newest first.
+
+    Pages are anchored on bookings.id: pass the last id of one page as
+    before_id to fetch the next. Returns (rows, next_before_id) where
+    next_before_id is None on the last page. date_from/date_to are
+    'YYYY-MM-DD' strings, both inclusive; vehicle_number matches as a prefix.
+    """
+    clauses, params = [], []
+    if before_id is not None:
+        clauses.append("b.id < ?")
+        params.append(before_id)
+    if username:
+        clauses.append("b.user_id = (SELECT id FROM users WHERE username = ?)")
+        params.append(username)
+    if lot_id is not None:
+        clauses.append("b.lot_id = ?")
+        params.append(lot_id)
+    if vehicle_number:
+        # Prefix match written as a range so it can use idx_bookings_vehicle
+        clauses.append("b.vehicle_number >= ? AND b.vehicle_number < ?")
+        params.extend([vehicle_number, vehicle_number + '\uffff'])
+    if date_from:
+        clauses.append("b.start_ts >= ?")
+        params.append(day_start(date_from))
+    if date_to:
+        clauses.append("b.start_ts < ?")
+        params.append(day_end(date_to))
+    if active_only:
+        clauses.append("b.end_time IS NULL")
+
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT b.id, u.username, b.slot_id, b.vehicle_number, b.start_time, b.end_time, b.cost
+        FROM bookings b
+        JOIN users u ON b.user_id = u.id
+        {where}
+        ORDER BY b.id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cur.fetchall()
+    conn.close()
+
+    next_before_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before_id = rows[-1][0]
+    return rows, next_before_id
+
+
+EXPORT_COLUMNS = ('booking_id', 'lot_id', 'lot', 'slot_id', 'slot', 'user_id', 'username',
+                  'vehicle_number', 'start_time', 'end_time', 'cost')
+EXPORT_BATCH_SIZE = 1000
+
+def export_bookings(lot_id=None, date_from=None, date_to=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield bookings with their lot, slot and user, oldest first, as EXPORT_COLUMNS tuples.
+
+    Read in keyset batches on (start_ts, id) along idx_bookings_start_ts;
+    each batch borrows a connection only for its own query, so a slow
+    download neither pins a pooled connection nor keeps a read transaction
+    open, and memory stays at one batch. date_from/date_to are
+    'YYYY-MM-DD' strings, both inclusive.
+    """
+    clauses, params = [], []
+    if lot_id is not None:
+        clauses.append("b.lot_id = ?")
+        params.append(lot_id)
+    if date_to:
+        clauses.append("b.start_ts < ?")
+        params.append(day_end(date_to))
+    where = "".join(f" AND {clause}" for clause in clauses)
+    sql = f'''
+        SELECT b.id, b.lot_id, l.name, b.slot_id, s.location, b.user_id, b.user_email,
+               b.vehicle_number, b.start_time, b.end_time, b.cost, b.start_ts
+        FROM bookings b
+        LEFT JOIN parking_lots l ON l.id = b.lot_id
+        LEFT JOIN slots s ON s.id = b.slot_id
+        WHERE b.start_ts >= ? AND (b.start_ts > ? OR b.id > ?){where}
+        ORDER BY b.start_ts, b.id
+        LIMIT ?
+    '''
+
+    last_ts, last_id = (day_start(date_from) if date_from else 0), 0
+    while True:
+        conn = get_connection()
+        rows = conn.execute(sql, [last_ts, last_ts, last_id] + params + [batch_size]).fetchall()
+        conn.close()
+        for row in rows:
+            yield row[:-1]
+        if len(rows) < batch_size:
+            return
+        last_ts, last_id = rows[-1][-1], rows[-1][0]
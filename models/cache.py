@@ -0,0 +1,167 @@
+"""Read-through cache for derived data such as dashboard statistics.
+
+Two backends share one interface: LocalCache (per-process LRU with TTL)
+and SQLiteCache (a cache file shared by every worker on the host). The
+backend is picked by config.CACHE_BACKEND.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from models.db import ConnectionPool
+
+_MISSING = object()
+
+
+class LocalCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Cache entries in a small SQLite file so all workers see invalidations."""
+
+    def __init__(self, path, max_entries=1024):
+        self.max_entries = max_entries
+        self._pool = ConnectionPool(path, size=4)
+        conn = self._pool.acquire()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def get(self, key):
+        conn = self._pool.acquire()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        conn.close()
+        if row is None or row[1] < time.time():
+            return _MISSING
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._pool.acquire()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        # Expired rows are swept on write; the table stays bounded
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        conn.execute('''
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        conn.commit()
+        conn.close()
+
+    def delete_prefix(self, prefix):
+        conn = self._pool.acquire()
+        conn.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        conn.commit()
+        conn.close()
+
+    def clear(self):
+        self.delete_prefix('')
+
+    def size(self):
+        conn = self._pool.acquire()
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        conn.close()
+        return count
+
+
+def _make_backend():
+    if config.CACHE_BACKEND == 'sqlite':
+        return SQLiteCache(config.CACHE_PATH, config.CACHE_MAX_ENTRIES)
+    return LocalCache(config.CACHE_MAX_ENTRIES)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _make_backend()
+    return _backend
+
+
+def cached(key, compute, ttl=None):
+    """Return the cached value for key, computing and storing it on a miss."""
+    backend = get_backend()
+    value = backend.get(key)
+    if value is not _MISSING:
+        with _stats_lock:
+            _stats['hits'] += 1
+        return value
+    with _stats_lock:
+        _stats['misses'] += 1
+    value = compute()
+    backend.set(key, value, config.CACHE_TTL if ttl is None else ttl)
+    return value
+
+
+def invalidate(prefix):
+    get_backend().delete_prefix(prefix)
+    with _stats_lock:
+        _stats['invalidations'] += 1
+
+
+def invalidate_stats():
+    """Drop every cached statistics view; called by booking/slot/user writes."""
+    invalidate('stats:')
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    stats['backend'] = config.CACHE_BACKEND
+    stats['entries'] = get_backend().size()
+    return stats
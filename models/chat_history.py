@@ -0,0 +1,60 @@
+import hashlib
+import threading
+from collections import deque
+
+import config
+from models.chat_model import get_recent_messages
+from models.chat_writer import ChatMessage
+
+_EMPTY_ETAG = hashlib.sha1(b'').hexdigest()[:16]
+
+
+class RecentMessages:
+    """Bounded in-memory ring of the latest chat messages, oldest first.
+
+    Rows have the same shape as get_recent_messages() rows:
+    (username, message, timestamp, is_admin, id). The ETag chains a hash
+    over every appended message, so workers that saw the same messages
+    agree on it. Only committed messages are appended, so every row has
+    its id.
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self._lock = threading.Lock()
+        self._messages = deque(maxlen=size)
+        self._etag = _EMPTY_ETAG
+
+    def _chain(self, msg):
+        row = (msg.username, msg.message, msg.timestamp, msg.is_admin)
+        self._etag = hashlib.sha1(f"{self._etag}\x00{row!r}".encode()).hexdigest()[:16]
+
+    def warm(self):
+        """Reload from the database; called once at startup."""
+        messages = []
+        for username, message, timestamp, is_admin, message_id in get_recent_messages(self.size):
+            msg = ChatMessage(username, message, is_admin, False, timestamp)
+            msg.id = message_id
+            messages.append(msg)
+        with self._lock:
+            self._messages.clear()
+            self._etag = _EMPTY_ETAG
+            for msg in messages:
+                self._messages.append(msg)
+                self._chain(msg)
+
+    def append(self, msg):
+        """Add a committed ChatMessage."""
+        with self._lock:
+            self._messages.append(msg)
+            self._chain(msg)
+
+    def snapshot(self):
+        """Return (etag, rows) as one consistent view."""
+        with self._lock:
+            rows = [(m.username, m.message, m.timestamp, m.is_admin, m.id) for m in self._messages]
+            etag = self._etag
+        return etag, rows
+
+
+recent_messages = RecentMessages(config.CHAT_HISTORY_SIZE)
@@ -1,64 +1,64 @@
-import sqlite3
 from datetime import datetime
+from models.db import get_connection
 
-def init_chat_db():
-    conn = sqlite3.connect('database.db')
+def add_message(username, message, is_admin=0, timestamp=None):
+    conn = get_connection()
     cur = conn.cursor()
     
-    # Create chat messages table
     cur.execute('''
-        CREATE TABLE IF NOT EXISTS chat_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            message TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            is_admin INTEGER DEFAULT 0
-        )
-    ''')
+        INSERT INTO chat_messages (username, message, is_admin, timestamp)
+        VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', (username, message, is_admin, timestamp))
     
     conn.commit()
+    message_id = cur.lastrowid
     conn.close()
+    return message_id
 
-def add_message(username, message, is_admin=0):
-    conn = sqlite3.connect('database.db')
+def get_recent_messages(limit=50):
+    conn = get_connection()
     cur = conn.cursor()
     
     cur.execute('''
-        INSERT INTO chat_messages (username, message, is_admin)
-        VALUES (?, ?, ?)
-    ''', (username, message, is_admin))
+        SELECT username, message, timestamp, is_admin, id
+        FROM chat_messages
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (limit,))
     
-    conn.commit()
-    message_id = cur.lastrowid
+    messages = cur.fetchall()
     conn.close()
-    return message_id
+    return list(reversed(messages))
 
-def get_recent_messages(limit=50):
-    conn = sqlite3.connect('database.db')
+# Keyset pages on the primary key; rows are oldest first like get_recent_messages
+def get_messages_before(before_id, limit=50):
+    conn = get_connection()
     cur = conn.cursor()
     
     cur.execute('''
-        SELECT username, message, timestamp, is_admin
+        SELECT username, message, timestamp, is_admin, id
         FROM chat_messages
-        ORDER BY timestamp DESC
+        WHERE id < ?
+        ORDER BY id DESC
         LIMIT ?
-    ''', (limit,))
+    ''', (before_id, limit))
     
     messages = cur.fetchall()
     conn.close()
     return list(reversed(messages))
 
-def get_online_users():
-    conn = sqlite3.connect('database.db')
+def get_messages_since(since_id, limit=50):
+    conn = get_connection()
     cur = conn.cursor()
     
     cur.execute('''
-        SELECT DISTINCT username, is_admin
+        SELECT username, message, timestamp, is_admin, id
         FROM chat_messages
-        WHERE timestamp >= datetime('now', '-1 hour')
-        ORDER BY username
-    ''')
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (since_id, limit))
     
-    users = cur.fetchall()
+    messages = cur.fetchall()
     conn.close()
-    return users
\ No newline at end of file
+    return messages
\ No newline at end of file
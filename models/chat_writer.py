@@ -0,0 +1,235 @@
+"""Write-behind persistence for chat messages.
+
+Socket.IO handlers hand messages to queue_message() with an on_done
+callback that broadcasts them; a background thread drains the queue and
+inserts messages in batched transactions, one commit per batch instead of
+one per message, then calls each message's on_done with its id set. A batch is
+flushed when it reaches CHAT_BATCH_SIZE messages or CHAT_FLUSH_INTERVAL
+seconds after its first message arrived, or as soon as the queue is empty
+when a caller or a broadcast is waiting on it (group commit): an idle chat
+commits each message at once, and under load the queue refills while a
+batch commits, so batches still form without anyone lingering.
+
+config.CHAT_DURABILITY picks the trade-off:
+    'async'  return as soon as the message is queued (write-behind)
+    'group'  queue, then wait until the batch holding it has committed
+    'sync'   insert and commit inline, one transaction per message
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import config
+from models.chat_model import add_message
+from models.db import write_transaction
+from models.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CHAT_PERSISTED = Counter(
+    'parking_chat_messages_persisted_total',
+    'Chat messages committed to the database.',
+)
+CHAT_REJECTED = Counter(
+    'parking_chat_messages_rejected_total',
+    'Chat messages refused because the write-behind queue was full.',
+)
+CHAT_LOST = Counter(
+    'parking_chat_messages_lost_total',
+    'Queued chat messages whose batch failed to commit.',
+)
+
+
+class ChatQueueFull(Exception):
+    pass
+
+
+def utc_timestamp():
+    """Current time in the format CURRENT_TIMESTAMP stores."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ChatMessage:
+    __slots__ = ('username', 'message', 'is_admin', 'timestamp', 'id', 'error', 'done', 'on_done')
+
+    def __init__(self, username, message, is_admin, wait, timestamp=None, on_done=None):
+        self.username = username
+        self.message = message
+        self.is_admin = is_admin
+        # Stamped on arrival, not when flushed
+        self.timestamp = timestamp or utc_timestamp()
+        self.id = None
+        self.error = None
+        self.done = threading.Event() if wait else None
+        self.on_done = on_done
+
+    def finish(self, error=None):
+        """Record the write's outcome and run on_done(self); id is set unless error is."""
+        self.error = error
+        if self.on_done is not None:
+            try:
+                self.on_done(self)
+            except Exception:
+                logger.exception("Chat message callback failed")
+        if self.done is not None:
+            self.done.set()
+
+
+def _waited_on(item):
+    # flush() markers, 'group' callers and messages broadcast on commit
+    return not isinstance(item, ChatMessage) or item.done is not None or item.on_done is not None
+
+
+class ChatWriter:
+    def __init__(self, batch_size=100, flush_interval=0.05, max_queued=10000, enqueue_timeout=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, username, message, is_admin=0, wait=False, timestamp=None, on_done=None):
+        """Queue a message; raises ChatQueueFull if the queue stays full."""
+        if self._closed:
+            raise ChatQueueFull("chat writer is shut down")
+        self._ensure_started()
+        pending = ChatMessage(username, message, is_admin, wait, timestamp, on_done)
+        try:
+            self._queue.put(pending, timeout=self.enqueue_timeout)
+        except queue.Full:
+            CHAT_REJECTED.inc()
+            raise ChatQueueFull("chat write queue is full")
+        if wait:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+        return pending
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            # A caller or a broadcast is waiting on this batch: commit what is queued now
+            waiting = _waited_on(first)
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = 0 if waiting else deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                waiting = waiting or _waited_on(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        messages = [item for item in batch if isinstance(item, ChatMessage)]
+
+        def insert(cur):
+            ids = []
+            for pending in messages:
+                cur.execute('''
+                    INSERT INTO chat_messages (username, message, timestamp, is_admin)
+                    VALUES (?, ?, ?, ?)
+                ''', (pending.username, pending.message, pending.timestamp, pending.is_admin))
+                ids.append(cur.lastrowid)
+            return ids
+
+        error = None
+        if messages:
+            try:
+                # Ids are published only once the batch has committed
+                for pending, message_id in zip(messages, write_transaction(insert)):
+                    pending.id = message_id
+                CHAT_PERSISTED.inc(amount=len(messages))
+            except Exception as e:
+                logger.exception("Failed to persist %d chat messages", len(messages))
+                CHAT_LOST.inc(amount=len(messages))
+                error = e
+        for item in batch:
+            if isinstance(item, ChatMessage):
+                item.finish(error)
+            else:
+                # flush() marker
+                item.set()
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def close(self, timeout=10):
+        """Stop accepting messages and drain the queue."""
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+chat_writer = ChatWriter(
+    batch_size=config.CHAT_BATCH_SIZE,
+    flush_interval=config.CHAT_FLUSH_INTERVAL,
+    max_queued=config.CHAT_QUEUE_MAX,
+    enqueue_timeout=config.CHAT_ENQUEUE_TIMEOUT,
+)
+atexit.register(chat_writer.close)
+
+CHAT_QUEUE_DEPTH = Gauge(
+    'parking_chat_queue_depth',
+    'Chat messages waiting to be written.',
+    collect=lambda: {(): chat_writer.depth()},
+)
+
+
+def queue_message(username, message, is_admin=0, timestamp=None, on_done=None):
+    """Persist a chat message according to config.CHAT_DURABILITY.
+
+    Returns the ChatMessage. Its id is set once the row is committed, which
+    in 'async' mode happens after this returns; on_done(message) runs then,
+    with message.error set instead if the write failed.
+    """
+    if config.CHAT_DURABILITY == 'sync':
+        chat_message = ChatMessage(username, message, is_admin, False, timestamp, on_done)
+        try:
+            chat_message.id = add_message(username, message, is_admin, chat_message.timestamp)
+        except Exception as e:
+            CHAT_LOST.inc()
+            chat_message.finish(e)
+            raise
+        CHAT_PERSISTED.inc()
+        chat_message.finish()
+        return chat_message
+    return chat_writer.submit(username, message, is_admin,
+                              wait=config.CHAT_DURABILITY == 'group', timestamp=timestamp, on_done=on_done)
@@ -0,0 +1,119 @@
+"""Materialized statistics counters.
+
+The counters are maintained by triggers (see migration v0003). reconcile()
+recomputes them from the base tables and reports any drift:
+
+    python -m models.counters reconcile [--dry-run]
+"""
+import sys
+
+from models.db import get_connection
+
+# counter name -> query computing its true value
+RECOUNT_QUERIES = {
+    'total_lots': "SELECT COUNT(*) FROM parking_lots",
+    'total_slots': "SELECT COUNT(*) FROM slots",
+    'available_slots': "SELECT COUNT(*) FROM slots WHERE status = 'A'",
+    'occupied_slots': "SELECT COUNT(*) FROM slots WHERE status = 'O'",
+    'total_users': "SELECT COUNT(*) FROM users WHERE is_admin = 0",
+    'total_bookings': "SELECT COUNT(*) FROM bookings",
+    'active_bookings': "SELECT COUNT(*) FROM bookings WHERE end_time IS NULL",
+}
+
+
+def get_stats():
+    """Return every global counter as a dict, read in one scan of the small stats_counters table."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT name, value FROM stats_counters")
+    stats = dict(cur.fetchall())
+    conn.close()
+    for name in RECOUNT_QUERIES:
+        stats.setdefault(name, 0)
+    return stats
+
+
+def get_lot_counters():
+    """Return {lot_id: (available, occupied)}."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT lot_id, available, occupied FROM lot_counters")
+    counters = {lot_id: (available, occupied) for lot_id, available, occupied in cur.fetchall()}
+    conn.close()
+    return counters
+
+
+def reconcile(fix=True):
+    """Recompute every counter and return the drift found.
+
+    Returns {'global': {name: (stored, actual)}, 'lots': {lot_id: (stored, actual)}}
+    containing only the counters that disagreed. With fix=True they are
+    corrected in the same transaction the recount ran in.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    # Hold the write lock so no booking lands between recount and repair
+    cur.execute("BEGIN IMMEDIATE")
+
+    cur.execute("SELECT name, value FROM stats_counters")
+    stored = dict(cur.fetchall())
+    global_drift = {}
+    for name, query in RECOUNT_QUERIES.items():
+        cur.execute(query)
+        actual = cur.fetchone()[0]
+        if stored.get(name) != actual:
+            global_drift[name] = (stored.get(name), actual)
+
+    cur.execute("SELECT lot_id, available, occupied FROM lot_counters")
+    stored_lots = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    cur.execute('''
+        SELECT lot_id, SUM(status = 'A'), SUM(status = 'O')
+        FROM slots WHERE lot_id IS NOT NULL
+        GROUP BY lot_id
+    ''')
+    actual_lots = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    cur.execute("SELECT id FROM parking_lots")
+    for (lot_id,) in cur.fetchall():
+        actual_lots.setdefault(lot_id, (0, 0))
+    lot_drift = {
+        lot_id: (stored_lots.get(lot_id), actual_lots.get(lot_id))
+        for lot_id in set(stored_lots) | set(actual_lots)
+        if stored_lots.get(lot_id) != actual_lots.get(lot_id)
+    }
+
+    if fix and (global_drift or lot_drift):
+        for name, (_, actual) in global_drift.items():
+            cur.execute("INSERT OR REPLACE INTO stats_counters (name, value) VALUES (?, ?)", (name, actual))
+        for lot_id, (_, actual) in lot_drift.items():
+            if actual is None:
+                cur.execute("DELETE FROM lot_counters WHERE lot_id = ?", (lot_id,))
+            else:
+                cur.execute(
+                    "INSERT OR REPLACE INTO lot_counters (lot_id, available, occupied) VALUES (?, ?, ?)",
+                    (lot_id, actual[0], actual[1]),
+                )
+    conn.commit()
+    conn.close()
+    return {'global': global_drift, 'lots': lot_drift}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'reconcile':
+        print(__doc__)
+        return 1
+    fix = '--dry-run' not in argv
+    drift = reconcile(fix=fix)
+    if not drift['global'] and not drift['lots']:
+        print("Counters are in sync.")
+        return 0
+    for name, (stored, actual) in sorted(drift['global'].items()):
+        print(f"{name}: stored={stored} actual={actual}")
+    for lot_id, (stored, actual) in sorted(drift['lots'].items()):
+        print(f"lot {lot_id}: stored={stored} actual={actual} (available, occupied)")
+    print("Drift corrected." if fix else "Dry run; nothing changed.")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Password hashing and verification.
+
+Passwords are stored as salted scrypt hashes:
+
+    scrypt$<n>$<r>$<p>$<salt hex>$<hash hex>
+
+with the cost from config.PASSWORD_SCRYPT_*. Anything else in
+users.password is a legacy plaintext row; check_password() accepts it and
+reports that it needs rehashing, as it does for hashes made with an older
+cost.
+
+Hashing runs on a small dedicated pool (PASSWORD_HASH_THREADS) so a burst
+of logins uses a bounded number of cores and cannot tie up request or
+Socket.IO threads; at most PASSWORD_HASH_QUEUE more may wait, for up to
+PASSWORD_HASH_WAIT seconds, before LoginBusy is raised. Successful checks
+are remembered for PASSWORD_CACHE_TTL seconds under an HMAC with a
+per-process key, so repeated logins skip the hash.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from models.metrics import Counter, Histogram
+
+SCHEME = 'scrypt'
+SALT_BYTES = 16
+HASH_BYTES = 32
+CACHE_MAX_ENTRIES = 4096
+
+PASSWORD_HASH_SECONDS = Histogram(
+    'parking_password_hash_seconds',
+    'Time spent computing scrypt password hashes.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+LOGIN_BUSY = Counter(
+    'parking_password_checks_rejected_total',
+    'Password checks refused because the hashing pool was saturated.',
+)
+
+
+class LoginBusy(Exception):
+    pass
+
+
+def _cost():
+    return config.PASSWORD_SCRYPT_N, config.PASSWORD_SCRYPT_R, config.PASSWORD_SCRYPT_P
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES)
+
+
+def _timed(fn, args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class HashPool:
+    """Runs scrypt on a fixed set of threads with bounded admission."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def use_executor(self, executor, workers):
+        """Swap in another executor, e.g. one with real threads under gevent."""
+        with self._lock:
+            self._executor = executor
+            self._slots = threading.BoundedSemaphore(workers + config.PASSWORD_HASH_QUEUE)
+            self._pid = os.getpid()
+
+    def _ensure(self):
+        # Threads do not survive fork; each worker process builds its own pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    workers = config.PASSWORD_HASH_THREADS
+                    self._executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+                    self._slots = threading.BoundedSemaphore(workers + config.PASSWORD_HASH_QUEUE)
+                    self._pid = os.getpid()
+        return self._executor, self._slots
+
+    def run(self, fn, *args):
+        executor, slots = self._ensure()
+        if not slots.acquire(timeout=config.PASSWORD_HASH_WAIT):
+            LOGIN_BUSY.inc()
+            raise LoginBusy("Too many logins in progress")
+        try:
+            result, seconds = executor.submit(_timed, fn, args).result()
+        finally:
+            slots.release()
+        # Recorded here: pool threads may be real threads under gevent
+        PASSWORD_HASH_SECONDS.observe(value=seconds)
+        return result
+
+
+hash_pool = HashPool()
+
+_cache_key = secrets.token_bytes(32)
+_cache_lock = threading.Lock()
+_verified = OrderedDict()
+
+
+def _cache_token(username, stored, password):
+    message = '\x00'.join((username, stored, password)).encode()
+    return hmac.new(_cache_key, message, hashlib.sha256).digest()
+
+
+def _cache_hit(token):
+    if config.PASSWORD_CACHE_TTL <= 0:
+        return False
+    with _cache_lock:
+        expires_at = _verified.get(token)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del _verified[token]
+            return False
+        _verified.move_to_end(token)
+        return True
+
+
+def _cache_store(token):
+    if config.PASSWORD_CACHE_TTL <= 0:
+        return
+    with _cache_lock:
+        _verified[token] = time.monotonic() + config.PASSWORD_CACHE_TTL
+        _verified.move_to_end(token)
+        while len(_verified) > CACHE_MAX_ENTRIES:
+            _verified.popitem(last=False)
+
+
+def _encode(salt, digest, n, r, p):
+    return f"{SCHEME}${n}${r}${p}${salt.hex()}${digest.hex()}"
+
+
+def _hash(password, n, r, p):
+    salt = os.urandom(SALT_BYTES)
+    return _encode(salt, _scrypt(password, salt, n, r, p), n, r, p)
+
+
+def hash_password(password):
+    """Hash with the configured cost, on the hashing pool."""
+    return hash_pool.run(_hash, password, *_cost())
+
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + '$')
+
+
+def _verify(stored, password):
+    _, n, r, p, salt, digest = stored.split('$')
+    actual = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(actual, bytes.fromhex(digest))
+
+
+# Checked when the user does not exist, so that costs as much as a wrong password
+_DUMMY_HASH = None
+
+
+def check_password(username, stored, password):
+    """Return (matches, needs_rehash) for a users.password value.
+
+    stored is None for an unknown user. Raises LoginBusy when the hashing
+    pool is saturated.
+    """
+    global _DUMMY_HASH
+    if stored is None:
+        if _DUMMY_HASH is None or _DUMMY_HASH.split('$')[1:4] != list(map(str, _cost())):
+            _DUMMY_HASH = hash_pool.run(_hash, secrets.token_hex(8), *_cost())
+        hash_pool.run(_verify, _DUMMY_HASH, password)
+        return False, False
+    if not is_hashed(stored):
+        matches = hmac.compare_digest(stored.encode(), password.encode())
+        return matches, matches
+
+    token = _cache_token(username, stored, password)
+    if _cache_hit(token):
+        matches = True
+    else:
+        matches = hash_pool.run(_verify, stored, password)
+        if matches:
+            _cache_store(token)
+    needs_rehash = stored.split('$')[1:4] != list(map(str, _cost()))
+    return matches, matches and needs_rehash
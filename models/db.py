@@ -0,0 +1,297 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import partial
+from queue import LifoQueue, Empty
+
+import config
+from models.profiler import ProfilingCursor
+
+# Applied once when a pooled connection is opened, never per request.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+
+# Callables run on every newly opened pooled connection (trace hooks, UDFs)
+_connect_hooks = []
+
+
+def on_connect(fn):
+    """Register fn(conn) to run whenever the pool opens a new connection."""
+    _connect_hooks.append(fn)
+    return fn
+
+
+def run_connect_hooks(conn):
+    for hook in _connect_hooks:
+        hook(conn)
+
+
+# Set by an async entry point (wsgi.py) so sqlite work runs on real threads
+# instead of stalling the event loop; None runs calls inline.
+_blocking_runner = None
+
+
+def use_blocking_runner(runner):
+    """Route blocking sqlite calls through runner(fn, *args), e.g. a threadpool."""
+    global _blocking_runner
+    _blocking_runner = runner
+
+
+def run_blocking(fn, *args):
+    if _blocking_runner is None:
+        return fn(*args)
+    return _blocking_runner(fn, *args)
+
+
+class OffloadCursor(sqlite3.Cursor):
+    """Cursor whose statement execution and fetches go through run_blocking().
+
+    Row-by-row iteration stays inline; use fetchmany() for large scans.
+    """
+
+    def execute(self, sql, params=()):
+        return run_blocking(super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return run_blocking(super().executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        return run_blocking(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return run_blocking(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return run_blocking(super().fetchall)
+
+
+class PooledCursor(ProfilingCursor, OffloadCursor):
+    pass
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool."""
+
+    _pool = None
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return run_blocking(super().commit)
+
+    def rollback(self):
+        return run_blocking(super().rollback)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, database, size=8, timeout=10.0, busy_timeout_ms=5000):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pid = os.getpid()
+        # LIFO so the most recently used (warm) connection is handed out first
+        self._idle = LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def _connect(self):
+        conn = run_blocking(partial(
+            sqlite3.connect,
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+        ))
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        # booking_cost() is called by queries and triggers, so every connection
+        # needs it whatever has been imported so far
+        from models.billing import register_functions
+        register_functions(conn)
+        run_connect_hooks(conn)
+        conn._pool = self
+        # Connections dropped without close() (e.g. a route raised) free their slot
+        weakref.finalize(conn, self._forget)
+        return conn
+
+    def _forget(self):
+        with self._lock:
+            self._open -= 1
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except Empty:
+            pass
+
+        with self._lock:
+            create = self._open < self.size
+            if create:
+                self._open += 1
+                self.misses += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                self._forget()
+                raise
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except Empty:
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            sqlite3.Connection.close(conn)
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            sqlite3.Connection.close(conn)
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses + self.waits
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': self._idle.qsize(),
+                'in_use': self._open - self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'hit_rate': round(self.hits / requests, 4) if requests else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    # A forked worker must not share the parent's sqlite handles
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(
+                    config.DATABASE,
+                    size=config.DB_POOL_SIZE,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    busy_timeout_ms=config.DB_BUSY_TIMEOUT_MS,
+                )
+    return _pool
+
+
+def get_connection():
+    """Borrow a connection from the pool; conn.close() returns it."""
+    return get_pool().acquire()
+
+
+@contextmanager
+def get_db():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def is_lock_error(exc):
+    msg = str(exc).lower()
+    return 'locked' in msg or 'busy' in msg
+
+
+def write_transaction(fn, retries=None, backoff=None, on_retry=None):
+    """Run fn(cur) inside BEGIN IMMEDIATE, retrying with backoff while locked.
+
+    The write lock is taken up front, so reads done by fn are not invalidated
+    by a concurrent writer before fn's own writes land.
+    """
+    retries = config.DB_WRITE_RETRIES if retries is None else retries
+    backoff = config.DB_RETRY_BACKOFF if backoff is None else backoff
+    attempt = 0
+    while True:
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = fn(conn.cursor())
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e) or attempt >= retries:
+                raise
+        finally:
+            conn.close()
+        attempt += 1
+        if on_retry:
+            on_retry(attempt)
+        # Exponential backoff with jitter so retrying writers do not stampede
+        time.sleep(backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
@@ -0,0 +1,25 @@
+"""In-process publish/subscribe for domain events raised by write paths.
+
+Model functions publish after their transaction commits; the web layer
+subscribes to fan the events out to Socket.IO rooms.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_subscribers = []
+
+
+def subscribe(fn):
+    """Register fn(event, payload) for every published event."""
+    _subscribers.append(fn)
+    return fn
+
+
+def publish(event, **payload):
+    for fn in list(_subscribers):
+        try:
+            fn(event, payload)
+        except Exception:
+            # A broken listener must never fail the write that triggered it
+            logger.exception("Event subscriber failed for %s", event)
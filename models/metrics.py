@@ -0,0 +1,230 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in memory and are updated inline by
+the code they describe, so a scrape of /metrics only formats numbers.
+Values that come from the database (per-lot occupancy) are read through
+the cache at most once per METRICS_DB_TTL seconds, however often the
+endpoint is scraped. Every process exports its own series.
+"""
+import bisect
+import functools
+import threading
+
+import config
+from models.cache import cached
+from models.db import get_connection
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, key, value, *extra in self.samples():
+            lines.append(f"{name}{_format_labels(self.labels, key, *extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Gauge set inline, or computed at scrape time when collect is given.
+
+    collect() returns {label_values_tuple: value}.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        values = self.collect()
+        return [(self.name, tuple(str(label) for label in key), value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                samples.append((f"{self.name}_bucket", key, cumulative, f'le="{_format_value(float(bound))}"'))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def track_calls(calls, failures):
+    """Count calls of the wrapped function, and failures (raised or falsy result)."""
+    def decorator(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            calls.inc(name)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                failures.inc(name)
+                raise
+            if not result:
+                failures.inc(name)
+            return result
+        return wrapper
+    return decorator
+
+
+# ---------------- APPLICATION METRICS ----------------
+
+def _lot_occupancy():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT l.id, l.name, c.available, c.occupied
+        FROM parking_lots l
+        JOIN lot_counters c ON c.lot_id = l.id
+    ''')
+    rows = cur.fetchall()
+    conn.close()
+    return [list(row) for row in rows]
+
+
+def _collect_lot_slots():
+    # Not under the 'stats:' prefix: writes must not force a DB read per scrape
+    rows = cached('metrics:lot_occupancy', _lot_occupancy, ttl=config.METRICS_DB_TTL)
+    values = {}
+    for lot_id, name, available, occupied in rows:
+        values[(lot_id, name, 'available')] = available
+        values[(lot_id, name, 'occupied')] = occupied
+    return values
+
+
+REQUEST_LATENCY = Histogram(
+    'parking_http_request_duration_seconds',
+    'Time spent handling HTTP requests, per Flask endpoint.',
+    ('endpoint', 'method'),
+)
+REQUESTS = Counter(
+    'parking_http_requests_total',
+    'HTTP responses, per Flask endpoint and status code.',
+    ('endpoint', 'method', 'status'),
+)
+BOOKING_CALLS = Counter(
+    'parking_booking_calls_total',
+    'Calls of the booking functions.',
+    ('function',),
+)
+BOOKING_FAILURES = Counter(
+    'parking_booking_failures_total',
+    'Booking function calls that raised or booked/released nothing.',
+    ('function',),
+)
+LOT_SLOTS = Gauge(
+    'parking_lot_slots',
+    'Slots per parking lot and state.',
+    ('lot_id', 'lot', 'state'),
+    collect=_collect_lot_slots,
+)
+CHAT_CONNECTIONS = Gauge(
+    'parking_socketio_connections',
+    'Socket.IO connections currently joined to a room.',
+    ('room',),
+)
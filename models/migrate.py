@@ -0,0 +1,199 @@
+"""Schema migration runner.
+
+    python -m models.migrate status
+    python -m models.migrate upgrade [VERSION]
+    python -m models.migrate backfill
+    python -m models.migrate downgrade VERSION
+
+upgrade runs the schema steps and then the data backfills; the app applies
+only the schema steps at startup and leaves the backfills to one
+background task per host (start_backfills()).
+"""
+import importlib
+import logging
+import pkgutil
+import sys
+from datetime import datetime
+
+import config
+from models import migrations
+from models.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def discover():
+    """Return [(version, name, module)] for every migration, oldest first."""
+    found = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        if not info.name.startswith('v'):
+            continue
+        version = int(info.name[1:5])
+        module = importlib.import_module(f'models.migrations.{info.name}')
+        found.append((version, info.name, module))
+    return sorted(found)
+
+
+def _ensure_version_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+
+
+def _current(cur):
+    _ensure_version_table(cur)
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    return cur.fetchone()[0] or 0
+
+
+def current_version():
+    conn = get_connection()
+    cur = conn.cursor()
+    version = _current(cur)
+    conn.commit()
+    conn.close()
+    return version
+
+
+def upgrade(target=None, backfills=True):
+    """Apply pending migrations up to target (default: latest). Returns the new version.
+
+    With backfills=False only the schema changes run; see run_backfills().
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    version = 0
+    try:
+        for version_no, name, module in discover():
+            if target is not None and version_no > target:
+                break
+            # Each step runs in its own write transaction and re-checks the
+            # version, so workers starting together do not apply it twice.
+            cur.execute("BEGIN IMMEDIATE")
+            if _current(cur) >= version_no:
+                conn.rollback()
+                continue
+            module.upgrade(cur)
+            cur.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version_no, name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            )
+            conn.commit()
+            print(f"Applied migration {name}")
+        version = _current(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    if backfills:
+        run_backfills(version)
+    return version
+
+
+def run_backfills(version=None):
+    """Run the data backfills of every applied migration.
+
+    They run outside the schema transactions, in their own short batches;
+    an interrupted one picks up again on the next run.
+    """
+    version = current_version() if version is None else version
+    for version_no, name, module in discover():
+        if version_no <= version and hasattr(module, 'backfill'):
+            filled = module.backfill()
+            if filled:
+                print(f"Backfilled {filled} rows for {name}")
+
+
+def _backfill_lock():
+    """An exclusive lock file next to the database, or None if another process holds it."""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): the single-process dev server is the only runner
+        return open(f"{config.DATABASE}.backfill.lock", 'w')
+    handle = open(f"{config.DATABASE}.backfill.lock", 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def start_backfills(spawn):
+    """Run the backfills in the background via spawn(fn), in one worker per host.
+
+    Workers that find another one already running them skip it; the lock
+    is released when the run ends.
+    """
+    lock = _backfill_lock()
+    if lock is None:
+        return False
+
+    def run():
+        try:
+            run_backfills()
+        except Exception:
+            logger.exception("Backfill failed; it resumes on the next start")
+        finally:
+            lock.close()
+
+    spawn(run)
+    return True
+
+
+def downgrade(target):
+    """Revert applied migrations newer than target. Returns the new version."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for version_no, name, module in reversed(discover()):
+            if version_no <= target:
+                break
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("SELECT 1 FROM schema_version WHERE version = ?", (version_no,))
+            if not cur.fetchone():
+                conn.rollback()
+                continue
+            module.downgrade(cur)
+            cur.execute("DELETE FROM schema_version WHERE version = ?", (version_no,))
+            conn.commit()
+            print(f"Reverted migration {name}")
+        version = _current(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    return version
+
+
+def status():
+    current = current_version()
+    for version_no, name, _ in discover():
+        mark = 'x' if version_no <= current else ' '
+        print(f"[{mark}] {name}")
+    print(f"Current schema version: {current}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'status'
+    if command == 'status':
+        status()
+    elif command == 'upgrade':
+        target = int(argv[1]) if len(argv) > 1 else None
+        print(f"Schema version: {upgrade(target)}")
+    elif command == 'backfill':
+        run_backfills()
+    elif command == 'downgrade' and len(argv) > 1:
+        print(f"Schema version: {downgrade(int(argv[1]))}")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
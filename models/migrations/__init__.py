@@ -0,0 +1,7 @@
+"""Versioned schema migrations.
+
+Each module is named vNNNN_<description>.py and defines upgrade(cur) and
+downgrade(cur), and optionally backfill() for data that is filled in short
+batches after the schema step has committed. Migrations are applied in
+version order by models.migrate.
+"""
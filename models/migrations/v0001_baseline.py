@@ -0,0 +1,59 @@
+"""Baseline schema, matching what the old init_*_db functions created."""
+
+
+def _columns(cur, table):
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            is_admin INTEGER DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS parking_lots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            price REAL DEFAULT 20
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot_id INTEGER,
+            location TEXT,
+            time TEXT,
+            FOREIGN KEY (lot_id) REFERENCES parking_lots(id)
+        )
+    ''')
+    # Older databases were patched by hand; fresh ones never had the column
+    if 'status' not in _columns(cur, 'slots'):
+        cur.execute("ALTER TABLE slots ADD COLUMN status TEXT DEFAULT 'A'")
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            slot_id INTEGER NOT NULL,
+            vehicle_number TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT,
+            cost REAL
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_admin INTEGER DEFAULT 0
+        )
+    ''')
+
+
+def downgrade(cur):
+    raise RuntimeError("The baseline migration cannot be reverted")
@@ -0,0 +1,22 @@
+"""Secondary indexes for the queries run on every dashboard and booking."""
+
+INDEXES = {
+    'idx_bookings_user_end': 'bookings(user_email, end_time)',
+    'idx_bookings_slot_end': 'bookings(slot_id, end_time)',
+    'idx_bookings_start': 'bookings(start_time)',
+    'idx_bookings_end': 'bookings(end_time)',
+    'idx_slots_lot_status': 'slots(lot_id, status)',
+    'idx_slots_status': 'slots(status)',
+    'idx_chat_messages_timestamp': 'chat_messages(timestamp)',
+    'idx_users_is_admin': 'users(is_admin)',
+}
+
+
+def upgrade(cur):
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def downgrade(cur):
+    for name in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,139 @@
+"""Materialized counters for the dashboard and home page statistics.
+
+Triggers keep the counters in step with every write to slots, bookings,
+users and parking_lots, inside the same transaction as that write.
+"""
+
+COUNTERS = (
+    'total_lots',
+    'total_slots',
+    'available_slots',
+    'occupied_slots',
+    'total_users',
+    'total_bookings',
+    'active_bookings',
+)
+
+
+def _bump(name, delta):
+    return f"UPDATE stats_counters SET value = value + ({delta}) WHERE name = '{name}';"
+
+
+def _slot_delta(row, sign):
+    """SQL adjusting lot and global counters for a slot row (NEW/OLD)."""
+    available = f"{sign} * IFNULL({row}.status = 'A', 0)"
+    occupied = f"{sign} * IFNULL({row}.status = 'O', 0)"
+    return f'''
+        INSERT OR IGNORE INTO lot_counters (lot_id) SELECT {row}.lot_id WHERE {row}.lot_id IS NOT NULL;
+        UPDATE lot_counters
+        SET available = available + {available}, occupied = occupied + {occupied}
+        WHERE lot_id = {row}.lot_id;
+        {_bump('available_slots', available)}
+        {_bump('occupied_slots', occupied)}
+    '''
+
+
+TRIGGERS = {
+    'trg_lots_insert': f'''
+        AFTER INSERT ON parking_lots BEGIN
+            INSERT OR IGNORE INTO lot_counters (lot_id) VALUES (NEW.id);
+            {_bump('total_lots', 1)}
+        END''',
+    'trg_lots_delete': f'''
+        AFTER DELETE ON parking_lots BEGIN
+            DELETE FROM lot_counters WHERE lot_id = OLD.id;
+            {_bump('total_lots', -1)}
+        END''',
+    'trg_slots_insert': f'''
+        AFTER INSERT ON slots BEGIN
+            {_slot_delta('NEW', 1)}
+            {_bump('total_slots', 1)}
+        END''',
+    'trg_slots_delete': f'''
+        AFTER DELETE ON slots BEGIN
+            {_slot_delta('OLD', -1)}
+            {_bump('total_slots', -1)}
+        END''',
+    'trg_slots_update': f'''
+        AFTER UPDATE OF status, lot_id ON slots BEGIN
+            {_slot_delta('OLD', -1)}
+            {_slot_delta('NEW', 1)}
+        END''',
+    'trg_users_insert': f'''
+        AFTER INSERT ON users WHEN NEW.is_admin = 0 BEGIN
+            {_bump('total_users', 1)}
+        END''',
+    'trg_users_delete': f'''
+        AFTER DELETE ON users WHEN OLD.is_admin = 0 BEGIN
+            {_bump('total_users', -1)}
+        END''',
+    'trg_users_update': f'''
+        AFTER UPDATE OF is_admin ON users BEGIN
+            {_bump('total_users', 'IFNULL(NEW.is_admin = 0, 0) - IFNULL(OLD.is_admin = 0, 0)')}
+        END''',
+    'trg_bookings_insert': f'''
+        AFTER INSERT ON bookings BEGIN
+            {_bump('total_bookings', 1)}
+            {_bump('active_bookings', 'NEW.end_time IS NULL')}
+        END''',
+    'trg_bookings_delete': f'''
+        AFTER DELETE ON bookings BEGIN
+            {_bump('total_bookings', -1)}
+            {_bump('active_bookings', '-(OLD.end_time IS NULL)')}
+        END''',
+    'trg_bookings_update': f'''
+        AFTER UPDATE OF end_time ON bookings BEGIN
+            {_bump('active_bookings', '(NEW.end_time IS NULL) - (OLD.end_time IS NULL)')}
+        END''',
+}
+
+
+def upgrade(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS lot_counters (
+            lot_id INTEGER PRIMARY KEY,
+            available INTEGER NOT NULL DEFAULT 0,
+            occupied INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for name, body in TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    # Backfill from the current contents of the tables
+    cur.execute("DELETE FROM stats_counters")
+    cur.executemany(
+        "INSERT INTO stats_counters (name, value) VALUES (?, 0)",
+        [(name,) for name in COUNTERS],
+    )
+    cur.execute('''
+        UPDATE stats_counters SET value = CASE name
+            WHEN 'total_lots' THEN (SELECT COUNT(*) FROM parking_lots)
+            WHEN 'total_slots' THEN (SELECT COUNT(*) FROM slots)
+            WHEN 'available_slots' THEN (SELECT COUNT(*) FROM slots WHERE status = 'A')
+            WHEN 'occupied_slots' THEN (SELECT COUNT(*) FROM slots WHERE status = 'O')
+            WHEN 'total_users' THEN (SELECT COUNT(*) FROM users WHERE is_admin = 0)
+            WHEN 'total_bookings' THEN (SELECT COUNT(*) FROM bookings)
+            WHEN 'active_bookings' THEN (SELECT COUNT(*) FROM bookings WHERE end_time IS NULL)
+        END
+    ''')
+    cur.execute("DELETE FROM lot_counters")
+    cur.execute('''
+        INSERT INTO lot_counters (lot_id, available, occupied)
+        SELECT lot_id, SUM(status = 'A'), SUM(status = 'O')
+        FROM slots WHERE lot_id IS NOT NULL
+        GROUP BY lot_id
+    ''')
+    cur.execute("INSERT OR IGNORE INTO lot_counters (lot_id) SELECT id FROM parking_lots")
+
+
+def downgrade(cur):
+    for name in TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cur.execute("DROP TABLE IF EXISTS lot_counters")
+    cur.execute("DROP TABLE IF EXISTS stats_counters")
@@ -0,0 +1,15 @@
+"""Indexes backing the server-side filters on /admin/all_bookings."""
+
+INDEXES = {
+    'idx_bookings_vehicle': 'bookings(vehicle_number)',
+}
+
+
+def upgrade(cur):
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def downgrade(cur):
+    for name in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,63 @@
+"""Tariff snapshots on bookings, so release prices in a single statement.
+
+parking_lots.tariff holds an optional pricing rule (see models/billing.py);
+every booking records its lot and the lot's effective rule when it starts.
+Releasing a booking (setting end_time) frees its slot from a trigger.
+"""
+
+# Hourly at the lot's price, overridden by whatever the lot's rule sets
+EFFECTIVE_TARIFF = "json_patch(json_object('unit', 'hour', 'rate', p.price), COALESCE(p.tariff, '{}'))"
+
+TRIGGERS = {
+    # Inserts that do not snapshot the tariff themselves (imports, scripts)
+    'trg_bookings_tariff': f'''
+        AFTER INSERT ON bookings WHEN NEW.tariff IS NULL BEGIN
+            UPDATE bookings SET
+                lot_id = (SELECT lot_id FROM slots WHERE id = NEW.slot_id),
+                tariff = (
+                    SELECT {EFFECTIVE_TARIFF} FROM slots s JOIN parking_lots p ON p.id = s.lot_id
+                    WHERE s.id = NEW.slot_id
+                )
+            WHERE id = NEW.id;
+        END''',
+    'trg_bookings_release': '''
+        AFTER UPDATE OF end_time ON bookings
+        WHEN OLD.end_time IS NULL AND NEW.end_time IS NOT NULL BEGIN
+            UPDATE slots SET status = 'A' WHERE id = NEW.slot_id;
+        END''',
+}
+
+
+def _columns(cur, table):
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade(cur):
+    if 'tariff' not in _columns(cur, 'parking_lots'):
+        cur.execute("ALTER TABLE parking_lots ADD COLUMN tariff TEXT")
+    columns = _columns(cur, 'bookings')
+    if 'lot_id' not in columns:
+        cur.execute("ALTER TABLE bookings ADD COLUMN lot_id INTEGER")
+    if 'tariff' not in columns:
+        cur.execute("ALTER TABLE bookings ADD COLUMN tariff TEXT")
+
+    # Existing bookings are priced by their lot's current price
+    cur.execute(f'''
+        UPDATE bookings SET
+            lot_id = (SELECT lot_id FROM slots WHERE id = bookings.slot_id),
+            tariff = (
+                SELECT {EFFECTIVE_TARIFF} FROM slots s JOIN parking_lots p ON p.id = s.lot_id
+                WHERE s.id = bookings.slot_id
+            )
+        WHERE tariff IS NULL
+    ''')
+    for name, body in TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def downgrade(cur):
+    for name in TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cur.execute("ALTER TABLE bookings DROP COLUMN tariff")
+    cur.execute("ALTER TABLE bookings DROP COLUMN lot_id")
+    cur.execute("ALTER TABLE parking_lots DROP COLUMN tariff")
@@ -0,0 +1,70 @@
+"""Integer epoch columns for booking range queries.
+
+start_ts/end_ts hold Unix seconds and back every time-range predicate
+(today's revenue, overdue bookings, date filters). The text columns stay
+as the display format the templates, counter triggers and older scripts
+use; writers that only set the text columns get the integers from triggers.
+"""
+
+# The text columns hold naive local time
+EPOCH = "CAST(strftime('%s', {}, 'utc') AS INTEGER)"
+
+INDEXES = {
+    # Covers today's revenue (SUM(cost) over a start_ts range) without table lookups
+    'idx_bookings_start_ts': 'bookings(start_ts, cost)',
+    # Only open bookings, ordered by start: the overdue check reads a prefix
+    'idx_bookings_open_start_ts': 'bookings(start_ts) WHERE end_ts IS NULL',
+}
+
+TRIGGERS = {
+    'trg_bookings_epoch_insert': f'''
+        AFTER INSERT ON bookings WHEN NEW.start_ts IS NULL AND NEW.start_time IS NOT NULL BEGIN
+            UPDATE bookings SET
+                start_ts = {EPOCH.format('NEW.start_time')},
+                end_ts = {EPOCH.format('NEW.end_time')}
+            WHERE id = NEW.id;
+        END''',
+    'trg_bookings_epoch_start': f'''
+        AFTER UPDATE OF start_time ON bookings
+        WHEN NEW.start_time IS NOT OLD.start_time AND NEW.start_ts IS OLD.start_ts BEGIN
+            UPDATE bookings SET start_ts = {EPOCH.format('NEW.start_time')} WHERE id = NEW.id;
+        END''',
+    'trg_bookings_epoch_end': f'''
+        AFTER UPDATE OF end_time ON bookings
+        WHEN NEW.end_time IS NOT OLD.end_time AND NEW.end_ts IS OLD.end_ts BEGIN
+            UPDATE bookings SET end_ts = {EPOCH.format('NEW.end_time')} WHERE id = NEW.id;
+        END''',
+}
+
+
+def _columns(cur, table):
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade(cur):
+    columns = _columns(cur, 'bookings')
+    for column in ('start_ts', 'end_ts'):
+        if column not in columns:
+            cur.execute(f"ALTER TABLE bookings ADD COLUMN {column} INTEGER")
+    cur.execute(f'''
+        UPDATE bookings SET
+            start_ts = {EPOCH.format('start_time')},
+            end_ts = {EPOCH.format('end_time')}
+        WHERE start_ts IS NULL
+    ''')
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # Superseded by idx_bookings_start_ts; nothing filters on the text column now
+    cur.execute("DROP INDEX IF EXISTS idx_bookings_start")
+    for name, body in TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def downgrade(cur):
+    for name in TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_start ON bookings(start_time)")
+    cur.execute("ALTER TABLE bookings DROP COLUMN end_ts")
+    cur.execute("ALTER TABLE bookings DROP COLUMN start_ts")
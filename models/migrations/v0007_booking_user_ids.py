@@ -0,0 +1,83 @@
+"""Integer user ids on bookings.
+
+bookings.user_id references users.id and replaces user_email in every join
+and per-user lookup. user_email stays as the display name the templates,
+events and older scripts use. The schema step only adds the column, so it
+is quick on a large table; existing rows are filled by backfill() in short
+batches once the migration has committed. Writers that only set
+user_email get the id from a trigger.
+"""
+import time
+
+from models.db import write_transaction
+
+BATCH_SIZE = 5000
+
+INDEXES = {
+    # Per-user listings and active-booking counts
+    'idx_bookings_user_id': 'bookings(user_id, end_time)',
+    # Rows still waiting for backfill(); empty once it has run
+    'idx_bookings_user_id_missing': 'bookings(id) WHERE user_id IS NULL',
+}
+
+TRIGGERS = {
+    'trg_bookings_user_id': '''
+        AFTER INSERT ON bookings WHEN NEW.user_id IS NULL BEGIN
+            UPDATE bookings SET user_id = (SELECT id FROM users WHERE username = NEW.user_email)
+            WHERE id = NEW.id;
+        END''',
+}
+
+
+def _columns(cur, table):
+    return [row[1] for row in cur.execute(f"PRAGMA table_info({table})")]
+
+
+def upgrade(cur):
+    if 'user_id' not in _columns(cur, 'bookings'):
+        cur.execute("ALTER TABLE bookings ADD COLUMN user_id INTEGER REFERENCES users(id)")
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # Superseded by idx_bookings_user_id; nothing filters on user_email now
+    cur.execute("DROP INDEX IF EXISTS idx_bookings_user_end")
+    for name, body in TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """Fill user_id on older rows, one short write transaction per batch.
+
+    Sleeps as long as each batch took before the next, so other writers
+    get the lock at least half the time. Resumes where an interrupted run
+    stopped. Rows whose user_email matches no user keep a NULL user_id.
+    Returns the number of rows filled.
+    """
+    after, filled = 0, 0
+    while True:
+        started = time.perf_counter()
+
+        def fill(cur, after=after):
+            cur.execute('''
+                UPDATE bookings SET user_id = (SELECT id FROM users WHERE username = bookings.user_email)
+                WHERE id IN (
+                    SELECT id FROM bookings WHERE user_id IS NULL AND id > ? ORDER BY id LIMIT ?
+                )
+                RETURNING id, user_id
+            ''', (after, batch_size))
+            return cur.fetchall()
+
+        rows = write_transaction(fill)
+        if not rows:
+            return filled
+        after = max(row[0] for row in rows)
+        filled += sum(1 for row in rows if row[1] is not None)
+        time.sleep(time.perf_counter() - started)
+
+
+def downgrade(cur):
+    for name in TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user_end ON bookings(user_email, end_time)")
+    cur.execute("ALTER TABLE bookings DROP COLUMN user_id")
@@ -0,0 +1,119 @@
+"""Hourly and daily per-lot booking rollups for the analytics views.
+
+Each row covers one lot for one bucket (epoch seconds at the start of the
+hour, or of the local day): bookings started and ended, revenue and total
+dwell of the bookings that ended, the most slots held at once and the
+number held after the bucket's last event. Triggers keep the current
+buckets in step with every booking insert, release and re-price; existing
+history is rebuilt lot by lot by backfill() once the migration has
+committed (see models/analytics.py).
+"""
+
+# The text columns hold naive local time
+EPOCH = "CAST(strftime('%s', {}, 'utc') AS INTEGER)"
+
+BUCKETS = {
+    'lot_rollups_hourly': '({0}) - ({0}) % 3600',
+    'lot_rollups_daily': "CAST(strftime('%s', date({0}, 'unixepoch', 'localtime'), 'utc') AS INTEGER)",
+}
+
+LOT = "COALESCE(NEW.lot_id, (SELECT lot_id FROM slots WHERE id = NEW.slot_id))"
+START = f"COALESCE(NEW.start_ts, {EPOCH.format('NEW.start_time')})"
+END = f"COALESCE(NEW.end_ts, {EPOCH.format('NEW.end_time')})"
+# Bookings other than this one still holding a slot in its lot
+HELD = f"(SELECT COUNT(*) FROM bookings WHERE lot_id = {LOT} AND end_ts IS NULL AND id != NEW.id)"
+
+
+def _add(ts, started=0, ended=0, revenue=0, dwell=0, held=None, peak=None):
+    """Upserts adding to both rollups; held/peak set the occupancy columns."""
+    statements = []
+    for table, bucket in BUCKETS.items():
+        statements.append(f'''
+            INSERT INTO {table} (lot_id, bucket, started, ended, revenue, dwell_seconds, peak_occupied, occupied)
+            VALUES ({LOT}, {bucket.format(ts)}, {started}, {ended}, {revenue}, {dwell},
+                    {0 if peak is None else peak}, {0 if held is None else held})
+            ON CONFLICT (lot_id, bucket) DO UPDATE SET
+                started = started + excluded.started,
+                ended = ended + excluded.ended,
+                revenue = revenue + excluded.revenue,
+                dwell_seconds = dwell_seconds + excluded.dwell_seconds,
+                peak_occupied = MAX(peak_occupied, excluded.peak_occupied),
+                occupied = {'occupied' if held is None else 'excluded.occupied'};''')
+    return ''.join(statements)
+
+
+TRIGGERS = {
+    'trg_rollups_booking_start': f'''
+        AFTER INSERT ON bookings WHEN NEW.end_time IS NULL AND {LOT} IS NOT NULL BEGIN
+            {_add(START, started=1, held=f'{HELD} + 1', peak=f'{HELD} + 1')}
+        END''',
+    # Closed bookings written in one go (imports, generated data); occupancy
+    # is left to a rebuild
+    'trg_rollups_booking_import': f'''
+        AFTER INSERT ON bookings WHEN NEW.end_time IS NOT NULL AND {LOT} IS NOT NULL BEGIN
+            {_add(START, started=1)}
+            {_add(END, ended=1, revenue='COALESCE(NEW.cost, 0)', dwell=f'{END} - {START}')}
+        END''',
+    'trg_rollups_booking_end': f'''
+        AFTER UPDATE OF end_time ON bookings
+        WHEN OLD.end_time IS NULL AND NEW.end_time IS NOT NULL AND {LOT} IS NOT NULL BEGIN
+            {_add(END, ended=1, revenue='COALESCE(NEW.cost, 0)', dwell=f'{END} - {START}',
+                  held=HELD, peak=f'{HELD} + 1')}
+        END''',
+    # Bulk re-pricing of closed bookings (models/billing.py)
+    'trg_rollups_booking_cost': f'''
+        AFTER UPDATE OF cost ON bookings
+        WHEN OLD.end_time IS NOT NULL AND NEW.end_time IS NOT NULL AND NEW.cost IS NOT OLD.cost
+             AND {LOT} IS NOT NULL BEGIN
+            {_add(END, revenue='COALESCE(NEW.cost, 0) - COALESCE(OLD.cost, 0)')}
+        END''',
+}
+
+INDEXES = {
+    # Rebuilding one lot reads only that lot's bookings
+    'idx_bookings_lot_start': 'bookings(lot_id, start_ts)',
+    # Slots held per lot, counted by the triggers on every booking write
+    'idx_bookings_open_lot': 'bookings(lot_id) WHERE end_ts IS NULL',
+}
+
+
+def upgrade(cur):
+    for table in BUCKETS:
+        cur.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                lot_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                started INTEGER NOT NULL DEFAULT 0,
+                ended INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                dwell_seconds INTEGER NOT NULL DEFAULT 0,
+                peak_occupied INTEGER NOT NULL DEFAULT 0,
+                occupied INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (lot_id, bucket)
+            ) WITHOUT ROWID
+        ''')
+    # Lots whose history backfill() has yet to rebuild
+    cur.execute("CREATE TABLE IF NOT EXISTS rollup_backfill (lot_id INTEGER PRIMARY KEY)")
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    for name, body in TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    cur.execute('''
+        INSERT OR IGNORE INTO rollup_backfill (lot_id)
+        SELECT DISTINCT lot_id FROM bookings WHERE lot_id IS NOT NULL
+    ''')
+
+
+def backfill():
+    from models.analytics import rebuild_pending
+    return rebuild_pending()
+
+
+def downgrade(cur):
+    for name in TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name in INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+    cur.execute("DROP TABLE IF EXISTS rollup_backfill")
+    for table in BUCKETS:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
@@ -0,0 +1,150 @@
+import os
+import socket
+import threading
+import time
+
+import config
+
+
+class PresenceRegistry:
+    """Who is connected to chat right now, from live Socket.IO sessions.
+
+    Each socket (browser tab) is one session; a user stays online while any
+    of their sessions is alive. Sessions that stop sending heartbeats for
+    `timeout` seconds are dropped by expire(), covering disconnects that
+    never reached the handler. snapshot() returns a list that is only
+    rebuilt when someone comes online or goes offline.
+
+    With several workers each registry also mirrors the others: their
+    presence changes and periodic full lists (sync()) arrive through the
+    Socket.IO message queue, and a worker not heard from for `timeout`
+    seconds is forgotten by expire().
+    """
+
+    def __init__(self, timeout=90):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sessions = {}   # sid -> [username, last_seen]
+        self._users = {}      # username -> [session count, is_admin]
+        self._remote = {}     # worker -> [{username: is_admin}, last_heard]
+        self._snapshot = []
+
+    @property
+    def worker(self):
+        # Recomputed so forked workers do not share the parent's id
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _rebuild(self):
+        online = {username: [is_admin, []] for username, (_, is_admin) in self._users.items()}
+        for username in online:
+            online[username][1].append(self.worker)
+        for worker, (users, _) in self._remote.items():
+            for username, is_admin in users.items():
+                online.setdefault(username, [is_admin, []])[1].append(worker)
+        self._snapshot = sorted((username, is_admin, sorted(workers))
+                                for username, (is_admin, workers) in online.items())
+
+    def connect(self, sid, username, is_admin=0):
+        """Register a session; returns True if the user just came online."""
+        with self._lock:
+            if sid in self._sessions:
+                self._sessions[sid][1] = time.monotonic()
+                return False
+            self._sessions[sid] = [username, time.monotonic()]
+            entry = self._users.get(username)
+            if entry is not None:
+                entry[0] += 1
+                return False
+            self._users[username] = [1, is_admin]
+            self._rebuild()
+            return True
+
+    def _drop(self, sid):
+        session = self._sessions.pop(sid, None)
+        if session is None:
+            return None
+        username = session[0]
+        entry = self._users[username]
+        entry[0] -= 1
+        if entry[0]:
+            return None
+        del self._users[username]
+        return username
+
+    def disconnect(self, sid):
+        """Forget a session; returns the username if they just went offline."""
+        with self._lock:
+            username = self._drop(sid)
+            if username is not None:
+                self._rebuild()
+            return username
+
+    def heartbeat(self, sid):
+        """Mark a session alive; returns False if it is unknown, e.g. dropped by expire()."""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                return False
+            session[1] = time.monotonic()
+            return True
+
+    def expire(self):
+        """Drop stale sessions and silent workers.
+
+        Returns (usernames that went offline here, [(worker, username)] of
+        the silent workers' users).
+        """
+        cutoff = time.monotonic() - self.timeout
+        with self._lock:
+            stale = [sid for sid, (_, last_seen) in self._sessions.items() if last_seen < cutoff]
+            offline = [username for username in map(self._drop, stale) if username is not None]
+            silent = [worker for worker, (_, last_heard) in self._remote.items() if last_heard < cutoff]
+            dropped = [(worker, username) for worker in silent for username in self._remote.pop(worker)[0]]
+            if offline or silent:
+                self._rebuild()
+            return offline, dropped
+
+    def remote_change(self, worker, username, online, is_admin=0):
+        """Apply another worker's presence event."""
+        if worker == self.worker:
+            return
+        with self._lock:
+            users = self._remote.setdefault(worker, [{}, 0])
+            users[1] = time.monotonic()
+            if online:
+                users[0][username] = is_admin
+            else:
+                users[0].pop(username, None)
+            self._rebuild()
+
+    def sync(self, worker, users):
+        """Replace another worker's online list with [(username, is_admin)].
+
+        Returns True if that worker was not known yet.
+        """
+        if worker == self.worker:
+            return False
+        with self._lock:
+            new = worker not in self._remote
+            self._remote[worker] = [dict(users), time.monotonic()]
+            self._rebuild()
+            return new
+
+    def local_users(self):
+        """[(username, is_admin)] with a session on this worker."""
+        with self._lock:
+            return [(username, is_admin) for username, (_, is_admin) in self._users.items()]
+
+    def snapshot(self):
+        """Sorted [(username, is_admin, [workers])] of users online on any worker."""
+        return self._snapshot
+
+    def is_online(self, username):
+        with self._lock:
+            return username in self._users or any(username in users for users, _ in self._remote.values())
+
+    def session_count(self):
+        return len(self._sessions)
+
+
+presence = PresenceRegistry(config.PRESENCE_TIMEOUT)
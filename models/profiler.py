@@ -0,0 +1,254 @@
+"""Per-request SQL profiling and slow query log.
+
+Every pooled connection hands out ProfilingCursor objects. While a request
+profile is active (app.py opens one per HTTP request) each statement's
+wall time, including the time spent fetching its rows, and its row count
+are recorded. When the request ends the totals are folded into per-route
+aggregates, and statements slower than config.SLOW_QUERY_MS are logged
+together with their EXPLAIN QUERY PLAN. Bound parameters are never logged.
+"""
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import config
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENTS_PER_REQUEST = 1000
+TOP_STATEMENTS = 5
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+_current = contextvars.ContextVar('sql_profile', default=None)
+_lock = threading.Lock()
+_routes = {}
+_slow = deque(maxlen=100)
+_plans = {}
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+        # [sql, params, seconds, rows, database]
+        self.statements = []
+
+    def record(self, sql, params, database):
+        self.queries += 1
+        entry = [sql, params, 0.0, 0, database]
+        if len(self.statements) < MAX_STATEMENTS_PER_REQUEST:
+            self.statements.append(entry)
+        return entry
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to the active request."""
+
+    _entry = None
+    _profile = None
+
+    def _run(self, method, sql, params, keep_params):
+        profile = _current.get()
+        if profile is None:
+            self._profile = None
+            return method(sql, params)
+        pool = getattr(self.connection, '_pool', None)
+        self._profile = profile
+        self._entry = profile.record(sql, params if keep_params else None, pool and pool.database)
+        started = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self._charge(time.perf_counter() - started, 0)
+
+    def _charge(self, seconds, rows):
+        self._entry[2] += seconds
+        self._entry[3] += rows
+        self._profile.db_time += seconds
+        self._profile.rows += rows
+
+    def execute(self, sql, params=()):
+        return self._run(super().execute, sql, params, True)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(super().executemany, sql, seq_of_params, False)
+
+    def fetchone(self):
+        if self._profile is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._charge(time.perf_counter() - started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        if self._profile is None:
+            return super().fetchmany(size or self.arraysize)
+        started = time.perf_counter()
+        rows = super().fetchmany(size or self.arraysize)
+        self._charge(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._profile is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._charge(time.perf_counter() - started, len(rows))
+        return rows
+
+    def __next__(self):
+        if self._profile is None:
+            return super().__next__()
+        started = time.perf_counter()
+        row = super().__next__()
+        self._charge(time.perf_counter() - started, 1)
+        return row
+
+
+def begin_profile():
+    """Start profiling the current request; returns a token for finish_profile()."""
+    if not config.SQL_PROFILING:
+        return None
+    return _current.set(RequestProfile())
+
+
+def current_profile():
+    return _current.get()
+
+
+def finish_profile(token, route):
+    profile = _current.get()
+    if token is None or profile is None:
+        return
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+    elapsed = time.perf_counter() - profile.started
+
+    # Same statement text run many times in one request is the N+1 signature
+    per_statement = {}
+    for sql, _, seconds, rows, _ in profile.statements:
+        calls = per_statement.setdefault(sql, [0, 0.0, 0])
+        calls[0] += 1
+        calls[1] += seconds
+        calls[2] += rows
+
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'rows': 0,
+                'db_time': 0.0, 'max_db_time': 0.0, 'request_time': 0.0,
+                'slow_queries': 0, 'max_repeats': 0, 'repeated_statement': None,
+                'statements': {},
+            }
+        stats['requests'] += 1
+        stats['queries'] += profile.queries
+        stats['max_queries'] = max(stats['max_queries'], profile.queries)
+        stats['rows'] += profile.rows
+        stats['db_time'] += profile.db_time
+        stats['max_db_time'] = max(stats['max_db_time'], profile.db_time)
+        stats['request_time'] += elapsed
+        for sql, (calls, seconds, rows) in per_statement.items():
+            totals = stats['statements'].setdefault(sql, [0, 0.0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += rows
+            if calls > stats['max_repeats']:
+                stats['max_repeats'] = calls
+                stats['repeated_statement'] = _compact(sql)
+
+    threshold = config.SLOW_QUERY_MS / 1000
+    for sql, params, seconds, rows, database in profile.statements:
+        if seconds >= threshold:
+            _log_slow(route, sql, params, seconds, rows, database)
+
+
+def _compact(sql):
+    return ' '.join(sql.split())
+
+
+def explain(database, sql, params):
+    if not database or not _compact(sql).upper().startswith(EXPLAINABLE):
+        return []
+    from models.db import run_connect_hooks  # models.db imports this module
+    conn = sqlite3.connect(database)
+    try:
+        # Same SQL functions as pooled connections (e.g. booking_cost)
+        run_connect_hooks(conn)
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params or ())]
+    except sqlite3.Error as e:
+        return [f"(plan unavailable: {e})"]
+    finally:
+        conn.close()
+
+
+def _log_slow(route, sql, params, seconds, rows, database):
+    # One EXPLAIN per distinct statement; plans only change with schema or ANALYZE
+    plan = _plans.get(sql)
+    if plan is None:
+        plan = _plans[sql] = explain(database, sql, params)
+    statement = _compact(sql)
+    logger.warning("Slow query on %s: %.1f ms, %d rows: %s\n    %s",
+                   route, seconds * 1000, rows, statement, '\n    '.join(plan))
+    with _lock:
+        if route in _routes:
+            _routes[route]['slow_queries'] += 1
+        _slow.append({
+            'route': route,
+            'sql': statement,
+            'ms': round(seconds * 1000, 3),
+            'rows': rows,
+            'plan': plan,
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+
+def profile_stats():
+    """Aggregated numbers per route, worst average DB time first."""
+    with _lock:
+        routes = {
+            route: dict(stats, statements={sql: list(totals) for sql, totals in stats['statements'].items()})
+            for route, stats in _routes.items()
+        }
+        slow = list(_slow)
+    report = {}
+    for route, stats in routes.items():
+        n = stats['requests']
+        top = sorted(stats['statements'].items(), key=lambda item: item[1][1], reverse=True)[:TOP_STATEMENTS]
+        report[route] = {
+            'requests': n,
+            'avg_queries': round(stats['queries'] / n, 2),
+            'max_queries': stats['max_queries'],
+            'avg_rows': round(stats['rows'] / n, 1),
+            'avg_db_ms': round(stats['db_time'] / n * 1000, 3),
+            'max_db_ms': round(stats['max_db_time'] * 1000, 3),
+            'avg_request_ms': round(stats['request_time'] / n * 1000, 3),
+            'db_share': round(stats['db_time'] / stats['request_time'], 3) if stats['request_time'] else 0.0,
+            'slow_queries': stats['slow_queries'],
+            'max_repeats': stats['max_repeats'],
+            'repeated_statement': stats['repeated_statement'],
+            'top_statements': [{
+                'sql': _compact(sql),
+                'calls': calls,
+                'total_ms': round(seconds * 1000, 3),
+                'avg_ms': round(seconds / calls * 1000, 3),
+                'rows': rows,
+            } for sql, (calls, seconds, rows) in top],
+        }
+    ordered = dict(sorted(report.items(), key=lambda item: item[1]['avg_db_ms'], reverse=True))
+    return {'threshold_ms': config.SLOW_QUERY_MS, 'routes': ordered, 'slow_queries': slow[::-1]}
+
+
+def reset_profiles():
+    with _lock:
+        _routes.clear()
+        _slow.clear()
+        _plans.clear()
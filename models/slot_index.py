@@ -0,0 +1,92 @@
+import heapq
+import threading
+
+from models.db import get_connection
+
+
+class FreeSlotIndex:
+    """Per-lot min-heaps of available slot ids.
+
+    The slots table stays the source of truth: callers claim a popped id with
+    a conditional UPDATE and simply skip ids another process already took.
+    Removed ids are dropped lazily when they reach the top of their heap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heaps = {}
+        self._free = {}
+        self._lot_of = {}
+
+    def rebuild(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT lot_id, id FROM slots WHERE status = 'A'")
+        rows = cur.fetchall()
+        conn.close()
+
+        free = {}
+        for lot_id, slot_id in rows:
+            free.setdefault(lot_id, set()).add(slot_id)
+        with self._lock:
+            self._free = free
+            self._heaps = {lot_id: sorted(ids) for lot_id, ids in free.items()}
+            self._lot_of = {slot_id: lot_id for lot_id, slot_id in rows}
+
+    def pop(self, lot_id):
+        """Remove and return the lowest free slot id in a lot, or None."""
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            free = self._free.get(lot_id)
+            while heap:
+                slot_id = heapq.heappop(heap)
+                if slot_id in free:
+                    free.discard(slot_id)
+                    self._lot_of.pop(slot_id, None)
+                    return slot_id
+            return None
+
+    def push(self, lot_id, slot_id):
+        with self._lock:
+            free = self._free.setdefault(lot_id, set())
+            if slot_id in free:
+                return
+            free.add(slot_id)
+            self._lot_of[slot_id] = lot_id
+            heapq.heappush(self._heaps.setdefault(lot_id, []), slot_id)
+
+    def push_many(self, lot_id, slot_ids):
+        with self._lock:
+            free = self._free.setdefault(lot_id, set())
+            heap = self._heaps.setdefault(lot_id, [])
+            for slot_id in slot_ids:
+                if slot_id not in free:
+                    free.add(slot_id)
+                    self._lot_of[slot_id] = lot_id
+                    heap.append(slot_id)
+            heapq.heapify(heap)
+
+    def discard(self, slot_id):
+        with self._lock:
+            lot_id = self._lot_of.pop(slot_id, None)
+            if lot_id is None:
+                return
+            free = self._free[lot_id]
+            free.discard(slot_id)
+            heap = self._heaps[lot_id]
+            # Compact once stale entries dominate the heap
+            if len(heap) > 2 * len(free) + 64:
+                self._heaps[lot_id] = sorted(free)
+
+    def discard_lot(self, lot_id):
+        with self._lock:
+            for slot_id in self._free.pop(lot_id, ()):
+                self._lot_of.pop(slot_id, None)
+            self._heaps.pop(lot_id, None)
+
+    def available(self, lot_id):
+        with self._lock:
+            return len(self._free.get(lot_id, ()))
+
+
+free_slots = FreeSlotIndex()
@@ -1,43 +1,24 @@
-import sqlite3
-
-def init_slot_db():
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-
-    # Create parking_lots table
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS parking_lots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            price REAL DEFAULT 20
-        )
-    ''')
-
-    # Create slots table linked to parking_lots
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS slots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            lot_id INTEGER,
-            location TEXT,
-            time TEXT,
-            FOREIGN KEY (lot_id) REFERENCES parking_lots(id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+import csv
+import io
+import json
+import time
+from models.db import get_connection, write_transaction
+from models.slot_index import free_slots
+from models.cache import invalidate_stats
+from models.events import publish
 
 # Add a new parking lot
 def add_parking_lot(name):
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('INSERT INTO parking_lots (name) VALUES (?)', (name,))
     conn.commit()
     conn.close()
+    invalidate_stats()
 
 # Get all parking lots
 def get_all_lots():
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('SELECT * FROM parking_lots')
     lots = cur.fetchall()
@@ -46,15 +27,18 @@ def get_all_lots():
 
 # Add a slot under a specific lot
 def add_slot(lot_id, location, time):
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('INSERT INTO slots (lot_id, location, time) VALUES (?, ?, ?)', (lot_id, location, time))
     conn.commit()
     conn.close()
+    free_slots.push(int(lot_id), cur.lastrowid)
+    invalidate_stats()
+    publish('slots_changed', lot_id=int(lot_id))
 
 # Get all slots with lot info
 def get_all_slots():
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
         SELECT slots.id, parking_lots.name, slots.location, slots.time
@@ -68,14 +52,17 @@ def get_all_slots():
 
 # Delete slot
 def delete_slot(slot_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('DELETE FROM slots WHERE id = ?', (slot_id,))
     conn.commit()
     conn.close()
+    free_slots.discard(slot_id)
+    invalidate_stats()
+    publish('slots_changed', slot_ids=[slot_id])
 
 def get_lot_slot_counts():
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
         SELECT parking_lots.id, parking_lots.name, parking_lots.price, COUNT(slots.id) as slot_count
@@ -88,7 +75,7 @@ def get_lot_slot_counts():
     return result
 
 def get_lot_slot_summary():
-    conn = sqlite3.connect('database.db')
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
         SELECT parking_lots.name, COUNT(slots.id) as slot_count, parking_lots.price
@@ -98,4 +85,136 @@ def get_lot_slot_summary():
     ''')
     data = cur.fetchall()
     conn.close()
-    return data
\ No newline at end of file
+    return data
+
+# ---------------- BULK PROVISIONING ----------------
+
+def _insert_spots(cur, lot_id, labels):
+    cur.executemany(
+        "INSERT INTO slots (lot_id, location, time, status) VALUES (?, ?, '', 'A')",
+        [(lot_id, label) for label in labels],
+    )
+
+def _free_slot_ids(cur, lot_id):
+    cur.execute("SELECT id FROM slots WHERE lot_id = ? AND status = 'A'", (lot_id,))
+    return [row[0] for row in cur.fetchall()]
+
+def _report(started, rows, **extra):
+    seconds = time.perf_counter() - started
+    report = {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(rows / seconds) if seconds > 0 else rows,
+    }
+    report.update(extra)
+    return report
+
+def _layout_changed(free_by_lot):
+    for lot_id, slot_ids in free_by_lot.items():
+        free_slots.push_many(lot_id, slot_ids)
+    invalidate_stats()
+    for lot_id in free_by_lot:
+        publish('slots_changed', lot_id=lot_id)
+
+def import_site_layout(lots):
+    """Create many lots and their spots in a single transaction.
+
+    lots is a list of {'name', 'price', 'labels'} dicts (see
+    parse_site_layout). Returns a report with rows written and rows/second.
+    """
+    started = time.perf_counter()
+
+    def provision(cur):
+        free_by_lot = {}
+        for lot in lots:
+            cur.execute("INSERT INTO parking_lots (name, price) VALUES (?, ?)", (lot['name'], lot['price']))
+            lot_id = cur.lastrowid
+            _insert_spots(cur, lot_id, lot['labels'])
+            free_by_lot[lot_id] = _free_slot_ids(cur, lot_id)
+        return free_by_lot
+
+    free_by_lot = write_transaction(provision)
+    _layout_changed(free_by_lot)
+    slots = sum(len(lot['labels']) for lot in lots)
+    return _report(started, len(lots) + slots, lots=len(lots), slots=slots,
+                   lot_ids=list(free_by_lot))
+
+def provision_lot(name, price, num_spots):
+    """Create one lot with num_spots spots labelled "Spot 1".."Spot N"."""
+    labels = [f"Spot {i + 1}" for i in range(num_spots)]
+    return import_site_layout([{'name': name, 'price': price, 'labels': labels}])
+
+def resize_lot(lot_id, new_spots):
+    """Grow or shrink a lot to new_spots spots in one transaction.
+
+    Shrinking only removes available spots, newest first, so the lot may
+    stay larger than requested if the rest are occupied.
+    """
+    started = time.perf_counter()
+
+    def resize(cur):
+        cur.execute("SELECT COUNT(*) FROM slots WHERE lot_id = ?", (lot_id,))
+        current = cur.fetchone()[0]
+        removed = []
+        if new_spots > current:
+            _insert_spots(cur, lot_id, [f"Spot {i}" for i in range(current + 1, new_spots + 1)])
+        elif new_spots < current:
+            cur.execute('''
+                DELETE FROM slots WHERE id IN (
+                    SELECT id FROM slots WHERE lot_id = ? AND status = 'A'
+                    ORDER BY id DESC LIMIT ?
+                )
+                RETURNING id
+            ''', (lot_id, current - new_spots))
+            removed = [row[0] for row in cur.fetchall()]
+        return max(new_spots - current, 0), removed, _free_slot_ids(cur, lot_id)
+
+    added, removed, free_ids = write_transaction(resize)
+    for slot_id in removed:
+        free_slots.discard(slot_id)
+    _layout_changed({lot_id: free_ids})
+    return _report(started, added + len(removed), added=added, removed=len(removed))
+
+def parse_site_layout(data, fmt):
+    """Parse a CSV or JSON site layout into import_site_layout() input.
+
+    CSV needs a header with lot_name and price plus either spot_label (one
+    row per spot) or num_spots (one row per lot). JSON is a list (or
+    {"lots": [...]}) of {"name", "price", "spots": N} or {..., "labels": [...]}.
+    """
+    lots = {}
+    if fmt == 'json':
+        doc = json.loads(data)
+        entries = doc.get('lots', []) if isinstance(doc, dict) else doc
+        if not isinstance(entries, list):
+            raise ValueError("JSON layout must be a list of lots")
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('name'), str):
+                raise ValueError("Every lot needs a name")
+            if entry['name'] in lots:
+                raise ValueError(f"Duplicate lot name: {entry['name']}")
+            labels = entry.get('labels')
+            if labels is None:
+                labels = [f"Spot {i + 1}" for i in range(int(entry['spots']))]
+            elif not isinstance(labels, list):
+                raise ValueError(f"labels of {entry['name']} must be a list")
+            lots[entry['name']] = {'name': entry['name'], 'price': float(entry['price']),
+                                   'labels': [str(label) for label in labels]}
+    elif fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(data))
+        fields = set(reader.fieldnames or ())
+        if not {'lot_name', 'price'} <= fields or not fields & {'spot_label', 'num_spots'}:
+            raise ValueError("CSV needs lot_name, price and spot_label or num_spots columns")
+        for row in reader:
+            lot = lots.setdefault(row['lot_name'], {'name': row['lot_name'],
+                                                    'price': float(row['price']), 'labels': []})
+            if row.get('spot_label'):
+                lot['labels'].append(row['spot_label'])
+            elif row.get('num_spots'):
+                start = len(lot['labels'])
+                lot['labels'].extend(f"Spot {start + i + 1}" for i in range(int(row['num_spots'])))
+    else:
+        raise ValueError(f"Unsupported layout format: {fmt}")
+    if not lots:
+        raise ValueError("Layout contains no lots")
+    return list(lots.values())
@@ -0,0 +1,135 @@
+"""Inter-process message queue for Socket.IO broadcasts.
+
+With several worker processes each one only knows its own clients, so an
+emit to a room must be relayed to every process. config.SOCKETIO_MESSAGE_QUEUE
+selects the backend:
+
+    ''                      single process, no queue
+    'sqlite:///path.db'     SQLitePubSubManager below; any number of
+                            processes on one host sharing that file
+    'redis://...', 'kafka://...', 'zmq+tcp://...', kombu URLs
+                            the python-socketio managers for those brokers
+
+All managers run on_remote_emit() hooks for emits that came from another
+process, so per-process state such as the chat history ring can follow.
+"""
+import sqlite3
+import time
+
+import socketio
+
+from models.db import ConnectionPool, run_blocking
+
+_remote_emit_hooks = []
+
+
+def on_remote_emit(fn):
+    """Register fn(event, data, room) for emits published by other processes."""
+    _remote_emit_hooks.append(fn)
+    return fn
+
+
+class RemoteEmitHooks:
+    def _handle_emit(self, message):
+        if message.get('host_id') != self.host_id and not message.get('binary'):
+            data = message['data']
+            for hook in _remote_emit_hooks:
+                try:
+                    hook(message['event'], data[0] if len(data) == 1 else data, message.get('room'))
+                except Exception:
+                    self._get_logger().exception('Remote emit hook failed')
+        return super()._handle_emit(message)
+
+
+class SQLitePubSubManager(RemoteEmitHooks, socketio.PubSubManager):
+    """Pub/sub over a SQLite table, for processes on a single host.
+
+    Publishers append JSON messages; every listener polls for rows above
+    the last id it has seen. Rows older than `retention` seconds are
+    trimmed by publishers.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio-queue.db', channel='socketio', write_only=False,
+                 logger=None, json=None, poll_interval=0.02, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('sqlite:///'):]
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._pool = ConnectionPool(self.path, size=4)
+        self._next_trim = 0.0
+        conn = self._pool.acquire()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS socketio_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _publish(self, data):
+        now = time.time()
+        conn = self._pool.acquire()
+        try:
+            conn.execute(
+                "INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)",
+                (self.channel, self.json.dumps(data), now),
+            )
+            if now >= self._next_trim:
+                self._next_trim = now + self.retention / 4
+                conn.execute("DELETE FROM socketio_messages WHERE created_at < ?", (now - self.retention,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _poll(self, conn, last_id):
+        return conn.execute(
+            "SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id",
+            (last_id, self.channel),
+        ).fetchall()
+
+    def _listen(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        try:
+            # Only messages published after this listener started
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_messages").fetchone()[0]
+            while True:
+                rows = run_blocking(self._poll, conn, last_id)
+                for message_id, payload in rows:
+                    last_id = message_id
+                    yield payload
+                if not rows:
+                    self._sleep(self.poll_interval)
+        finally:
+            conn.close()
+
+
+def _observed(manager_class):
+    return type(f"Observed{manager_class.__name__}", (RemoteEmitHooks, manager_class), {})
+
+
+def make_client_manager(url, channel='flask-socketio', write_only=False):
+    """Build the Socket.IO client manager for a queue URL, or None."""
+    if not url:
+        return None
+    if url.startswith('sqlite:'):
+        return SQLitePubSubManager(url, channel=channel, write_only=write_only)
+    # Same URL schemes Flask-SocketIO's message_queue option accepts
+    if url.startswith(('redis://', 'rediss://')):
+        manager_class = socketio.RedisManager
+    elif url.startswith('kafka://'):
+        manager_class = socketio.KafkaManager
+    elif url.startswith('zmq'):
+        manager_class = socketio.ZmqManager
+    else:
+        manager_class = socketio.KombuManager
+    return _observed(manager_class)(url, channel=channel, write_only=write_only)
@@ -0,0 +1,30 @@
+"""Booking time helpers.
+
+Bookings store Unix seconds in start_ts/end_ts for range queries and the
+same instant as naive local 'YYYY-MM-DD HH:MM:SS' text for display.
+"""
+import time
+from datetime import datetime, timedelta
+
+TEXT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def now():
+    """Return (epoch seconds, local text) for the current second."""
+    ts = int(time.time())
+    return ts, time.strftime(TEXT_FORMAT, time.localtime(ts))
+
+
+def _day(value):
+    day = datetime.strptime(value, '%Y-%m-%d') if value else datetime.now()
+    return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def day_start(value=None):
+    """Epoch of local midnight starting 'YYYY-MM-DD' (default today)."""
+    return int(_day(value).timestamp())
+
+
+def day_end(value=None):
+    """Epoch of local midnight ending 'YYYY-MM-DD' (default today)."""
+    return int((_day(value) + timedelta(days=1)).timestamp())
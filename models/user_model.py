@@ -1,25 +1,17 @@
-import sqlite3
-
-def init_db():
-    conn = sqlite3.connect('database.db')
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            is_admin INTEGER DEFAULT 0
-        )
-    ''')
-    conn.commit()
-    conn.close()
+from models.db import get_connection
+from models.cache import cached, invalidate, invalidate_stats
+from models.credentials import hash_password, check_password
 
 def add_user(username, password):
-    conn = sqlite3.connect('database.db')
+    password_hash = hash_password(password)
+    conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password))
+        cur.execute('INSERT INTO users (username, password) VALUES (?, ?)', (username, password_hash))
         conn.commit()
+        invalidate_stats()
+        # A lookup before registering may have cached "no such user"
+        invalidate(f'user_id:{username}')
         return True
     except:
         return False
@@ -27,9 +19,73 @@ def add_user(username, password):
         conn.close()
 
 def check_user(username, password):
-    conn = sqlite3.connect('database.db')
+    """Return the users row if the password matches, else None.
+
+    Legacy plaintext rows and hashes made with an older cost are rehashed
+    on the first successful login. Raises LoginBusy when hashing is saturated.
+    """
+    conn = get_connection()
     cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE username=? AND password=?', (username, password))
+    cur.execute('SELECT * FROM users WHERE username = ?', (username,))
     user = cur.fetchone()
     conn.close()
+    matches, needs_rehash = check_password(username, user[2] if user else None, password)
+    if not matches:
+        return None
+    if needs_rehash:
+        # Guarded on the old value so a concurrent password change wins
+        conn = get_connection()
+        conn.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                     (hash_password(password), user[0], user[2]))
+        conn.commit()
+        conn.close()
     return user
+
+def set_password(username, password):
+    password_hash = hash_password(password)
+    conn = get_connection()
+    conn.execute('UPDATE users SET password = ? WHERE username = ?', (password_hash, username))
+    conn.commit()
+    conn.close()
+    invalidate_principal(get_user_id(username))
+
+def get_user_id(username):
+    """Integer id for a username; both are fixed once a user exists."""
+    def compute():
+        conn = get_connection()
+        row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+    return cached(f'user_id:{username}', compute)
+
+def get_principal(user_id):
+    """Who a session belongs to, with its booking counts.
+
+    Cached per user id and dropped by invalidate_principal() when the user's
+    bookings or profile change, so page views skip the users/bookings
+    lookups. Returns None for an unknown id.
+    """
+    def compute():
+        conn = get_connection()
+        row = conn.execute('''
+            SELECT u.id, u.username, u.is_admin,
+                   (SELECT COUNT(*) FROM bookings WHERE user_id = u.id AND end_time IS NULL),
+                   (SELECT COUNT(*) FROM bookings WHERE user_id = u.id)
+            FROM users u WHERE u.id = ?
+        ''', (user_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'username': row[1],
+            'is_admin': row[2],
+            'active_bookings': row[3],
+            'total_bookings': row[4]
+        }
+    return cached(f'principal:{user_id}:', compute)
+
+def invalidate_principal(user_id):
+    if user_id is not None:
+        # Keys end in a colon so principal:1 does not also drop principal:12
+        invalidate(f'principal:{user_id}:')
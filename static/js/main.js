@@ -34,9 +34,13 @@ document.addEventListener('DOMContentLoaded', function() {
         searchInput.addEventListener('input', debounce(handleSearch, 300));
     }
 
-    // Refresh data every 30 seconds for real-time updates
+    // Live dashboard updates pushed by the server; poll only without Socket.IO
     if (window.location.pathname.includes('dashboard')) {
-        setInterval(refreshDashboardData, 30000);
+        if (typeof io !== 'undefined') {
+            initDashboardSocket();
+        } else {
+            setInterval(refreshDashboardData, 30000);
+        }
     }
 
     // Mobile-friendly table scrolling indicator
@@ -70,6 +74,49 @@ function handleSearch(event) {
     });
 }
 
+// Subscribe to dashboard delta events
+function initDashboardSocket() {
+    const socket = io({ auth: { channel: 'dashboard' } });
+
+    socket.on('dashboard:stats', stats => {
+        Object.entries(stats).forEach(([key, value]) => {
+            document.querySelectorAll(`[data-stat="${key}"]`).forEach(el => {
+                el.textContent = value;
+            });
+        });
+    });
+
+    socket.on('dashboard:slot', updateSlotRow);
+
+    socket.on('dashboard:booking', booking => {
+        const verb = booking.type === 'booking_started' ? 'started' : 'ended';
+        showToast(`Booking ${booking.booking_id} ${verb}`, 'info');
+    });
+
+    socket.on('dashboard:layout', () => {
+        showToast('Parking layout changed - reload to see new slots', 'warning');
+    });
+}
+
+function updateSlotRow(slot) {
+    const row = document.querySelector(`tr[data-slot-id="${slot.slot_id}"]`);
+    if (!row) return;
+    const occupied = slot.status === 'O';
+    const setField = (field, value) => {
+        const cell = row.querySelector(`[data-field="${field}"]`);
+        if (cell) cell.textContent = occupied ? (value || '-') : '-';
+    };
+    const status = row.querySelector('[data-field="status"]');
+    if (status) {
+        status.innerHTML = occupied
+            ? '<span class="status-occupied">Occupied</span>'
+            : '<span class="status-available">Available</span>';
+    }
+    setField('vehicle_number', slot.vehicle_number);
+    setField('username', slot.username);
+    setField('start_time', slot.start_time);
+}
+
 // Refresh dashboard data
 function refreshDashboardData() {
     if (document.hidden) return; // Don't refresh if tab is not active
@@ -0,0 +1,34 @@
+import os
+import time
+
+import pytest
+
+import config
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A migrated, empty database that the connection pool points at."""
+    from models.cache import invalidate
+    from models.db import close_pool
+    from models.migrate import upgrade
+    path = str(tmp_path / 'test.db')
+    monkeypatch.setenv('DATABASE_PATH', path)
+    monkeypatch.setattr(config, 'DATABASE', path)
+    close_pool()
+    invalidate('')
+    upgrade()
+    yield path
+    close_pool()
+    invalidate('')
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """Switch the local time zone; restored after the test."""
+    def switch(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield switch
+    monkeypatch.undo()
+    time.tzset()
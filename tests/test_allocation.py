@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('mode', [[], ['--processes']], ids=['threads', 'processes'])
+def test_no_double_allocation_under_load(mode):
+    # More attempts than slots, so workers keep racing for the last free ones
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.allocation_load',
+         '--lots', '2', '--slots', '30', '--bookings', '160', '--workers', '8'] + mode,
+        capture_output=True, text=True, cwd=ROOT, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'double_allocations=0 ' in result.stdout
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from models.analytics import get_analytics, rebuild_rollups
+from models.db import get_connection
+
+
+def _lot(price=20):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO parking_lots (name, price) VALUES ('Lot A', ?)", (price,))
+    lot_id = cur.lastrowid
+    cur.execute("INSERT INTO slots (lot_id, location, time, status) VALUES (?, 'Spot 1', '', 'A')", (lot_id,))
+    slot_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+    return lot_id, slot_id
+
+
+def _closed_booking(lot_id, slot_id, start, end, cost):
+    start, end = datetime.strptime(start, '%Y-%m-%d %H:%M'), datetime.strptime(end, '%Y-%m-%d %H:%M')
+    conn = get_connection()
+    conn.execute('''
+        INSERT INTO bookings (user_email, slot_id, lot_id, vehicle_number, start_time, end_time, cost,
+                              start_ts, end_ts)
+        VALUES ('user0', ?, ?, 'KA0001', ?, ?, ?, ?, ?)
+    ''', (slot_id, lot_id, str(start), str(end), cost, int(start.timestamp()), int(end.timestamp())))
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize('zone', ['UTC', 'Asia/Kolkata', 'Asia/Kathmandu', 'America/St_Johns'])
+def test_hourly_and_daily_agree(database, local_tz, zone):
+    local_tz(zone)
+    lot_id, slot_id = _lot()
+    _closed_booking(lot_id, slot_id, '2024-03-01 00:10', '2024-03-01 02:40', 40)
+    _closed_booking(lot_id, slot_id, '2024-03-01 10:15', '2024-03-01 12:40', 20)
+
+    def totals(granularity):
+        report = get_analytics(granularity, '2024-03-01', '2024-03-01', lot_id)
+        return report['totals']
+
+    expected = {'started': 2, 'ended': 2, 'revenue': 60.0}
+    for granularity in ('hour', 'day'):
+        assert {k: totals(granularity)[k] for k in expected} == expected, granularity
+
+    hourly = get_analytics('hour', '2024-03-01', '2024-03-01', lot_id)
+    # The 00:10 start is counted even where that hour began the day before
+    first = next(entry for entry in hourly['series'] if entry['started'])
+    started = int(datetime(2024, 3, 1, 0, 10).timestamp())
+    assert first['bucket'] % 3600 == 0 and first['bucket'] <= started < first['bucket'] + 3600
+
+    # A rebuild from a local midnight lands on the same buckets
+    rebuild_rollups(lot_id, '2024-03-01')
+    for granularity in ('hour', 'day'):
+        assert {k: totals(granularity)[k] for k in expected} == expected, granularity
+    assert get_analytics('hour', '2024-03-01', '2024-03-01', lot_id)['series'] == hourly['series']
+
+
+def test_hourly_range_limit(database):
+    get_analytics('hour', '2024-03-01', '2024-03-31')
+    with pytest.raises(ValueError):
+        get_analytics('hour', '2024-03-01', '2024-04-01')
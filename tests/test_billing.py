@@ -0,0 +1,123 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from models.billing import compile_tariff, parse_tariff
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def utc(monkeypatch):
+    # Periods and daily caps follow the local clock
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def at(hour, minute=0, day=1):
+    return int(datetime(2024, 3, day, hour, minute, tzinfo=timezone.utc).timestamp())
+
+
+def cost(rule, start, end):
+    return compile_tariff(json.dumps(rule, sort_keys=True))(start, end)
+
+
+def test_hourly_floor_is_the_default():
+    assert cost({'rate': 20}, at(9), at(10, 59)) == 20
+    assert cost({'rate': 20}, at(9), at(11)) == 40
+
+
+def test_ceil_charges_part_units():
+    assert cost({'rate': 20, 'rounding': 'ceil'}, at(9), at(10, 1)) == 40
+    assert cost({'unit': 'minute', 'rate': 0.5, 'rounding': 'ceil'}, at(9), at(9) + 61) == 1
+
+
+def test_min_units():
+    assert cost({'rate': 20}, at(9), at(9)) == 20
+    assert cost({'rate': 20, 'min_units': 0}, at(9), at(9, 30)) == 0
+    assert cost({'rate': 20, 'min_units': 3}, at(9), at(10)) == 60
+
+
+def test_each_unit_takes_the_rate_of_its_start():
+    rule = {'rate': 20, 'periods': [{'from': '22:00', 'to': '06:00', 'rate': 10}]}
+    assert cost(rule, at(21), at(23)) == 30
+    # Wraps past midnight into the next morning
+    assert cost(rule, at(23), at(7, day=2)) == 7 * 10 + 20
+    assert cost(rule, at(21, 30), at(22, 30)) == 20
+
+
+def test_later_periods_win_overlaps():
+    rule = {'rate': 20, 'periods': [{'from': '08:00', 'to': '12:00', 'rate': 30},
+                                    {'from': '10:00', 'to': '11:00', 'rate': 5}]}
+    assert cost(rule, at(8), at(12)) == 30 + 30 + 5 + 30
+
+
+def test_daily_cap_applies_per_24h_from_start():
+    rule = {'rate': 10, 'daily_cap': 150}
+    assert cost(rule, at(9), at(19)) == 100
+    assert cost(rule, at(9), at(9, day=3)) == 300
+    assert cost(rule, at(9), at(11, day=2)) == 150 + 20
+
+
+def test_parse_normalizes():
+    assert parse_tariff('{"unit": "day", "rate": "12.5", "min_units": "2"}') == \
+        {'unit': 'day', 'rate': 12.5, 'min_units': 2}
+    assert parse_tariff({'periods': []}) == {}
+    assert parse_tariff({'periods': [{'from': '22:00', 'to': '24:00', 'rate': 1}]})['periods'] == \
+        [{'from': '22:00', 'to': '24:00', 'rate': 1.0}]
+
+
+@pytest.mark.parametrize('rule', [
+    'not json',
+    '[1, 2]',
+    {'price': 10},
+    {'unit': 'week'},
+    {'unit': ['hour']},
+    {'unit': {'hour': 1}},
+    {'rounding': 'nearest'},
+    {'rounding': ['ceil']},
+    {'rate': -1},
+    {'rate': 'abc'},
+    {'rate': 'nan'},
+    {'rate': 'inf'},
+    {'rate': float('nan')},
+    {'daily_cap': '-inf'},
+    {'daily_cap': [1]},
+    {'min_units': -1},
+    {'min_units': float('inf')},
+    {'periods': [{'from': '22:00', 'to': '06:00'}]},
+    {'periods': [{'from': '22:00', 'to': '22:00', 'rate': 1}]},
+    {'periods': [{'from': '25:00', 'to': '06:00', 'rate': 1}]},
+    {'periods': [{'from': 22, 'to': '06:00', 'rate': 1}]},
+    {'periods': [{'from': '22:00', 'to': '06:00', 'rate': 'nan'}]},
+    {'periods': ['22:00-06:00']},
+    '{"rate": NaN}',
+    '{"rate": Infinity}',
+])
+def test_parse_rejects(rule):
+    with pytest.raises(ValueError):
+        parse_tariff(rule)
+
+
+
+def test_cost_function_on_connections_opened_before_billing_import(tmp_path):
+    # A fresh process that opens its first connection without importing models.billing
+    script = (
+        "import sys, config\n"
+        "config.DATABASE = sys.argv[1]\n"
+        "from models.db import get_connection\n"
+        "conn = get_connection()\n"
+        "print(conn.execute(\"SELECT booking_cost('{}', 0, 7200)\").fetchone()[0])\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script, str(tmp_path / 'fresh.db')],
+                            capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '0.0'
@@ -0,0 +1,42 @@
+import config
+from models.db import close_pool, get_connection
+from models.migrate import _backfill_lock, run_backfills, start_backfills, upgrade
+
+
+def _user_ids():
+    conn = get_connection()
+    rows = conn.execute("SELECT user_id FROM bookings ORDER BY id").fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def test_schema_upgrade_leaves_backfills_for_later(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATABASE', str(tmp_path / 'old.db'))
+    close_pool()
+    upgrade(6)
+    conn = get_connection()
+    conn.execute("INSERT INTO users (username, password) VALUES ('alice', 'x')")
+    conn.execute("INSERT INTO bookings (user_email, slot_id, vehicle_number, start_time) "
+                 "VALUES ('alice', 1, 'KA01', '2024-03-01 10:00:00')")
+    conn.commit()
+    conn.close()
+
+    upgrade(backfills=False)
+    assert _user_ids() == [None]
+    run_backfills()
+    assert _user_ids() == [1]
+    close_pool()
+
+
+def test_backfills_run_in_one_process_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATABASE', str(tmp_path / 'locked.db'))
+    held = _backfill_lock()
+    spawned = []
+    assert not start_backfills(spawned.append)
+    assert not spawned
+    held.close()
+    assert start_backfills(lambda fn: spawned.append(fn))
+    assert _backfill_lock() is None
+    spawned[0]()
+    _backfill_lock().close()
+    close_pool()
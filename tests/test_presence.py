@@ -0,0 +1,52 @@
+import time
+
+from models.presence import PresenceRegistry
+
+
+def test_local_sessions_are_refcounted():
+    registry = PresenceRegistry(timeout=60)
+    assert registry.connect('a1', 'alice')
+    assert not registry.connect('a2', 'alice')
+    assert registry.disconnect('a1') is None
+    assert registry.is_online('alice')
+    assert registry.disconnect('a2') == 'alice'
+    assert not registry.is_online('alice')
+
+
+def test_heartbeat_reports_expired_sessions():
+    registry = PresenceRegistry(timeout=60)
+    registry.connect('a1', 'alice')
+    assert registry.heartbeat('a1')
+    registry.timeout = -1
+    assert registry.expire() == (['alice'], [])
+    assert not registry.heartbeat('a1')
+
+
+def test_other_workers_users_are_listed():
+    registry = PresenceRegistry(timeout=60)
+    registry.connect('a1', 'alice')
+    registry.remote_change('other:1', 'bob', True, 1)
+    registry.sync('other:2', [('alice', 0), ('carol', 0)])
+    assert registry.snapshot() == [
+        ('alice', 0, sorted([registry.worker, 'other:2'])),
+        ('bob', 1, ['other:1']),
+        ('carol', 0, ['other:2']),
+    ]
+    # Still online elsewhere after leaving this worker
+    registry.disconnect('a1')
+    assert registry.is_online('alice')
+    registry.remote_change('other:1', 'bob', False)
+    assert not registry.is_online('bob')
+    # Own events coming back through the queue are ignored
+    registry.remote_change(registry.worker, 'dave', True)
+    assert not registry.is_online('dave')
+
+
+def test_silent_workers_are_forgotten():
+    registry = PresenceRegistry(timeout=60)
+    assert registry.sync('other:1', [('bob', 0)])
+    assert not registry.sync('other:1', [('bob', 0)])
+    assert registry.expire() == ([], [])
+    registry._remote['other:1'][1] = time.monotonic() - 120
+    assert registry.expire() == ([], [('other:1', 'bob')])
+    assert registry.snapshot() == []
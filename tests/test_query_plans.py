@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_routes_use_indexes():
+    # Own process: the check imports app against its scratch database
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.query_plans'],
+                            capture_output=True, text=True, cwd=ROOT, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'FULL SCAN' not in result.stdout
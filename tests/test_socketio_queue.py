@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_workers_see_each_others_emits():
+    # Two gunicorn workers sharing a SQLite message queue; each chat client
+    # must get every message sent through either worker, and each worker's
+    # history must hold them all
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.socketio_fanout', '--processes', '2', '--messages', '5',
+         '--timeout', '20'],
+        capture_output=True, text=True, cwd=ROOT, timeout=180,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.count(' ok\n') == 2, result.stdout
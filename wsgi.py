@@ -0,0 +1,51 @@
+"""Production entry point: gevent workers, sqlite calls on a threadpool.
+
+    gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker \
+        -w 1 --worker-connections 1000 --bind 0.0.0.0:5000 wsgi:app
+
+or `python wsgi.py` for a single gevent server without gunicorn.
+
+Sizing:
+- Each Socket.IO connection is a greenlet, not a thread, so one worker holds
+  thousands of idle connections; --worker-connections caps them.
+- Database calls run on DB_THREADS real threads (default DB_POOL_SIZE) so a
+  slow query never stalls the event loop. More threads than pooled
+  connections only queue on the pool, and SQLite has a single writer, so
+  raising both mostly helps read-heavy pages.
+- Password checks run on PASSWORD_HASH_THREADS more threads; each scrypt
+  hash holds one for PASSWORD_SCRYPT_N-dependent time (see
+  benchmarks/login_load.py), which caps logins per second per process.
+- CPU-bound work still holds the loop. Scale out with one single-worker
+  server per core behind a load balancer with sticky sessions and
+  SOCKETIO_MESSAGE_QUEUE set; -w > 1 in one gunicorn breaks long-polling.
+"""
+import os
+
+os.environ.setdefault('ASYNC_MODE', 'gevent')
+
+from gevent import get_hub, monkey
+
+# gunicorn's gevent workers patch before loading the app; `python wsgi.py` does not
+if not monkey.is_module_patched('socket'):
+    monkey.patch_all()
+
+from gevent.threadpool import ThreadPoolExecutor
+
+import config
+from models.credentials import hash_pool
+from models.db import use_blocking_runner
+
+
+def run_in_threadpool(fn, *args):
+    return get_hub().threadpool.apply(fn, args)
+
+
+get_hub().threadpool.maxsize = config.DB_THREADS
+use_blocking_runner(run_in_threadpool)
+# Password hashing gets its own real threads so logins never hold DB threads
+hash_pool.use_executor(ThreadPoolExecutor(config.PASSWORD_HASH_THREADS), config.PASSWORD_HASH_THREADS)
+
+from app import app, socketio  # noqa: E402
+
+if __name__ == '__main__':
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))